@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+# Vectorized legal move masks of many JanggiGame positions at once, with NumPy.
+#
+# Positions are stacked in an (N, 10, 9) integer array of signed piece codes, laid out like Board cells: [n, row, file]
+# is the cell with index 9 * row + file (row 0 is row '1', file 0 is file 'a'), holding a positive piece code for blue
+# pieces, a negative one for red pieces and EMPTY for empty cells. The side to move of each position is given as +1
+# (blue) or -1 (red).
+#
+# Every move of every piece is precomputed once as a "move entry": the signed piece code making it, the from and to
+# cells, and a bitmask of the cells between them (the legs of a horse or an elephant, or the cells a chariot or cannon
+# slides over). The masks of all the positions are then computed with array operations over the entries of the pieces
+# on the board, and bitmasks of the occupied cells of each position, with no Python loop per position.
+#
+# Usage: python JanggiBatch.py [--positions POSITIONS]
+#
+# Checks the masks of random positions against JanggiGame.legal_move_codes, and reports positions per second.
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from JanggiGame import (JanggiGame, CANNON, CHARIOT, CHECK_LINES, GENERAL, LINE_RAYS, PALACE_RAYS, PASS_MOVE,
+                        PLAYER_SIGNS, STEP_MOVES)
+
+# Low 64 bits of a cell bitmask
+LOW_WORD = (1 << 64) - 1
+
+# Piece code of the padding entry of the MoveEntries tables, which is never on a cell
+NO_PIECE = 127
+
+# Number of positions whose masks are computed in one set of array operations, bounding the memory used
+CHUNK_SIZE = 1024
+
+
+class MoveEntries:
+    """
+    A class representing the move entries of one player: parallel arrays of the signed piece code, from cell, to cell,
+    cannon flag and bitmask (split in a low and a high 64-bit word) of the cells between of every move any of the
+    player's pieces can make on an empty enough board. The last entry is a padding entry that is never possible.
+
+    The entries are looked up by piece and cell in by_piece (indexed by piece code without sign and from cell, padded
+    with the padding entry), and by move in by_move (indexed by piece code without sign, from cell and to cell, the
+    padding entry where the piece has no such move).
+    """
+
+    def __init__(self, player: str):
+        """
+        Initializes the MoveEntries of the received player ('blue' or 'red') from the move tables of JanggiGame.py.
+        """
+        sign = PLAYER_SIGNS[player]
+        entries = []
+
+        # Generals, guards, horses, elephants and soldiers: the legs must be empty
+        for code, table in STEP_MOVES.items():
+            if code * sign > 0:
+                for source, moves in enumerate(table):
+                    for destination, legs in moves:
+                        entries.append((code, source, destination, legs))
+
+        # Chariots and cannons: along the rows, files and palace diagonals, over the cells before the destination
+        for source in range(90):
+            rays = [table[0][0] for _, _, _, table in LINE_RAYS[source]]
+            rays.extend(PALACE_RAYS[player].get(source, ()))
+            for ray in rays:
+                for position, destination in enumerate(ray):
+                    entries.append((sign * CHARIOT, source, destination, ray[:position]))
+                    if position:
+                        entries.append((sign * CANNON, source, destination, ray[:position]))
+
+        between = [sum(1 << cell for cell in entry[3]) for entry in entries]
+        padding = len(entries)
+        self.codes = np.array([entry[0] for entry in entries] + [NO_PIECE], dtype=np.int8)
+        self.sources = np.array([entry[1] for entry in entries] + [0], dtype=np.intp)
+        self.destinations = np.array([entry[2] for entry in entries] + [0], dtype=np.intp)
+        self.cannons = np.abs(self.codes) == CANNON
+        self.between_low = np.array([mask & LOW_WORD for mask in between] + [0], dtype=np.uint64)
+        self.between_high = np.array([mask >> 64 for mask in between] + [0], dtype=np.uint64)
+        self.move_codes = self.sources * 90 + self.destinations
+
+        self.by_piece = _padded_lookup(entries, lambda entry: (abs(entry[0]), entry[1]), (8, 90), padding)
+        self.by_move = np.full((8, 90, 90), padding, dtype=np.intp)
+        for number, (code, source, destination, _) in enumerate(entries):
+            self.by_move[abs(code), source, destination] = number
+
+    def possible(self, cells, occupied, cannons, rows, numbers):
+        """
+        Receives an (N, 90) array of positions, the (N, 2) bitmasks of their occupied cells and of their cells holding
+        a cannon, and arrays of position numbers (rows) and entry numbers broadcast together. Returns a boolean array
+        of whether each entry is a possible move in its position, regardless of checks: the piece is on the from cell,
+        the to cell is not held by one of its own pieces, and the cells between are empty, or hold exactly one piece
+        which is not a cannon for a cannon, which cannot capture another cannon either.
+        """
+        codes = self.codes[numbers]
+        target = cells[rows, self.destinations[numbers]]
+        possible = (cells[rows, self.sources[numbers]] == codes) & (target * codes <= 0)
+
+        between_low, between_high = self.between_low[numbers], self.between_high[numbers]
+        low = occupied[rows, 0] & between_low
+        high = occupied[rows, 1] & between_high
+        clear = (low | high) == 0
+
+        cannons_between = ((cannons[rows, 0] & between_low) | (cannons[rows, 1] & between_high)) != 0
+        one_screen = np.where(low != 0, _single_bit(low) & (high == 0), _single_bit(high))
+        jump = one_screen & ~cannons_between & (np.abs(target) != CANNON)
+
+        return possible & np.where(self.cannons[numbers], jump, clear)
+
+    def attacks(self, cells, targets, squares, pieces):
+        """
+        Receives an (N, 90) array of positions, an (N,) array of target cells, and (N, K) arrays of the cells of the
+        player's pieces in each position and of whether each of the K slots holds a piece (see piece_squares). Returns
+        an (N,) boolean array of whether one of those pieces can move to the target cell of each position.
+        """
+        rows = np.arange(len(cells))[:, None]
+        codes = np.where(pieces, np.abs(cells[rows, squares]), 0)
+        numbers = self.by_move[codes, squares, targets[:, None]]
+        possible = self.possible(cells, _bitmasks(cells != 0), _bitmasks(np.abs(cells) == CANNON), rows, numbers)
+        return possible.any(axis=1)
+
+
+def _padded_lookup(entries, key, shape, padding) -> np.ndarray:
+    """
+    Groups the numbers of the received entries by the key of each entry, a tuple of indexes into an array of the
+    received shape. Returns the array of groups, each padded with the padding entry number to the size of the largest
+    group.
+    """
+    groups = dict()
+    for number, entry in enumerate(entries):
+        groups.setdefault(key(entry), []).append(number)
+
+    lookup = np.full(shape + (max(len(numbers) for numbers in groups.values()),), padding, dtype=np.intp)
+    for index, numbers in groups.items():
+        lookup[index][:len(numbers)] = numbers
+    return lookup
+
+
+def _bitmasks(flags) -> np.ndarray:
+    """
+    Receives an (N, 90) boolean array, returns an (N, 2) array of 64-bit words: the bitmask of the True cells of each
+    row, bit i of the low word being cell i and bit i of the high word cell 64 + i.
+    """
+    packed = np.packbits(flags, axis=1, bitorder='little')
+    padded = np.zeros((len(flags), 16), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view('<u8')
+
+
+def piece_squares(cells, sign) -> tuple:
+    """
+    Receives an (N, 90) array of positions and a player sign. Returns an (N, K) array of the cells of the player's
+    pieces in each position, K being the largest number of pieces, and an (N, K) boolean array of whether each slot
+    holds a piece.
+    """
+    rows, squares = np.nonzero(cells * sign > 0)
+    counts = np.bincount(rows, minlength=len(cells))
+    slots = np.arange(len(rows)) - (np.cumsum(counts) - counts)[rows]
+
+    piece_cells = np.zeros((len(cells), max(1, counts.max(initial=0))), dtype=np.intp)
+    pieces = np.zeros(piece_cells.shape, dtype=bool)
+    piece_cells[rows, slots] = squares
+    pieces[rows, slots] = True
+    return piece_cells, pieces
+
+
+def _single_bit(words) -> np.ndarray:
+    """
+    Returns a boolean array of whether each word of the received array has exactly one bit set.
+    """
+    return (words != 0) & ((words & (words - np.uint64(1))) == 0)
+
+
+_entries = None
+_check_lines = None
+
+
+def get_check_lines() -> np.ndarray:
+    """
+    Returns the (90, 2) array of the bitmasks of CHECK_LINES: the cells whose occupancy can change whether a cell is
+    attacked, built on first use.
+    """
+    global _check_lines
+    if _check_lines is None:
+        masks = [sum(1 << cell for cell in cells) for cells in CHECK_LINES]
+        _check_lines = np.array([(mask & LOW_WORD, mask >> 64) for mask in masks], dtype=np.uint64)
+    return _check_lines
+
+
+def get_move_entries() -> dict:
+    """
+    Returns a dictionary mapping each player sign (+1, -1) to its MoveEntries, built on first use.
+    """
+    global _entries
+    if _entries is None:
+        _entries = {sign: MoveEntries(player) for player, sign in PLAYER_SIGNS.items()}
+    return _entries
+
+
+def stack_positions(games) -> tuple:
+    """
+    Receives an iterable of JanggiGame, returns the (N, 10, 9) array of their positions and the (N,) array of the side
+    to move of each.
+    """
+    games = list(games)
+    boards = np.array([game.get_board().get_cells() for game in games], dtype=np.int8).reshape(-1, 10, 9)
+    players = np.array([PLAYER_SIGNS[game.get_turn()] for game in games], dtype=np.int8)
+    return boards, players
+
+
+def legal_move_masks(boards, players=None, include_pass=True):
+    """
+    Receives an (N, 10, 9) array of positions and an (N,) array of the side to move of each (+1 blue, -1 red; blue in
+    every position when None). Returns an (N, 90, 90) boolean array where [n, from, to] is True if moving from cell
+    index from to cell index to is a legal move in position n. A pass is legal when the side to move is not in check,
+    and is set on [n, 0, 0] (the move code PASS_MOVE) when include_pass is True.
+    """
+    return policy_masks(boards, players, include_pass).reshape(-1, 90, 90)
+
+
+def policy_masks(boards, players=None, include_pass=True):
+    """
+    Same as legal_move_masks, but returns an (N, 8100) boolean array indexed by move code (see encode_move), the
+    policy index of each move.
+    """
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 90)
+    if players is None:
+        players = np.ones(len(boards), dtype=np.int8)
+    players = np.asarray(players)
+    masks = np.zeros((len(boards), 8100), dtype=bool)
+
+    for sign in (1, -1):
+        positions = np.flatnonzero(players == sign)
+        for start in range(0, len(positions), CHUNK_SIZE):
+            chunk = positions[start:start + CHUNK_SIZE]
+            masks[chunk] = _chunk_policy_masks(boards[chunk], sign, include_pass)
+
+    return masks
+
+
+def _chunk_policy_masks(cells, sign, include_pass):
+    """
+    Computes the policy masks of an (N, 90) array of positions where sign is the side to move.
+    """
+    entries = get_move_entries()
+    own, enemy = entries[sign], entries[-sign]
+    masks = np.zeros((len(cells), 8100), dtype=bool)
+    generals = np.argmax(cells == sign * GENERAL, axis=1)
+
+    # Possible moves of each of the pieces of the side to move, regardless of checks
+    rows, squares = np.nonzero(cells * sign > 0)
+    numbers = own.by_piece[np.abs(cells[rows, squares]), squares]
+    possible = own.possible(cells, _bitmasks(cells != 0), _bitmasks(np.abs(cells) == CANNON), rows[:, None], numbers)
+    pieces, slots = np.nonzero(possible)
+    rows, numbers = rows[pieces], numbers[pieces, slots]
+
+    # Out of check, a move of another piece than the general starting and ending off the check lines of the general
+    # cannot leave it attacked
+    enemy_squares, enemy_pieces = piece_squares(cells, -sign)
+    in_check = enemy.attacks(cells, generals, enemy_squares, enemy_pieces)
+    sources, destinations = own.sources[numbers], own.destinations[numbers]
+    lines = get_check_lines()[generals[rows]]
+    on_lines = ((lines[np.arange(len(rows)), sources >> 6] >> (sources & 63).astype(np.uint64)) |
+                (lines[np.arange(len(rows)), destinations >> 6] >> (destinations & 63).astype(np.uint64))) & 1
+    general_moves = own.codes[numbers] == sign * GENERAL
+    tested = np.flatnonzero(in_check[rows] | general_moves | (on_lines != 0))
+
+    # Play every move to test on a copy of its position, and keep those not leaving the own general attacked
+    legal = np.ones(len(rows), dtype=bool)
+    after = cells[rows[tested]]
+    moves = np.arange(len(tested))
+    after[moves, destinations[tested]] = own.codes[numbers[tested]]
+    after[moves, sources[tested]] = 0
+    targets = np.where(general_moves[tested], destinations[tested], generals[rows[tested]])
+    legal[tested] = ~enemy.attacks(after, targets, enemy_squares[rows[tested]], enemy_pieces[rows[tested]])
+    masks[rows[legal], own.move_codes[numbers[legal]]] = True
+
+    if include_pass:
+        masks[:, PASS_MOVE] = ~in_check
+
+    return masks
+
+
+def _random_games(count: int, rng: random.Random) -> list:
+    """
+    Returns a list of count JanggiGame, each played from the starting position with a random number of random moves.
+    """
+    games = []
+    while len(games) < count:
+        game = JanggiGame()
+        for _ in range(rng.randrange(120)):
+            moves = game.legal_move_codes()
+            if not moves:
+                break
+            game.push(rng.choice(moves))
+        games.append(game)
+    return games
+
+
+def main() -> int:
+    """
+    Checks the batch masks of random positions against JanggiGame.legal_move_codes, and reports how many positions
+    per second each computes. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame batch legal move masks')
+    parser.add_argument('--positions', type=int, default=2000, help='number of random positions')
+    args = parser.parse_args()
+
+    games = _random_games(args.positions, random.Random(0))
+    boards, players = stack_positions(games)
+    get_move_entries()
+
+    start = time.perf_counter()
+    masks = policy_masks(boards, players)
+    batch_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [game.legal_move_codes() for game in games]
+    scalar_elapsed = time.perf_counter() - start
+
+    wrong = 0
+    for number, moves in enumerate(expected):
+        if set(np.flatnonzero(masks[number])) != set(moves):
+            wrong += 1
+
+    print(f'batch:  {args.positions / batch_elapsed:>10,.0f} positions/s')
+    print(f'scalar: {args.positions / scalar_elapsed:>10,.0f} positions/s')
+    print(f'{wrong} of {args.positions} masks wrong')
+    return 1 if wrong else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+
+# Benchmarks and move generation correctness checks for JanggiGame.py
+#
+# Usage: python JanggiBenchmark.py [--perft-depth DEPTH] [--seconds SECONDS] [--memory-games GAMES]
+#                                   [--processes PROCESSES]
+#
+# First verifies perft node counts of the reference positions below, then reports how many nodes per second move
+# generation, make/unmake (push/pop), check detection, cloning and perft run at, how many games per second are set up
+# by construction, cloning or a GamePool, and how many bytes of memory each live game holds. With --processes, also
+# checks perft counts and search moves of a ParallelEngine on the FEN reference positions, and reports the speedup of
+# perft and search on that many worker processes. Also checks that record files with an illegal move (see
+# INVALID_RECORDS) are rejected with InvalidRecordError by replay, the game database index and the opening book. Exits
+# with status 1 if a node count is wrong, a move is illegal or an invalid record is not rejected.
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from JanggiBook import build_book
+from JanggiDatabase import build_index
+from JanggiEngine import Engine, ParallelEngine
+from JanggiGame import JanggiGame, GamePool, decode_move, encode_move
+from JanggiRecords import GameRecord, InvalidRecordError, RecordWriter, read_records
+
+# Reference positions for perft. Each position is reached by playing its moves with make_move from the starting
+# position, and maps a depth to the known number of leaf nodes at that depth (passes included).
+PERFT_POSITIONS = {
+    'start': (
+        [],
+        {1: 32, 2: 1024, 3: 33762, 4: 1112660}
+    ),
+    'check': (
+        [('a7', 'a6'), ('c4', 'b4'), ('c7', 'd7'), ('i4', 'h4'), ('f10', 'f9'), ('i1', 'i7'), ('e9', 'e10'),
+         ('h4', 'i4'), ('f9', 'f8'), ('i7', 'i10'), ('c10', 'd8'), ('e4', 'd4'), ('b10', 'e8'), ('f1', 'f2'),
+         ('d8', 'b7'), ('b3', 'b7'), ('e10', 'f10'), ('b7', 'e7'), ('b8', 'b1'), ('e2', 'd3'), ('e8', 'b6')],
+        {1: 6, 2: 203, 3: 8609}
+    ),
+    'chariot in palace': (
+        [('a7', 'a6'), ('c4', 'b4'), ('c7', 'd7'), ('i4', 'h4'), ('f10', 'f9'), ('i1', 'i7'), ('e9', 'e10'),
+         ('h4', 'i4'), ('f9', 'f8'), ('i7', 'i10'), ('c10', 'd8'), ('e4', 'd4'), ('b10', 'e8'), ('f1', 'f2'),
+         ('d8', 'b7'), ('b3', 'b7'), ('e10', 'f10'), ('b7', 'e7'), ('b8', 'b1'), ('e2', 'd3'), ('e8', 'b6'),
+         ('b4', 'b5'), ('h8', 'b8'), ('i10', 'h10'), ('b6', 'e4'), ('d4', 'e4'), ('b1', 'b6'), ('a4', 'a5'),
+         ('d7', 'e7'), ('c1', 'a2'), ('a6', 'a5'), ('b5', 'b6'), ('f10', 'f9'), ('h10', 'g10'), ('a1', 'a1'),
+         ('b6', 'c6'), ('e7', 'd7'), ('g10', 'd10')],
+        {1: 22, 2: 964, 3: 21892}
+    ),
+    'cannon in palace': (
+        [('e9', 'e10'), ('d1', 'd2'), ('b10', 'd7'), ('f1', 'e1'), ('h10', 'i8'), ('c4', 'b4'), ('d7', 'b4'),
+         ('d2', 'd3'), ('i8', 'h10'), ('a4', 'b4'), ('a10', 'a9'), ('a1', 'a2'), ('f10', 'e9'), ('a2', 'a7'),
+         ('e7', 'e6'), ('e1', 'd1'), ('a9', 'a7'), ('b4', 'c4'), ('c7', 'c6'), ('b3', 'e3')],
+        {1: 41, 2: 1287, 3: 49740}
+    )
+}
+
+
+# Reference positions for perft loaded with from_fen, which are also searched and counted by a ParallelEngine when
+# benchmarking parallel search, to check its workers start from the position the game started from
+FEN_PERFT_POSITIONS = {
+    'chariot endgame': (
+        '4k4/9/9/9/9/9/9/9/4K4/R8 b',
+        {1: 26, 2: 98, 3: 2262, 4: 10788}
+    )
+}
+
+# Games of record files with an illegal move in range of the move codes, which must be rejected rather than replayed
+INVALID_RECORDS = {
+    'move from an empty square': [encode_move('a7', 'a6'), encode_move('e5', 'e6')],
+    'chariot jumping over pieces': [encode_move('a7', 'a6'), encode_move('a1', 'a10')]
+}
+
+
+def load_position(moves) -> JanggiGame:
+    """
+    Receives a list of (from, to) pairs of squares, and returns a JanggiGame with those moves played from the starting
+    position.
+    """
+    game = JanggiGame()
+    for from_square, to_square in moves:
+        if not game.make_move(from_square, to_square):
+            raise ValueError(f'Invalid move in reference position: {from_square} {to_square}')
+    return game
+
+
+def verify_perft(max_depth: int) -> list:
+    """
+    Receives a maximum depth, and checks the perft node count of every reference position at each known depth up to
+    that maximum. Prints a line per count, along with the divide of the position when a count is wrong. Returns a list
+    of the (position name, depth, expected, found) of each wrong count.
+    """
+    failures = []
+
+    positions = [(name, load_position(moves), counts) for name, (moves, counts) in PERFT_POSITIONS.items()]
+    positions += [(name, JanggiGame.from_fen(fen), counts) for name, (fen, counts) in FEN_PERFT_POSITIONS.items()]
+    for name, game, counts in positions:
+        for depth, expected in sorted(counts.items()):
+            if depth > max_depth:
+                continue
+
+            found = game.perft(depth)
+            status = 'ok' if found == expected else 'WRONG'
+            print(f'perft {name!r} depth {depth}: {found} (expected {expected}) {status}')
+
+            if found != expected:
+                failures.append((name, depth, expected, found))
+                for move, nodes in sorted(game.perft(depth, divide=True).items()):
+                    print(f'    {move[0]}{move[1]}: {nodes}')
+
+    return failures
+
+
+def measure(function, seconds: float) -> tuple:
+    """
+    Receives a function returning a number of nodes, and calls it repeatedly for about the given number of seconds.
+    Returns the total number of nodes and the elapsed time.
+    """
+    nodes = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < seconds:
+        nodes += function()
+        elapsed = time.perf_counter() - start
+    return nodes, elapsed
+
+
+def bench_move_generation(games, seconds: float) -> tuple:
+    """
+    Generates the legal moves of each game in turn. Returns the number of moves generated and the elapsed time.
+    """
+    def generate():
+        return sum(len(game.legal_move_codes()) for game in games)
+
+    return measure(generate, seconds)
+
+
+def bench_make_unmake(games, seconds: float) -> tuple:
+    """
+    Plays and takes back every legal move of each game in turn with push and pop. Returns the number of moves made
+    and the elapsed time.
+    """
+    move_lists = [(game, game.legal_move_codes()) for game in games]
+
+    def make_unmake():
+        made = 0
+        for game, moves in move_lists:
+            for move in moves:
+                game.push(move)
+                game.pop()
+            made += len(moves)
+        return made
+
+    return measure(make_unmake, seconds)
+
+
+def bench_check_detection(games, seconds: float) -> tuple:
+    """
+    Checks whether the player to move is in check after every legal move of each game in turn. Returns the number of
+    checks detected (positions looked at) and the elapsed time, not counting push and pop.
+    """
+    move_lists = [(game, game.legal_move_codes()) for game in games]
+    total = 0
+    elapsed = 0.0
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        for game, moves in move_lists:
+            for move in moves:
+                game.push(move)
+                player = game.get_turn()
+                start = time.perf_counter()
+                game.is_in_check(player)
+                elapsed += time.perf_counter() - start
+                game.pop()
+            total += len(moves)
+
+    return total, elapsed
+
+
+def bench_clone(games, seconds: float) -> tuple:
+    """
+    Clones each game in turn (see JanggiGame.clone). Returns the number of clones made and the elapsed time.
+    """
+    def clone():
+        for game in games:
+            game.clone()
+        return len(games)
+
+    return measure(clone, seconds)
+
+
+def bench_game_setup(acquire, release, seconds: float, first_move=False) -> tuple:
+    """
+    Receives a function returning a game in the starting position, and a function receiving the game once it is no
+    longer used. Repeatedly gets a game and gives it back. With first_move, a first move is played on each game with
+    make_move, which builds whatever a clone or a reset game defers: the Square objects and the attacks data
+    structures. Returns the number of games set up and the elapsed time.
+    """
+    def setup():
+        for _ in range(100):
+            game = acquire()
+            if first_move:
+                game.make_move('c7', 'c6')
+            release(game)
+        return 100
+
+    return measure(setup, seconds)
+
+
+def bench_memory(factory, count: int) -> int:
+    """
+    Receives a function returning a new JanggiGame, and keeps count games returned by it alive at once. Returns the
+    average number of bytes of memory allocated per live game, as traced by tracemalloc.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        games = [factory() for _ in range(count)]
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del games
+    return allocated // count
+
+
+def bench_perft(game, depth: int) -> tuple:
+    """
+    Runs perft on a game at the given depth. Returns the number of leaf nodes and the elapsed time.
+    """
+    start = time.perf_counter()
+    nodes = game.perft(depth)
+    return nodes, time.perf_counter() - start
+
+
+def bench_search(engine, seconds: float) -> tuple:
+    """
+    Searches the starting position with an Engine or ParallelEngine for the given number of seconds. Returns the number
+    of nodes searched and the elapsed time.
+    """
+    start = time.perf_counter()
+    result = engine.search(int(seconds * 1000))
+    return result.nodes, time.perf_counter() - start
+
+
+def verify_parallel(processes: int, max_depth: int) -> list:
+    """
+    Receives a number of worker processes and a maximum depth. Checks the perft node counts of a ParallelEngine on the
+    FEN reference positions, and that the move its search finds in each is legal. Prints a line per check, and returns
+    a list of the (position name, depth, expected, found) of each failed check, with depth None for a search.
+    """
+    failures = []
+
+    for name, (fen, counts) in FEN_PERFT_POSITIONS.items():
+        game = JanggiGame.from_fen(fen)
+        with ParallelEngine(game, processes) as parallel_engine:
+            for depth, expected in sorted(counts.items()):
+                if depth > max_depth:
+                    continue
+                found = parallel_engine.perft(depth)
+                status = 'ok' if found == expected else 'WRONG'
+                print(f'parallel perft {name!r} depth {depth}: {found} (expected {expected}) {status}')
+                if found != expected:
+                    failures.append((name, depth, expected, found))
+
+            move = parallel_engine.search(max_nodes=2000).move
+            legal = move in game.legal_move_codes()
+            print(f'parallel search {name!r}: {"".join(decode_move(move))} {"ok" if legal else "ILLEGAL"}')
+            if not legal:
+                failures.append((name, None, 'a legal move', ''.join(decode_move(move))))
+
+    return failures
+
+
+def verify_records() -> list:
+    """
+    Writes each game of INVALID_RECORDS to a record file of its own, and checks that replaying it, indexing it with
+    build_index and building a book of it each raise InvalidRecordError. Prints a line per check, and returns a list of
+    the (game name, check, expected, found) of each failed check.
+    """
+    failures = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for number, (name, moves) in enumerate(INVALID_RECORDS.items()):
+            path = os.path.join(directory, f'records{number}')
+            with RecordWriter(path) as writer:
+                writer.write(GameRecord(moves))
+
+            checks = (
+                ('replay', lambda: [record.replay() for record in read_records(path)]),
+                ('index', lambda: build_index(path)),
+                ('book', lambda: build_book(path + '.book', [path], min_count=1))
+            )
+            for check, function in checks:
+                try:
+                    function()
+                    found = 'no error'
+                except InvalidRecordError:
+                    found = 'InvalidRecordError'
+                except Exception as error:
+                    found = type(error).__name__
+                status = 'ok' if found == 'InvalidRecordError' else 'WRONG'
+                print(f'invalid record {name!r} {check}: {found} {status}')
+                if found != 'InvalidRecordError':
+                    failures.append((name, check, 'InvalidRecordError', found))
+
+    return failures
+
+
+def bench_parallel(processes: int, depth: int, seconds: float) -> None:
+    """
+    Runs perft and search on one process, then on the given number of worker processes, and reports the nodes per
+    second of each along with the speedup.
+    """
+    game = JanggiGame()
+    with ParallelEngine(game, processes) as parallel_engine:
+        benchmarks = (
+            (f'perft({depth})', bench_perft, game, bench_parallel_perft, depth),
+            ('search', bench_search, Engine(game), bench_search, seconds)
+        )
+        for name, serial, serial_subject, parallel, argument in benchmarks:
+            serial_nodes, serial_elapsed = serial(serial_subject, argument)
+            parallel_nodes, parallel_elapsed = parallel(parallel_engine, argument)
+            report(f'{name} x1', serial_nodes, serial_elapsed)
+            report(f'{name} x{processes}', parallel_nodes, parallel_elapsed)
+            speedup = (parallel_nodes / parallel_elapsed) / (serial_nodes / serial_elapsed)
+            print(f'{name:<20} speedup {speedup:.2f} on {processes} processes')
+
+
+def bench_parallel_perft(engine, depth: int) -> tuple:
+    """
+    Runs perft on a ParallelEngine at the given depth. Returns the number of leaf nodes and the elapsed time.
+    """
+    start = time.perf_counter()
+    nodes = engine.perft(depth)
+    return nodes, time.perf_counter() - start
+
+
+def report(name: str, nodes: int, elapsed: float, unit='nodes') -> None:
+    """
+    Prints the number of nodes (or other units) per second of one benchmark.
+    """
+    print(f'{name:<20} {nodes:>12,} {unit:<5} in {elapsed:6.2f}s  {nodes / elapsed:>14,.0f} {unit}/s')
+
+
+def report_memory(name: str, count: int, size: int) -> None:
+    """
+    Prints the number of bytes per live game of one memory benchmark.
+    """
+    print(f'{name:<20} {count:>12,} games live     {size:>14,} bytes/game')
+
+
+def main() -> int:
+    """
+    Runs the perft verification and the benchmarks. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame perft verification and benchmarks')
+    parser.add_argument('--perft-depth', type=int, default=3, help='maximum perft depth to verify and benchmark')
+    parser.add_argument('--seconds', type=float, default=2.0, help='duration of each timed benchmark')
+    parser.add_argument('--memory-games', type=int, default=1000, help='number of live games to measure memory with')
+    parser.add_argument('--processes', type=int, default=0, help='number of worker processes for parallel benchmarks')
+    args = parser.parse_args()
+
+    failures = verify_perft(args.perft_depth)
+    print()
+    failures += verify_records()
+    print()
+
+    games = [load_position(moves) for moves, _ in PERFT_POSITIONS.values()]
+    report('move generation', *bench_move_generation(games, args.seconds))
+    report('make/unmake', *bench_make_unmake(games, args.seconds))
+    report('check detection', *bench_check_detection(games, args.seconds))
+    report('clone', *bench_clone(games, args.seconds))
+    report(f'perft({args.perft_depth})', *bench_perft(JanggiGame(), args.perft_depth))
+
+    print()
+    template = JanggiGame()
+    pool = GamePool()
+    setups = (
+        ('new game', JanggiGame, lambda game: None),
+        ('cloned game', template.clone, lambda game: None),
+        ('pooled game', pool.acquire, pool.release)
+    )
+    for first_move in (False, True):
+        for name, acquire, release in setups:
+            name += ' + move' if first_move else ''
+            report(name, *bench_game_setup(acquire, release, args.seconds, first_move), unit='games')
+
+    print()
+    moves = PERFT_POSITIONS['check'][0]
+    report_memory('new game', args.memory_games, bench_memory(JanggiGame, args.memory_games))
+    report_memory('game after 21 moves', args.memory_games,
+                  bench_memory(lambda: load_position(moves), args.memory_games))
+    report_memory('clone', args.memory_games, bench_memory(games[0].clone, args.memory_games))
+
+    if args.processes:
+        print()
+        failures += verify_parallel(args.processes, args.perft_depth)
+        bench_parallel(args.processes, args.perft_depth, args.seconds)
+
+    if failures:
+        print(f'\n{len(failures)} check(s) failed:')
+        for name, depth, expected, found in failures:
+            check = 'search' if depth is None else depth if isinstance(depth, str) else f'depth {depth}'
+            print(f'    {name!r} {check}: expected {expected}, found {found}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+# Opening book of JanggiGame positions, built from binary record files (see JanggiRecords.py).
+#
+# A book file starts with a 16-byte header: the magic bytes b'JNGB', the format version (16-bit), two reserved bytes
+# and the number of entries (64-bit). It is followed by one 12-byte entry per move of every position in the book,
+# sorted: the position hash (64-bit, see JanggiGame.position_hash), the move code played in the position (16-bit, see
+# encode_move) and the weight of the move (16-bit). The weight of a move is the number of games in which it was played
+# in the position, plus the number of those games won by the player who played it. All numbers are little-endian.
+#
+# The book file is memory-mapped, so probing a position is a binary search touching a few pages of the file, without
+# loading it into memory.
+#
+# Usage: python JanggiBook.py build BOOK RECORDS [RECORDS ...] [--max-ply PLY] [--min-count COUNT]
+#        python JanggiBook.py probe BOOK [MOVE ...]
+#
+# build writes a book of the first moves of every game of the record files. probe prints the book moves of the
+# position after the received moves (in algebraic notation, e.g. a7a6; a pass repeats its square, e.g. e9e9).
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from JanggiDatabase import parse_move
+from JanggiGame import JanggiGame, decode_move
+from JanggiRecords import InvalidRecordError, read_records
+
+BOOK_MAGIC = b'JNGB'
+BOOK_VERSION = 1
+BOOK_HEADER = struct.Struct('<4sHxxQ')
+BOOK_ENTRY = struct.Struct('<QHH')
+
+# Largest weight of a move, the largest 16-bit number
+MAX_WEIGHT = 0xFFFF
+
+# Number of moves from the start of each game added to a book by default
+DEFAULT_MAX_PLY = 24
+
+
+def build_book(book_path: str, records_paths, max_ply=DEFAULT_MAX_PLY, min_count=2) -> int:
+    """
+    Receives the path of the book file to write and a list of paths of record files. Replays the first max_ply moves
+    of every game of the record files with push, from the position each game started from, counting how many times
+    each move was played in each position and how many of those games the player who played it won. Moves played in
+    fewer than min_count games are left out. Writes the sorted book to book_path, and returns its number of entries.
+    Raises InvalidRecordError if a move is not legal (see GameRecord.push_move), in which case no book is written.
+    """
+    counts = dict()
+    for records_path in records_paths:
+        for record in read_records(records_path):
+            game = record.start_game()
+            for ply, move in enumerate(record.moves[:max_ply]):
+                key = (game.position_hash(), move)
+                won = record.result == ('BLUE_WON' if game.get_turn() == 'blue' else 'RED_WON')
+                record.push_move(game, ply)
+                played, wins = counts.get(key, (0, 0))
+                counts[key] = (played + 1, wins + won)
+
+    entries = sorted(
+        (position_hash, move, min(played + wins, MAX_WEIGHT))
+        for (position_hash, move), (played, wins) in counts.items() if played >= min_count
+    )
+
+    with open(book_path + '.tmp', 'wb') as file:
+        file.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(entries)))
+        pack = BOOK_ENTRY.pack
+        file.writelines(pack(*entry) for entry in entries)
+    os.replace(book_path + '.tmp', book_path)
+
+    return len(entries)
+
+
+class OpeningBook:
+    """
+    A class representing an opening book file, memory-mapped. Can be used in a with block, which closes the book at its
+    end.
+    """
+
+    def __init__(self, path: str, rng=None):
+        """
+        Initializes an OpeningBook over the book file at path. When a random.Random is received, choose_move picks
+        among the book moves at random, in proportion to their weights; otherwise it always picks the heaviest move.
+        Raises InvalidRecordError if the file is not a book file.
+        """
+        self._rng = rng
+        self._file = open(path, 'rb')
+        self._book = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._book) < BOOK_HEADER.size:
+            self.close()
+            raise InvalidRecordError(f'{path} is not an opening book file')
+        magic, version, self._count = BOOK_HEADER.unpack_from(self._book, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.close()
+            raise InvalidRecordError(f'{path} is not an opening book file of version {BOOK_VERSION}')
+        if len(self._book) != BOOK_HEADER.size + self._count * BOOK_ENTRY.size:
+            self.close()
+            raise InvalidRecordError(f'{path} is truncated')
+
+    def get_count(self) -> int:
+        """
+        Returns the number of entries (moves) in the book.
+        """
+        return self._count
+
+    def probe(self, position_hash: int) -> list:
+        """
+        Receives a position hash, returns the list of (move code, weight) pairs of the book moves of the position, an
+        empty list if the position is not in the book.
+        """
+        book, unpack_from, size, base = self._book, BOOK_ENTRY.unpack_from, BOOK_ENTRY.size, BOOK_HEADER.size
+
+        # Binary search for the first entry of the position hash
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if unpack_from(book, base + middle * size)[0] < position_hash:
+                low = middle + 1
+            else:
+                high = middle
+
+        found = []
+        while low < self._count:
+            entry_hash, move, weight = unpack_from(book, base + low * size)
+            if entry_hash != position_hash:
+                break
+            found.append((move, weight))
+            low += 1
+        return found
+
+    def probe_game(self, game: JanggiGame) -> list:
+        """
+        Receives a JanggiGame, returns the list of (move code, weight) pairs of the book moves of its current position
+        that are legal in it. Checking legality guards against two positions sharing a hash.
+        """
+        found = self.probe(game.position_hash())
+        if not found:
+            return found
+        legal_moves = set(game.legal_move_codes())
+        return [(move, weight) for move, weight in found if move in legal_moves]
+
+    def choose_move(self, game: JanggiGame) -> int or None:
+        """
+        Receives a JanggiGame, returns the move code of a book move of its current position (see __init__ for how it
+        is picked), or None if the position is not in the book.
+        """
+        found = self.probe_game(game)
+        if not found:
+            return
+        if self._rng is None:
+            return max(found, key=lambda entry: entry[1])[0]
+        moves, weights = zip(*found)
+        return self._rng.choices(moves, weights)[0]
+
+    def close(self) -> None:
+        """
+        Unmaps and closes the book file.
+        """
+        self._book.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main() -> int:
+    """
+    Builds or probes an opening book from the command line arguments. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame opening book')
+    parser.add_argument('command', choices=('build', 'probe'))
+    parser.add_argument('book', help='opening book file')
+    parser.add_argument('arguments', nargs='*',
+                        help='build: record files to read; probe: moves leading to the probed position, e.g. a7a6 c1d3')
+    parser.add_argument('--max-ply', type=int, default=DEFAULT_MAX_PLY, help='moves of each game added to the book')
+    parser.add_argument('--min-count', type=int, default=2, help='games in which a move is played to be in the book')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not args.arguments:
+            parser.error('build requires at least one record file')
+        start = time.perf_counter()
+        count = build_book(args.book, args.arguments, args.max_ply, args.min_count)
+        print(f'Wrote {count} book moves in {time.perf_counter() - start:.2f}s')
+        return 0
+
+    game = JanggiGame()
+    for move in args.arguments:
+        result = game.make_move(*parse_move(move))
+        if not result:
+            print(f'Illegal move {move}: {result.get_reason()}', file=sys.stderr)
+            return 1
+
+    with OpeningBook(args.book) as book:
+        start = time.perf_counter()
+        found = book.probe_game(game)
+        elapsed = time.perf_counter() - start
+        for move, weight in sorted(found, key=lambda entry: -entry[1]):
+            print(f'{"".join(decode_move(move))}: weight {weight}')
+        print(f'{len(found)} book moves found in {elapsed * 1000:.3f}ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+# Game database over a binary record file (see JanggiRecords.py), answering "which games reached this position".
+#
+# The database keeps an index file next to the record file (RECORDS.idx by default): a 24-byte header (the magic bytes
+# b'JNGI', the format version, the number of entries and the size of the record file when it was indexed), followed
+# by one 18-byte entry per position of every game, sorted: the position hash (64-bit, see JanggiGame.position_hash),
+# the offset of the game in the record file (64-bit) and the ply at which the game reached the position (16-bit, 0 for
+# the position the game started from, see GameRecord.get_start_fen). Both files are memory-mapped, so a lookup is a
+# binary search touching a few pages of the index, without loading either file into memory.
+#
+# Usage: python JanggiDatabase.py build RECORDS [--index INDEX]
+#        python JanggiDatabase.py query RECORDS [--index INDEX] [MOVE ...]
+#
+# build indexes every position of every game of the record file. query prints the games that reached the position
+# after the received moves (in algebraic notation, e.g. a7a6; a pass repeats its square, e.g. e9e9).
+
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+
+from JanggiGame import JanggiGame, SQUARE_NAMES
+from JanggiRecords import FILE_HEADER, GameRecord, InvalidRecordError, read_records
+
+INDEX_MAGIC = b'JNGI'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sHxxQQ')
+INDEX_ENTRY = struct.Struct('<QQH')
+
+# Number of index entries sorted in memory at once while building an index; larger archives are sorted in runs on
+# disk and merged
+RUN_SIZE = 1 << 20
+
+
+def default_index_path(records_path: str) -> str:
+    """
+    Receives the path of a record file, returns the default path of its index file.
+    """
+    return records_path + '.idx'
+
+
+def build_index(records_path: str, index_path=None) -> int:
+    """
+    Receives the path of a record file, and replays every game in it through JanggiGame to compute the hash of the
+    position at every ply. Writes the sorted index of all the positions to index_path (see default_index_path when
+    None). Returns the number of entries of the index. Raises InvalidRecordError if a game of the file is not valid,
+    in which case no index is written.
+
+    Entries are sorted RUN_SIZE at a time in memory and written to temporary run files, which are then merged, so the
+    memory used does not grow with the size of the archive.
+    """
+    index_path = default_index_path(records_path) if index_path is None else index_path
+    records_size = os.path.getsize(records_path)
+    runs = []
+    entries = []
+    count = 0
+
+    try:
+        for record in read_records(records_path):
+            entries.extend(_position_entries(record))
+            if len(entries) >= RUN_SIZE:
+                runs.append(_write_run(entries))
+                count += len(entries)
+                entries = []
+
+        count += len(entries)
+        entries.sort()
+        sources = [iter(entries)] + [_read_run(run) for run in runs]
+
+        with open(index_path + '.tmp', 'wb') as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, count, records_size))
+            pack = INDEX_ENTRY.pack
+            file.writelines(pack(*entry) for entry in heapq.merge(*sources))
+        os.replace(index_path + '.tmp', index_path)
+
+    finally:
+        for run in runs:
+            run.close()
+
+    return count
+
+
+def _position_entries(record: GameRecord) -> list:
+    """
+    Receives a GameRecord, replays it with push on a new JanggiGame, and returns the list of (position hash, game
+    offset, ply) index entries of the game, from the position it started from (ply 0) to the final position. Raises
+    InvalidRecordError if a move is not legal (see GameRecord.push_move).
+    """
+    game = record.start_game()
+    entries = [(game.position_hash(), record.offset, 0)]
+    for ply in range(len(record.moves)):
+        record.push_move(game, ply)
+        entries.append((game.position_hash(), record.offset, ply + 1))
+    return entries
+
+
+def _write_run(entries: list):
+    """
+    Sorts the received index entries and writes them to a new temporary file. Returns the file, which is deleted once
+    closed.
+    """
+    entries.sort()
+    run = tempfile.TemporaryFile()
+    pack = INDEX_ENTRY.pack
+    run.writelines(pack(*entry) for entry in entries)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    """
+    Yields the index entries of a temporary run file, in order.
+    """
+    while True:
+        chunk = run.read(INDEX_ENTRY.size * 4096)
+        if not chunk:
+            return
+        yield from INDEX_ENTRY.iter_unpack(chunk)
+
+
+class GameDatabase:
+    """
+    A class representing a game database: a record file and its position index, both memory-mapped. Can be used in a
+    with block, which closes the database at its end.
+    """
+
+    def __init__(self, records_path: str, index_path=None):
+        """
+        Initializes a GameDatabase over the record file at records_path and its index file (see default_index_path
+        when index_path is None). Raises InvalidRecordError if the index file is not a valid index.
+        """
+        index_path = default_index_path(records_path) if index_path is None else index_path
+        self._records_file = open(records_path, 'rb')
+        self._index_file = open(index_path, 'rb')
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._index) < INDEX_HEADER.size:
+            self.close()
+            raise InvalidRecordError(f'{index_path} is not a game index file')
+        magic, version, self._count, self._indexed_size = INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise InvalidRecordError(f'{index_path} is not a game index file of version {INDEX_VERSION}')
+        if len(self._index) != INDEX_HEADER.size + self._count * INDEX_ENTRY.size:
+            self.close()
+            raise InvalidRecordError(f'{index_path} is truncated')
+
+    def is_stale(self) -> bool:
+        """
+        Returns True if games were appended to the record file after it was indexed (they are not found by lookups
+        until the index is built again), otherwise returns False.
+        """
+        return len(self._records) != self._indexed_size
+
+    def get_count(self) -> int:
+        """
+        Returns the number of positions in the index.
+        """
+        return self._count
+
+    def lookup(self, position_hash: int) -> list:
+        """
+        Receives a position hash, returns the list of (game offset, ply) pairs of every game that reached the position,
+        and the ply at which it did.
+        """
+        index, unpack_from, size, base = self._index, INDEX_ENTRY.unpack_from, INDEX_ENTRY.size, INDEX_HEADER.size
+
+        # Binary search for the first entry of the position hash
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if unpack_from(index, base + middle * size)[0] < position_hash:
+                low = middle + 1
+            else:
+                high = middle
+
+        found = []
+        while low < self._count:
+            entry_hash, offset, ply = unpack_from(index, base + low * size)
+            if entry_hash != position_hash:
+                break
+            found.append((offset, ply))
+            low += 1
+        return found
+
+    def lookup_game(self, game: JanggiGame) -> list:
+        """
+        Receives a JanggiGame, returns the list of (game offset, ply) pairs of every game that reached its current
+        position (see lookup).
+        """
+        return self.lookup(game.position_hash())
+
+    def get_record(self, offset: int) -> GameRecord:
+        """
+        Receives the offset of a game in the record file, returns its GameRecord.
+        """
+        if offset < FILE_HEADER.size:
+            raise InvalidRecordError(f'No game at offset {offset}')
+        record, _ = GameRecord.from_buffer(self._records, offset)
+        return record
+
+    def games_reaching(self, position_hash: int):
+        """
+        Receives a position hash, yields a (GameRecord, ply) pair for every game that reached the position.
+        """
+        for offset, ply in self.lookup(position_hash):
+            yield self.get_record(offset), ply
+
+    def close(self) -> None:
+        """
+        Unmaps and closes the record and index files.
+        """
+        self._records.close()
+        self._index.close()
+        self._records_file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def parse_move(move: str) -> tuple:
+    """
+    Receives a move in algebraic notation (e.g. 'a7a6' or 'b10c8'), returns its (from, to) pair of squares.
+    """
+    for length in (2, 3):
+        if move[:length] in SQUARE_NAMES and move[length:] in SQUARE_NAMES:
+            return move[:length], move[length:]
+    raise ValueError(f'Invalid move: {move}')
+
+
+def main() -> int:
+    """
+    Builds or queries a game database from the command line arguments. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame game database')
+    parser.add_argument('command', choices=('build', 'query'))
+    parser.add_argument('records', help='binary record file')
+    parser.add_argument('moves', nargs='*', help='moves leading to the queried position, e.g. a7a6 c1d3')
+    parser.add_argument('--index', help='index file (default: RECORDS.idx)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        count = build_index(args.records, args.index)
+        print(f'Indexed {count} positions in {time.perf_counter() - start:.2f}s')
+        return 0
+
+    game = JanggiGame()
+    for move in args.moves:
+        result = game.make_move(*parse_move(move))
+        if not result:
+            print(f'Illegal move {move}: {result.get_reason()}', file=sys.stderr)
+            return 1
+
+    with GameDatabase(args.records, args.index) as database:
+        if database.is_stale():
+            print('Warning: games were added after the index was built', file=sys.stderr)
+        start = time.perf_counter()
+        found = database.lookup_game(game)
+        elapsed = time.perf_counter() - start
+        for offset, ply in found:
+            record = database.get_record(offset)
+            print(f'game at {offset}: ply {ply} of {len(record.moves)}, {record.result}, {record.metadata}')
+        print(f'{len(found)} games found in {elapsed * 1000:.2f}ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
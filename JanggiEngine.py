@@ -0,0 +1,700 @@
+#!/usr/bin/env python3
+
+# Alpha-beta search engine choosing moves for a JanggiGame.
+#
+# Usage: python JanggiEngine.py [--time-ms MILLISECONDS] [--processes PROCESSES] [--max-moves MOVES] [--book BOOK]
+#                               [--tablebases DIRECTORY] [--fen FEN]
+#
+# Plays a game against itself from the starting position (or the --fen position), printing each move, until the game
+# is won or max-moves moves have been played. With --book, plays the moves of an opening book (see JanggiBook.py) while
+# it has any. With --tablebases, scores the positions of the endgame tablebases of a directory (see JanggiTablebase.py)
+# exactly.
+
+import argparse
+import multiprocessing
+import random
+import struct
+import time
+from multiprocessing import shared_memory
+
+from JanggiBook import OpeningBook
+from JanggiGame import JanggiGame, PASS_MOVE, decode_move
+from JanggiTablebase import LOSS, WIN, Tablebases
+
+# Piece values indexed by piece code (without sign): empty, general, guard, horse, elephant, chariot, cannon, soldier.
+# The General is never captured, so it has no material value.
+PIECE_VALUES = (0, 0, 300, 500, 300, 1300, 700, 200)
+
+# Scores of positions decided by checkmate, and a score beyond any position
+MATE_SCORE = 30000
+INFINITY = 32000
+
+# Half width of the aspiration window around the score of the previous iteration
+ASPIRATION_WINDOW = 50
+
+# Number of nodes searched between two checks of the time and node budget
+CHECK_INTERVAL = 1024
+
+# Bound types of the scores stored in the transposition table. EMPTY marks an unused entry.
+EMPTY, EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2, 3
+
+# Transposition table entry: position hash, move code, score, depth, bound type, search generation and a pad byte.
+# Each bucket holds two entries: a depth-preferred entry and an always-replace entry.
+ENTRY_FORMAT = struct.Struct('<QHhBBBx')
+ENTRY_SIZE = ENTRY_FORMAT.size
+BUCKET_SIZE = 2 * ENTRY_SIZE
+
+# Default size of the transposition table of an Engine, in MB
+DEFAULT_TABLE_MB = 16
+
+
+class Engine:
+    """
+    A class representing a search engine choosing moves for the player whose turn it is in a JanggiGame. The engine
+    runs a negamax alpha-beta search with iterative deepening and aspiration windows, extended by a quiescence search
+    of captures, within a time and/or node budget.
+
+    The search explores the game itself with push and pop, so the game is left exactly as it was found once the search
+    returns.
+    """
+
+    def __init__(self, game: JanggiGame, table=None, start_depth=1, book=None, tablebases=None):
+        """
+        Initializes an Engine for the received JanggiGame. The engine uses the received TranspositionTable, or a new
+        one of DEFAULT_TABLE_MB when none is received. Iterative deepening starts at start_depth moves deep. When an
+        OpeningBook (see JanggiBook.py) is received, positions found in it are answered with a book move, without
+        searching. When Tablebases (see JanggiTablebase.py) are received, positions found in them are scored exactly
+        during the search, without searching below them.
+        """
+        self._game = game
+        self._cells = game.get_board().get_cells()
+        self._table = TranspositionTable(DEFAULT_TABLE_MB) if table is None else table
+        self._start_depth = start_depth
+        self._book = book
+        self._tablebases = tablebases
+        self._nodes = 0
+        self._max_nodes = None
+        self._deadline = None
+        self._path = set()
+
+    def best_move(self, time_ms=1000, max_nodes=None, max_depth=64) -> tuple or None:
+        """
+        Searches the current position for up to time_ms milliseconds (and up to max_nodes nodes, and max_depth moves
+        deep, when given). Returns the best (from, to) pair of squares found, as accepted by make_move, or None if
+        there is no legal move.
+        """
+        result = self.search(time_ms, max_nodes, max_depth)
+        if result.move is None:
+            return
+        return decode_move(result.move)
+
+    def search(self, time_ms=None, max_nodes=None, max_depth=64):
+        """
+        Searches the current position with iterative deepening, one move deeper each iteration, until the time budget
+        (time_ms milliseconds), the node budget (max_nodes) or max_depth is reached. Returns a SearchResult for the
+        deepest completed iteration, or for the book move of the position when it is in the opening book.
+        """
+        game = self._game
+        if self._book is not None:
+            move = self._book.choose_move(game)
+            if move is not None:
+                return SearchResult(move, 0, 0, 0, book=True)
+
+        self._nodes = 0
+        self._max_nodes = max_nodes
+        self._deadline = None if time_ms is None else time.perf_counter() + time_ms / 1000
+        self._path = set()
+        self._table.new_search()
+
+        root_moves = self._order_moves(game.legal_move_codes())
+        if not root_moves:
+            return SearchResult(None, -MATE_SCORE, 0, 0)
+
+        history_length = len(game.get_move_history())
+        best = SearchResult(root_moves[0], 0, 0, 0)
+
+        for depth in range(min(self._start_depth, max_depth), max_depth + 1):
+            try:
+                if best.depth >= 2:
+                    alpha, beta = best.score - ASPIRATION_WINDOW, best.score + ASPIRATION_WINDOW
+                    score, move = self._search_root(root_moves, depth, alpha, beta)
+
+                    # Outside the aspiration window: search again with a full window
+                    if score <= alpha or score >= beta:
+                        score, move = self._search_root(root_moves, depth, -INFINITY, INFINITY)
+                else:
+                    score, move = self._search_root(root_moves, depth, -INFINITY, INFINITY)
+
+            except SearchStopped:
+                while len(game.get_move_history()) > history_length:
+                    game.pop()
+                self._path.clear()
+                break
+
+            best = SearchResult(move, score, depth, self._nodes)
+
+            # Search the best move first in the next iteration
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+
+            # A forced mate has been found, deeper iterations cannot improve on it
+            if abs(score) >= MATE_SCORE - depth:
+                break
+
+        best.nodes = self._nodes
+        return best
+
+    def _search_root(self, root_moves, depth, alpha, beta) -> tuple:
+        """
+        Searches each root move depth moves deep within the (alpha, beta) window. Returns the best score and move.
+        """
+        game = self._game
+        material = self._material()
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = root_moves[0]
+
+        self._path.add(game.position_hash())
+        for move in root_moves:
+            captured = self._captured(move)
+            game.push(move)
+            score = -self._negamax(depth - 1, -beta, -alpha, 1, -(material + PIECE_VALUES[captured]))
+            game.pop()
+
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        self._path.discard(game.position_hash())
+
+        bound = bound_type(best_score, original_alpha, beta)
+        self._table.store(game.position_hash(), best_move, best_score, depth, bound)
+        return best_score, best_move
+
+    def _negamax(self, depth, alpha, beta, ply, material) -> int:
+        """
+        Recursive negamax alpha-beta search of the current position, depth moves deep within the (alpha, beta) window.
+        Receives the number of moves from the root (ply), and the material balance from the point of view of the player
+        to move. Returns the score of the position from the point of view of the player to move.
+        """
+        self._count_node()
+        game = self._game
+
+        # A position repeated along the search path is scored as a draw
+        position_hash = game.position_hash()
+        if position_hash in self._path:
+            return 0
+
+        # A position in the tablebases has an exact score: a checkmate at a known distance, or a draw
+        if self._tablebases is not None:
+            entry = self._tablebases.probe(game)
+            if entry is not None:
+                result, distance = entry
+                if result == WIN:
+                    return MATE_SCORE - ply - distance
+                if result == LOSS:
+                    return -MATE_SCORE + ply + distance
+                return 0
+
+        if depth <= 0:
+            return self._quiescence(alpha, beta, material)
+
+        # A score stored for this position at least as deep ends the search here if it is exact or outside the window
+        hash_move = None
+        entry = self._table.probe(position_hash)
+        if entry is not None:
+            hash_move, score, entry_depth, bound = entry
+            if entry_depth >= depth:
+                score = score_from_table(score, ply)
+                if bound == EXACT or bound == LOWER_BOUND and score >= beta or bound == UPPER_BOUND and score <= alpha:
+                    return score
+
+        moves = game.legal_move_codes()
+
+        # No legal moves (not even a pass) means checkmate
+        if not moves:
+            return -MATE_SCORE + ply
+
+        moves = self._order_moves(moves)
+        if hash_move in moves:
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = moves[0]
+        self._path.add(position_hash)
+        for move in moves:
+            captured = self._captured(move)
+            game.push(move)
+            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1, -(material + PIECE_VALUES[captured]))
+            game.pop()
+
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        self._path.discard(position_hash)
+
+        bound = bound_type(best_score, original_alpha, beta)
+        self._table.store(position_hash, best_move, score_to_table(best_score, ply), depth, bound)
+
+        return best_score
+
+    def _quiescence(self, alpha, beta, material) -> int:
+        """
+        Searches only the captures of the current position until it is quiet, so that the material balance is not
+        judged in the middle of an exchange. The player to move may also "stand pat" on the current balance.
+        """
+        self._count_node()
+        game = self._game
+
+        if material >= beta:
+            return material
+        if material > alpha:
+            alpha = material
+
+        cells = self._cells
+        captures = [move for move in game.legal_move_codes(include_pass=False) if cells[move % 90]]
+        for move in self._order_moves(captures):
+            captured = self._captured(move)
+            game.push(move)
+            score = -self._quiescence(-beta, -alpha, -(material + PIECE_VALUES[captured]))
+            game.pop()
+
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        return alpha
+
+    def _order_moves(self, moves) -> list:
+        """
+        Receives a list of move codes, and returns them ordered for the search: captures first, by most valuable victim
+        and then least valuable attacker (MVV-LVA), then the quiet moves, and the pass last.
+        """
+        cells = self._cells
+
+        def priority(move):
+            if move == PASS_MOVE:
+                return -1
+            victim = cells[move % 90]
+            if not victim:
+                return 0
+            attacker = cells[move // 90]
+            return 16 * PIECE_VALUES[abs(victim)] - PIECE_VALUES[abs(attacker)] // 100 + 16
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def _captured(self, move) -> int:
+        """
+        Receives a move code, returns the piece code (without sign) it captures in the current position, if any.
+        """
+        from_index, to_index = divmod(move, 90)
+        if from_index == to_index:
+            return 0
+        return abs(self._cells[to_index])
+
+    def _material(self) -> int:
+        """
+        Returns the material balance of the current position from the point of view of the player to move.
+        """
+        balance = 0
+        for code in self._cells:
+            if code > 0:
+                balance += PIECE_VALUES[code]
+            elif code < 0:
+                balance -= PIECE_VALUES[-code]
+        if self._game.get_turn() == 'red':
+            return -balance
+        return balance
+
+    def _count_node(self) -> None:
+        """
+        Counts a searched node. Every CHECK_INTERVAL nodes, stops the search with SearchStopped once the time or node
+        budget is spent.
+        """
+        self._nodes += 1
+        if self._nodes % CHECK_INTERVAL:
+            return
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchStopped
+        if self._max_nodes is not None and self._nodes >= self._max_nodes:
+            raise SearchStopped
+
+    def get_nodes(self) -> int:
+        """
+        Returns the number of nodes searched by the last search.
+        """
+        return self._nodes
+
+    def get_table(self):
+        """
+        Returns the TranspositionTable of the engine.
+        """
+        return self._table
+
+
+class TranspositionTable:
+    """
+    A class representing a fixed-size transposition table, storing for positions already searched the best move found,
+    its score, the depth searched and whether the score is exact or a bound.
+
+    The table is one flat buffer of buckets, which never grows past the size it is created with. A position hash picks
+    its bucket, which holds a depth-preferred entry (replaced only by a search at least as deep, or once it is from an
+    earlier search) and an always-replace entry taking everything else.
+    """
+
+    def __init__(self, size_mb=DEFAULT_TABLE_MB, buffer=None):
+        """
+        Initializes a TranspositionTable of at most size_mb MB. The number of buckets is the largest power of two that
+        fits. The table lives in a new bytearray, or in the received writable buffer (e.g. shared memory) when one is
+        received, which must hold at least the size of the table.
+        """
+        self._size = table_size(size_mb)
+        self._mask = self._size // BUCKET_SIZE - 1
+
+        if buffer is None:
+            buffer = bytearray(self._size)
+        elif len(buffer) < self._size:
+            raise ValueError(f'Buffer of {len(buffer)} bytes is too small for a table of {self._size} bytes')
+        self._buffer = buffer
+        self._generation = 0
+
+        self._probes = 0
+        self._hits = 0
+        self._collisions = 0
+        self._stores = 0
+        self._replacements = 0
+
+    def probe(self, position_hash: int) -> tuple or None:
+        """
+        Receives a position hash, returns the stored (move, score, depth, bound) of the position, or None if the
+        position is not in the table. A bucket holding only other positions counts as a collision.
+        """
+        self._probes += 1
+        offset = (position_hash & self._mask) * BUCKET_SIZE
+        unpack_from, buffer = ENTRY_FORMAT.unpack_from, self._buffer
+
+        occupied = False
+        for entry_offset in (offset, offset + ENTRY_SIZE):
+            key, move, score, depth, bound, generation = unpack_from(buffer, entry_offset)
+            if bound == EMPTY:
+                continue
+            if key == position_hash:
+                self._hits += 1
+                return move, score, depth, bound
+            occupied = True
+
+        if occupied:
+            self._collisions += 1
+        return None
+
+    def store(self, position_hash: int, move: int, score: int, depth: int, bound: int) -> None:
+        """
+        Receives a position hash, and the best move, score, depth and bound type of its search, and stores them in the
+        depth-preferred entry of the bucket when it is empty, holds the same position, was stored by an earlier search,
+        or was searched less deep. Otherwise stores them in the always-replace entry.
+        """
+        self._stores += 1
+        offset = (position_hash & self._mask) * BUCKET_SIZE
+        key, _, _, stored_depth, stored_bound, generation = ENTRY_FORMAT.unpack_from(self._buffer, offset)
+
+        if stored_bound != EMPTY and key != position_hash and generation == self._generation and depth < stored_depth:
+            offset += ENTRY_SIZE
+            key, _, _, _, stored_bound, _ = ENTRY_FORMAT.unpack_from(self._buffer, offset)
+
+        if stored_bound != EMPTY and key != position_hash:
+            self._replacements += 1
+        ENTRY_FORMAT.pack_into(self._buffer, offset, position_hash, move, score, min(depth, 255), bound,
+                               self._generation)
+
+    def new_search(self) -> None:
+        """
+        Starts a new search: entries stored by earlier searches may now be replaced regardless of their depth.
+        """
+        self._generation = (self._generation + 1) % 256
+
+    def clear(self) -> None:
+        """
+        Empties the table and resets its statistics.
+        """
+        self._buffer[:self._size] = bytes(self._size)
+        self._generation = 0
+        self._probes = self._hits = self._collisions = self._stores = self._replacements = 0
+
+    def get_size(self) -> int:
+        """
+        Returns the size of the table in bytes.
+        """
+        return self._size
+
+    def get_stats(self) -> dict:
+        """
+        Returns the statistics of the table: the number of probes, hits (position found), collisions (bucket holding
+        only other positions), stores and replacements (entry of another position overwritten), and the hit rate.
+        """
+        return {
+            'size': self._size,
+            'probes': self._probes,
+            'hits': self._hits,
+            'collisions': self._collisions,
+            'stores': self._stores,
+            'replacements': self._replacements,
+            'hit_rate': self._hits / self._probes if self._probes else 0.0
+        }
+
+
+def table_size(size_mb) -> int:
+    """
+    Receives a maximum size in MB, returns the size in bytes of a TranspositionTable of that size: the largest power of
+    two number of buckets that fits.
+    """
+    bucket_count = 1
+    while 2 * bucket_count * BUCKET_SIZE <= size_mb * 1024 * 1024:
+        bucket_count *= 2
+    return bucket_count * BUCKET_SIZE
+
+
+def bound_type(score: int, alpha: int, beta: int) -> int:
+    """
+    Receives the score of a search within the (alpha, beta) window, returns whether it is an exact score, a lower bound
+    (the search failed high) or an upper bound (the search failed low).
+    """
+    if score <= alpha:
+        return UPPER_BOUND
+    if score >= beta:
+        return LOWER_BOUND
+    return EXACT
+
+
+def score_to_table(score: int, ply: int) -> int:
+    """
+    Receives a score found ply moves from the root, returns it as stored in the transposition table: mate scores count
+    the moves to mate from the stored position rather than from the root.
+    """
+    if score > MATE_SCORE - 1000:
+        return score + ply
+    if score < -MATE_SCORE + 1000:
+        return score - ply
+    return score
+
+
+def score_from_table(score: int, ply: int) -> int:
+    """
+    Receives a score stored in the transposition table, returns it as a score found ply moves from the root.
+    """
+    if score > MATE_SCORE - 1000:
+        return score - ply
+    if score < -MATE_SCORE + 1000:
+        return score + ply
+    return score
+
+
+class ParallelEngine:
+    """
+    A class representing a search engine running one Engine per worker process, on copies of the position, to use
+    several CPU cores ("lazy SMP"). The workers search the same position at the same time and share one
+    TranspositionTable in shared memory, so each worker profits from the positions the others have already searched.
+    Half of the workers start one move deeper than the others, so they do not all search the same tree in lock step.
+
+    The workers write to the shared table without locking: a move read from an entry another worker is writing may be
+    wrong, so it is only ever used if it is a legal move of the position.
+
+    A ParallelEngine keeps its worker processes and shared memory until close is called (or the end of a with block).
+    """
+
+    def __init__(self, game: JanggiGame, processes=None, table_mb=DEFAULT_TABLE_MB, book=None):
+        """
+        Initializes a ParallelEngine for the received JanggiGame, with the received number of worker processes (the
+        number of CPU cores when None), sharing a TranspositionTable of table_mb MB. When an OpeningBook is received,
+        positions found in it are answered with a book move, without searching.
+        """
+        self._game = game
+        self._book = book
+        self._processes = processes or multiprocessing.cpu_count()
+        self._table_mb = table_mb
+        self._memory = shared_memory.SharedMemory(create=True, size=table_size(table_mb))
+        self._pool = multiprocessing.Pool(self._processes, _init_worker, (self._memory.name, table_mb))
+
+    def best_move(self, time_ms=1000, max_nodes=None, max_depth=64) -> tuple or None:
+        """
+        Searches the current position for up to time_ms milliseconds (and up to max_nodes nodes per worker, and
+        max_depth moves deep, when given). Returns the best (from, to) pair of squares found, as accepted by make_move,
+        or None if there is no legal move.
+        """
+        result = self.search(time_ms, max_nodes, max_depth)
+        if result.move is None:
+            return
+        return decode_move(result.move)
+
+    def search(self, time_ms=None, max_nodes=None, max_depth=64):
+        """
+        Searches the current position on every worker process, until the time budget (time_ms milliseconds), the node
+        budget of each worker (max_nodes) or max_depth is reached. Returns the SearchResult of the worker that
+        completed the deepest iteration, with the nodes searched by all workers, or for the book move of the position
+        when it is in the opening book.
+        """
+        if not self._game.legal_move_codes():
+            return SearchResult(None, -MATE_SCORE, 0, 0)
+        if self._book is not None:
+            move = self._book.choose_move(self._game)
+            if move is not None:
+                return SearchResult(move, 0, 0, 0, book=True)
+
+        start_fen, moves = self._game.get_start_fen(), self._game.get_move_history()
+        tasks = [(start_fen, moves, 1 + worker % 2, time_ms, max_nodes, max_depth) for worker in range(self._processes)]
+        results = self._pool.starmap(_search_worker, tasks)
+
+        best = max(results, key=lambda result: result.depth)
+        return SearchResult(best.move, best.score, best.depth, sum(result.nodes for result in results))
+
+    def perft(self, depth: int, include_pass=True) -> int:
+        """
+        Counts the leaf nodes depth moves deep from the current position like JanggiGame.perft, splitting the moves
+        of the current position between the worker processes.
+        """
+        if depth == 0:
+            return 1
+        start_fen, moves = self._game.get_start_fen(), self._game.get_move_history()
+        tasks = [
+            (start_fen, moves, move, depth - 1, include_pass) for move in self._game.legal_move_codes(include_pass)
+        ]
+        return sum(self._pool.starmap(_perft_worker, tasks, chunksize=1))
+
+    def close(self) -> None:
+        """
+        Stops the worker processes and releases the shared memory of the transposition table.
+        """
+        self._pool.terminate()
+        self._pool.join()
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Transposition table of a worker process of a ParallelEngine, in the shared memory of the engine
+_worker_memory = None
+_worker_table = None
+
+
+def _init_worker(memory_name: str, table_mb: int) -> None:
+    """
+    Initializes a worker process of a ParallelEngine: attaches the shared memory of the transposition table.
+    """
+    global _worker_memory, _worker_table
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_table = TranspositionTable(table_mb, _worker_memory.buf)
+
+
+def _load_moves(start_fen, moves) -> JanggiGame:
+    """
+    Receives the FEN of the position a game started from and the list of its move codes, returns a JanggiGame with
+    those moves pushed from that position (see JanggiGame.get_start_fen).
+    """
+    game = JanggiGame.from_fen(start_fen)
+    for move in moves:
+        game.push(move)
+    return game
+
+
+def _search_worker(start_fen, moves, start_depth, time_ms, max_nodes, max_depth):
+    """
+    Searches, in a worker process, the position reached by the received move codes from the FEN position. Returns the
+    SearchResult.
+    """
+    engine = Engine(_load_moves(start_fen, moves), _worker_table, start_depth)
+    return engine.search(time_ms, max_nodes, max_depth)
+
+
+def _perft_worker(start_fen, moves, move, depth, include_pass) -> int:
+    """
+    Counts, in a worker process, the leaf nodes depth moves deep after the received move, in the position reached by
+    the received move codes from the FEN position.
+    """
+    game = _load_moves(start_fen, moves)
+    game.push(move)
+    return game.perft(depth, include_pass=include_pass)
+
+
+class SearchResult:
+    """
+    A class representing the outcome of a search: the best move code found (None if there is no legal move), its score
+    from the point of view of the player to move, the depth of the deepest completed iteration, the number of nodes
+    searched, and whether the move was taken from an opening book instead (with a score, depth and nodes of 0).
+    """
+
+    def __init__(self, move, score, depth, nodes, book=False):
+        """
+        Initializes a SearchResult.
+        """
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.book = book
+
+    def __repr__(self):
+        """
+        Internal representation of a SearchResult shows the move in algebraic notation and the search statistics.
+        """
+        move = None if self.move is None else ''.join(decode_move(self.move))
+        if self.book:
+            return f'<SearchResult {move} book>'
+        return f'<SearchResult {move} score={self.score} depth={self.depth} nodes={self.nodes}>'
+
+
+class SearchStopped(Exception):
+    """
+    Exception that gets thrown inside a search once its time or node budget is spent, to unwind the search.
+    """
+    pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='JanggiGame engine self-play')
+    parser.add_argument('--time-ms', type=int, default=1000, help='search time per move in milliseconds')
+    parser.add_argument('--processes', type=int, default=1, help='number of worker processes searching in parallel')
+    parser.add_argument('--max-moves', type=int, default=200, help='number of moves after which the game is stopped')
+    parser.add_argument('--book', help='opening book file consulted before searching')
+    parser.add_argument('--tablebases',
+                        help='directory of endgame tablebases probed during the search (one process only)')
+    parser.add_argument('--fen', help='position to start from, in FEN notation (default: the starting position)')
+    args = parser.parse_args()
+
+    game = JanggiGame() if args.fen is None else JanggiGame.from_fen(args.fen)
+    book = None
+    if args.book is not None:
+        book = OpeningBook(args.book, random.Random())
+    tablebases = None if args.tablebases is None else Tablebases(args.tablebases)
+    if args.processes == 1:
+        engine = Engine(game, book=book, tablebases=tablebases)
+    else:
+        engine = ParallelEngine(game, args.processes, book=book)
+    while game.get_game_state() == 'UNFINISHED' and len(game.get_move_history()) < args.max_moves:
+        result = engine.search(args.time_ms)
+        if result.move is None:
+            break
+        from_square, to_square = decode_move(result.move)
+        print(f'{game.get_turn():<4} {from_square}-{to_square}  {result}')
+        move_result = game.make_move(from_square, to_square)
+        if not move_result:
+            print(f'The engine chose a move that could not be played: {move_result.get_reason()}')
+            break
+    print(game.get_game_state())
+    if args.processes != 1:
+        engine.close()
+    if book is not None:
+        book.close()
+    if tablebases is not None:
+        tablebases.close()
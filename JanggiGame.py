@@ -1,10 +1,187 @@
 #!/usr/bin/env python3
 
+import random
+
 # Color Constants for board printing
 BLUE = '\033[94m'
 RED = '\033[91m'
 END_COLOR = '\033[0m'
 
+# Piece codes for the compact position core. Each of the 90 board cells holds EMPTY, or the code of the piece on that
+# cell: positive for blue pieces and negative for red pieces.
+EMPTY = 0
+GENERAL = 1
+GUARD = 2
+HORSE = 3
+ELEPHANT = 4
+CHARIOT = 5
+CANNON = 6
+SOLDIER = 7
+
+PIECE_CODES = {
+    'general': GENERAL,
+    'guard': GUARD,
+    'horse': HORSE,
+    'elephant': ELEPHANT,
+    'chariot': CHARIOT,
+    'cannon': CANNON,
+    'soldier': SOLDIER
+}
+PIECE_TYPES = {code: piece_type for piece_type, code in PIECE_CODES.items()}
+PLAYER_SIGNS = {'blue': 1, 'red': -1}
+
+# Piece letters of the FEN notation of positions (see JanggiGame.to_fen): uppercase for blue pieces, lowercase for red
+# pieces
+FEN_LETTERS = {
+    'general': 'K',
+    'guard': 'A',
+    'horse': 'H',
+    'elephant': 'E',
+    'chariot': 'R',
+    'cannon': 'C',
+    'soldier': 'P'
+}
+FEN_PIECES = {letter: piece_type for piece_type, letter in FEN_LETTERS.items()}
+FEN_PLAYERS = {'b': 'blue', 'r': 'red'}
+STARTING_FEN = 'reha1aehr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4/REHA1AEHR b'
+
+# Cell indexes follow the order of Board._squares, e.g. 'a1' is 0, 'i1' is 8, 'a2' is 9 and 'i10' is 89
+FILES = 'abcdefghi'
+SQUARE_NAMES = tuple(f'{file}{row}' for row in range(1, 11) for file in FILES)
+SQUARE_INDEXES = {name: index for index, name in enumerate(SQUARE_NAMES)}
+
+# (file step, row step) for each direction used in the piece move maps
+DIRECTIONS = {
+    'up': (0, -1),
+    'up_left': (-1, -1),
+    'left': (-1, 0),
+    'down_left': (-1, 1),
+    'down': (0, 1),
+    'down_right': (1, 1),
+    'right': (1, 0),
+    'up_right': (1, -1)
+}
+
+
+def _build_neighbours() -> dict:
+    """
+    Builds the index equivalent of the Square neighbor pointers. Returns a dictionary mapping each direction to a tuple
+    of 90 entries, holding the index of the neighboring cell in that direction, or None for the edge of the board.
+    """
+    neighbours = dict()
+    for direction, (file_step, row_step) in DIRECTIONS.items():
+        targets = []
+        for index in range(90):
+            file = index % 9 + file_step
+            row = index // 9 + row_step
+            if 0 <= file < 9 and 0 <= row < 10:
+                targets.append(9 * row + file)
+            else:
+                targets.append(None)
+        neighbours[direction] = tuple(targets)
+    return neighbours
+
+
+NEIGHBOURS = _build_neighbours()
+
+
+def _build_zobrist_keys() -> tuple:
+    """
+    Builds the random 64-bit Zobrist keys used to hash positions. Returns a dictionary mapping each signed piece code to
+    a tuple of 90 keys (one per cell), and the key for red to move. A fixed seed keeps hashes stable between runs and
+    processes, so they can be stored.
+    """
+    rng = random.Random(0x4A414E474749)
+    piece_keys = {
+        sign * code: tuple(rng.getrandbits(64) for _ in range(90))
+        for code in PIECE_TYPES for sign in PLAYER_SIGNS.values()
+    }
+    return piece_keys, rng.getrandbits(64)
+
+
+ZOBRIST_PIECES, ZOBRIST_RED_TO_MOVE = _build_zobrist_keys()
+
+# A move code packs the 'from' and 'to' cell indexes of a move as from * 90 + to. Codes with the same 'from' and 'to'
+# cell are a "pass", and PASS_MOVE is the canonical pass.
+PASS_MOVE = 0
+
+# Result codes of make_move (see MoveResult), and the reason each gives for the move not being played
+MOVE_OK = 0
+INVALID_SQUARE = 1
+NO_PIECE = 2
+NOT_YOUR_PIECE = 3
+ILLEGAL_DESTINATION = 4
+LEAVES_GENERAL_IN_CHECK = 5
+GAME_OVER = 6
+MOVE_RESULT_REASONS = {
+    MOVE_OK: 'Move played',
+    INVALID_SQUARE: 'Invalid square - enter squares from "a1" to "i10"',
+    NO_PIECE: 'There is no piece on the square moved from',
+    NOT_YOUR_PIECE: 'The piece on the square moved from belongs to the other player',
+    ILLEGAL_DESTINATION: 'The piece cannot move to the square moved to',
+    LEAVES_GENERAL_IN_CHECK: "The move leaves the player's General in check",
+    GAME_OVER: 'The game is over'
+}
+
+# Function receiving a message for every move rejected and invalid square entered, or None (see set_log_hook)
+_log_hook = None
+
+
+def set_log_hook(hook) -> None:
+    """
+    Takes a function receiving a message string, e.g. print or the info method of a logging.Logger, which is called
+    with a description of every move rejected by make_move and every invalid square entered. Takes None (the default)
+    to stop logging, so rejected moves cost no output at all.
+    """
+    global _log_hook
+    _log_hook = hook
+
+
+def _log(message: str) -> None:
+    """
+    Passes a message to the log hook, if there is one (see set_log_hook).
+    """
+    if _log_hook is not None:
+        _log_hook(message)
+
+
+def encode_move(from_square: str, to_square: str) -> int:
+    """
+    Takes two strings of the square moved from and the square moved to, in algebraic notation, and returns the move
+    code of that move. Raises InvalidSquareError for squares other than 'a1' through 'i10'.
+    """
+    if from_square not in SQUARE_INDEXES or to_square not in SQUARE_INDEXES:
+        raise InvalidSquareError
+    return SQUARE_INDEXES[from_square] * 90 + SQUARE_INDEXES[to_square]
+
+
+def decode_move(move: int) -> tuple:
+    """
+    Takes a move code, and returns the (from, to) pair of squares of that move in algebraic notation.
+    """
+    from_index, to_index = divmod(move, 90)
+    return SQUARE_NAMES[from_index], SQUARE_NAMES[to_index]
+
+# Palace geometry by cell index: the 3x3 palace of each player, and the palace squares on the palace diagonals which
+# augment piece movement to allow diagonals
+PALACE_INDEXES = {
+    'blue': frozenset(9 * row + file for row in (7, 8, 9) for file in (3, 4, 5)),
+    'red': frozenset(9 * row + file for row in (0, 1, 2) for file in (3, 4, 5))
+}
+ALL_PALACE_INDEXES = PALACE_INDEXES['blue'] | PALACE_INDEXES['red']
+
+# Rows (0 for row '1') a soldier of each player can stand on: its starting row and the rows ahead of it, as soldiers
+# never move backwards
+SOLDIER_ROWS = {'blue': range(0, 7), 'red': range(3, 10)}
+PALACE_MOVE_AUGMENTING_INDEXES = {
+    'blue': frozenset(SQUARE_INDEXES[square] for square in ('d8', 'f8', 'e9', 'd10', 'f10')),
+    'red': frozenset(SQUARE_INDEXES[square] for square in ('d1', 'f1', 'e2', 'd3', 'f3'))
+}
+
+# Occupancy lines of each cell: (row line, file line, bit of the cell in its row line, bit of the cell in its file
+# line). Board keeps one occupancy bitmask per line: rows 1-10 are lines 0-9, and files a-i are lines 10-18.
+CELL_LINES = tuple((index // 9, 10 + index % 9, 1 << index % 9, 1 << index // 9) for index in range(90))
+
 
 class JanggiGame:
     """
@@ -13,12 +190,147 @@ class JanggiGame:
     put the opponent's General into checkmate!
     """
 
-    def __init__(self):
-        """Initializes a JanggiGame object. Sets up starting player, board and pieces."""
-        self._board = Board()
+    def __init__(self, positions=None, turn='blue'):
+        """
+        Initializes a JanggiGame object. Sets up starting player, board and pieces. The game starts from the starting
+        position, or from the received positions of the pieces (in the format of Board._starting_positions) with the
+        received player to move, e.g. for a position loaded with from_fen.
+        """
+        self._board = Board(positions)
         self._move = self._board.get_move_instance()
+        self._turn = turn
+        self._game_state = 'UNFINISHED'
+
+        # Undo records of the moves played, see push and pop. The attacks data structures of the Movement class are
+        # up to date for the position at _attacks_depth moves deep into the undo stack, or None if they need a rebuild.
+        self._undo_stack = []
+        self._attacks_depth = 0
+
+        # Check flags and game state of a position other than the starting position
+        if positions is not None:
+            for player in ('blue', 'red'):
+                self._move.set_in_check(player, self.is_in_check(player))
+            if self._move.get_in_check(turn) and self._move.is_checkmated(turn):
+                if turn == 'red':
+                    self.set_game_state('BLUE_WON')
+                else:
+                    self.set_game_state('RED_WON')
+
+    @classmethod
+    def from_fen(cls, fen: str):
+        """
+        Takes a position in FEN notation (see to_fen), and returns a new JanggiGame starting from that position, set up
+        in one pass without replaying any moves. Raises InvalidPositionError if the notation is malformed, if either
+        player does not have exactly one General inside their palace, if a guard is outside its palace or a soldier
+        behind its starting row (where no game can bring them), or if the player who just moved is in check.
+        """
+        fields = fen.split()
+        if len(fields) != 2 or fields[1] not in FEN_PLAYERS:
+            raise InvalidPositionError(f'Expected rows and player to move (b or r): {fen!r}')
+        rows = fields[0].split('/')
+        if len(rows) != 10:
+            raise InvalidPositionError(f'Expected 10 rows: {fen!r}')
+
+        positions = {player: {piece_type: [] for piece_type in PIECE_CODES} for player in PLAYER_SIGNS}
+        for row, row_text in enumerate(rows):
+            file = 0
+            for letter in row_text:
+                if letter in '123456789':
+                    file += int(letter)
+                    continue
+                if letter.upper() not in FEN_PIECES or file > 8:
+                    raise InvalidPositionError(f'Invalid row {row_text!r}: {fen!r}')
+                player = 'blue' if letter.isupper() else 'red'
+                positions[player][FEN_PIECES[letter.upper()]].append(SQUARE_NAMES[9 * row + file])
+                file += 1
+            if file != 9:
+                raise InvalidPositionError(f'Row {row_text!r} does not have 9 files: {fen!r}')
+
+        for player, palace in PALACE_INDEXES.items():
+            generals = positions[player]['general']
+            if len(generals) != 1 or SQUARE_INDEXES[generals[0]] not in palace:
+                raise InvalidPositionError(f'The {player} player needs one General inside their palace: {fen!r}')
+            for square in positions[player]['guard']:
+                if SQUARE_INDEXES[square] not in palace:
+                    raise InvalidPositionError(f'The {player} guard on {square} is outside its palace: {fen!r}')
+            for square in positions[player]['soldier']:
+                if SQUARE_INDEXES[square] // 9 not in SOLDIER_ROWS[player]:
+                    raise InvalidPositionError(f'The {player} soldier on {square} is behind its starting row: {fen!r}')
+
+        turn = FEN_PLAYERS[fields[1]]
+        game = cls(positions, turn)
+        if game.is_in_check('red' if turn == 'blue' else 'blue'):
+            raise InvalidPositionError(f'The player who just moved is in check: {fen!r}')
+        return game
+
+    def to_fen(self) -> str:
+        """
+        Returns the current position in FEN notation: the 10 rows from row 1 to row 10 separated by '/', each listing
+        its cells from file 'a' to file 'i' as a piece letter (see FEN_LETTERS; uppercase for blue, lowercase for red)
+        or a digit counting consecutive empty cells, then a space and the player to move, 'b' (blue) or 'r' (red).
+        For example, the starting position is STARTING_FEN.
+        """
+        cells = self._board.get_cells()
+        rows = []
+        for row in range(10):
+            row_text = ''
+            empty = 0
+            for code in cells[9 * row:9 * row + 9]:
+                if code == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row_text += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[PIECE_TYPES[abs(code)]]
+                row_text += letter if code > 0 else letter.lower()
+            if empty:
+                row_text += str(empty)
+            rows.append(row_text)
+        return '/'.join(rows) + ' ' + self._turn[0]
+
+    def get_start_fen(self) -> str:
+        """
+        Returns the position the game started from (before the moves of get_move_history) in FEN notation: STARTING_FEN
+        for a new JanggiGame, or the position a game loaded with from_fen started from. Replaying the move history
+        from this position, e.g. with from_fen and push, reaches the current position.
+        """
+        game = self.clone()
+        while game._undo_stack:
+            game.pop()
+        return game.to_fen()
+
+    def clone(self):
+        """
+        Returns an independent copy of the game, in the same position and with the same player to move, check flags,
+        game state and move history (so the clone can pop the moves played before it was made). Only the compact
+        position core is copied, in a few microseconds; the board geometry, which never changes, is shared, and the
+        Square and Piece objects of the clone are only built if it is used with make_move or printed. Moves played on
+        the clone (or on the game) do not affect the other.
+        """
+        game = JanggiGame.__new__(JanggiGame)
+        game._board = self._board.clone()
+        game._move = game._board.get_move_instance()
+        game._turn = self._turn
+        game._game_state = self._game_state
+        game._undo_stack = self._undo_stack.copy()
+
+        # The attacks data structures of the clone start empty, and are rebuilt by its first make_move
+        game._attacks_depth = None
+        return game
+
+    def reset(self) -> None:
+        """
+        Restores the starting position in place, with Blue to move, an unfinished game state and no move history. The
+        board, its Square objects and the data structures of the game are reused rather than built again, which makes
+        reset much cheaper than a new JanggiGame (see GamePool). As for a clone, the attacks data structures are
+        rebuilt by the next make_move.
+        """
+        self._board.reset()
         self._turn = 'blue'
         self._game_state = 'UNFINISHED'
+        self._undo_stack.clear()
+        self._attacks_depth = None
 
     def __repr__(self):
         """
@@ -56,7 +368,7 @@ class JanggiGame:
         labels = ['1 ', '2 ', '3 ', '4 ', '5 ', '6 ', '7 ', '8 ', '9 ', '10']
         for i in range(0, 90, 9):
             rows += '  ' + labels[i // 9] + ' ┃'
-            rows += '│'.join(map(str, self._board._squares[i: i + 9]))
+            rows += '│'.join(map(str, self._board.get_squares()[i: i + 9]))
             rows += '┃\n'
             if i < 74:
                 if i == 18:
@@ -77,6 +389,18 @@ class JanggiGame:
         """
         return self._game_state
 
+    def get_board(self):
+        """
+        Returns the instance of the Board class of this game.
+        """
+        return self._board
+
+    def get_turn(self) -> str:
+        """
+        Returns the player whose turn it is, 'blue' or 'red'.
+        """
+        return self._turn
+
     def set_game_state(self, state) -> None:
         """
         Takes in a string of current game state, updates game state to that state.
@@ -90,69 +414,226 @@ class JanggiGame:
         Takes two string parameters of the square moved from and the square moved to.
         If the move is valid, updates game and piece board. A move to-and-from the same square is processed as a
         "pass" for that player. Checks for 'check' and 'checkmate', and records movement on game board and pieces.
+
+        Returns a MoveResult, which is true if the move was played. Otherwise, its code tells why not: INVALID_SQUARE,
+        NO_PIECE, NOT_YOUR_PIECE, ILLEGAL_DESTINATION, LEAVES_GENERAL_IN_CHECK or GAME_OVER (see MOVE_RESULT_REASONS).
+        Nothing is printed; rejected moves are passed to the log hook, if any (see set_log_hook).
         """
         # Check if game is already over
         if self.get_game_state() != 'UNFINISHED':
-            return False
+            return self._reject(GAME_OVER, from_square, to_square)
 
-        # Check for player 'pass'
-        if from_square == to_square:
-            self._end_turn()
-            return True
+        # Validate the squares are only a1 through i10
+        if from_square not in SQUARE_INDEXES or to_square not in SQUARE_INDEXES:
+            return self._reject(INVALID_SQUARE, from_square, to_square)
+
+        self._sync_attacks()
 
         player = self._turn
-        if player == 'blue':
-            other_player = 'red'
-        else:
-            other_player = 'blue'
+
+        # Check for player 'pass', which would leave a player in check still in check
+        if from_square == to_square:
+            if self.is_in_check(player):
+                return self._reject(LEAVES_GENERAL_IN_CHECK, from_square, to_square)
+            self.push(PASS_MOVE)
+            self._attacks_depth = len(self._undo_stack)
+            return MOVE_RESULTS[MOVE_OK]
 
         # Validate move
-        if not self._move.is_valid_move(from_square, to_square, player):
-            return False
+        result = self._move.check_move(from_square, to_square, player)
+        if result != MOVE_OK:
+            return self._reject(result, from_square, to_square)
 
-        # Record move - once to board, and once to piece locations
+        # Record move - to board, piece locations and check flags
+        from_square_obj = self._board.get_square_from_string(from_square)
         to_square_obj = self._board.get_square_from_string(to_square)
-        piece_obj = self._board.get_square_from_string(from_square).get_piece()
-        self._move.update_piece_location(player, piece_obj, to_square_obj)
-        self._board.record_move(from_square, to_square)
+        self.push(encode_move(from_square, to_square))
 
         # If in check after move, undo move
         if self.is_in_check(player):
-            from_square_obj = self._board.get_square_from_string(from_square)
-            piece_obj = self._board.get_square_from_string(to_square).get_piece()
-            self._move.update_piece_location(player, piece_obj, from_square_obj)
-            self._board.record_move(to_square, from_square)
-            return False
+            self.pop()
+            return self._reject(LEAVES_GENERAL_IN_CHECK, from_square, to_square)
+
+        # Update the attacks data structure for pieces on both sides affected by the move, and the attacked squares
+        # data structures
+        self._move.update_attacks_after_move(from_square_obj, to_square_obj)
+        self._attacks_depth = len(self._undo_stack)
+
+        # Update game state, if the other player is checkmated. There is no stalemate, as a player who is not in check
+        # can always pass.
+        other_player = self._turn
+        if self._move.get_in_check(other_player) and self._move.is_checkmated(other_player):
+            if other_player == 'red':
+                self.set_game_state('BLUE_WON')
+            else:
+                self.set_game_state('RED_WON')
+
+        return MOVE_RESULTS[MOVE_OK]
+
+    def _reject(self, code, from_square, to_square):
+        """
+        Receives the result code of a move make_move rejects, and its squares. Logs the rejection (see set_log_hook),
+        and returns the MoveResult of the code.
+        """
+        _log(f'Move {from_square}-{to_square} rejected: {MOVE_RESULT_REASONS[code]}')
+        return MOVE_RESULTS[code]
+
+    def push(self, move: int) -> None:
+        """
+        Takes a move code (see encode_move) and plays it for the player whose turn it is, on the board, the piece
+        locations and the check flags. A move code with the same 'from' and 'to' cell is a "pass". The move is not
+        validated, so it should come from the legal moves of the position. The state needed to take the move back is
+        kept as a compact record on the undo stack: the move, the captured piece, the check flags, the game state and
+        the position hash before the move.
 
-        # If moving out of check "undo" check flag
+        Unlike make_move, the attacks data structures are not updated here, which keeps push and pop cheap for search
+        and analysis. They are rebuilt by the next make_move if the position has changed in the meantime.
+        """
+        from_index, to_index = divmod(move, 90)
+        player = self._turn
+        if player == 'blue':
+            other_player = 'red'
         else:
-            self._move.set_in_check(player, False)
+            other_player = 'blue'
 
-        # Update all attacks data structure for pieces on both sides, and the attacked squares data structures
-        self._move.update_attacks(player)
-        self._move.update_attacks(other_player)
+        movement = self._move
+        blue_in_check = movement.get_in_check('blue')
+        red_in_check = movement.get_in_check('red')
+        position_hash = self.position_hash()
+        captured = EMPTY
 
-        # Check for check on opponent after move, set check flag if so
-        if self.is_in_check(other_player):
-            self._move.set_in_check(other_player, True)
+        if from_index != to_index:
+            captured = self._board.apply_move(from_index, to_index)
 
-        # Update game state, if necessary
-        # Checkmate not implemented in time
+            # A legal move never leaves its own General in check, but may put the other General in check
+            movement.set_in_check(player, False)
+            movement.set_in_check(other_player, self.is_in_check(other_player))
 
+        self._undo_stack.append((move, captured, blue_in_check, red_in_check, self._game_state, position_hash))
         self._end_turn()
-        return True
 
-    def is_in_check(self, player: str) -> bool:
+    def pop(self) -> int:
+        """
+        Takes back the last move played with push or make_move, restoring any captured piece, the check flags and the
+        game state. Returns the move code of that move. Raises IndexError if there are no moves to take back.
         """
-        Takes a string representing the player. References whether the player's General's square is in the
-        '_attacked' list of squares. If so, returns True. Otherwise, returns False.
+        move, captured, blue_in_check, red_in_check, game_state, _ = self._undo_stack.pop()
+        from_index, to_index = divmod(move, 90)
+        self._end_turn()
+
+        if from_index != to_index:
+            self._board.revert_move(from_index, to_index, captured)
+
+        self._move.set_in_check('blue', blue_in_check)
+        self._move.set_in_check('red', red_in_check)
+        self._game_state = game_state
+
+        # Taking back moves played before the attacks data structures were last updated makes them out of date
+        if self._attacks_depth is not None and len(self._undo_stack) < self._attacks_depth:
+            self._attacks_depth = None
+
+        return move
+
+    def legal_move_codes(self, include_pass=True) -> list:
+        """
+        Returns a list of the move codes (see encode_move) of every legal move for the player whose turn it is, ending
+        with PASS_MOVE when passing is allowed (not while in check) unless include_pass is False. The game is not
+        changed, and nothing is printed. Returns an empty list once the game is over.
+        """
+        if self._game_state != 'UNFINISHED':
+            return []
+
+        moves = self._move.generate_legal_moves(self._turn)
+        if include_pass and not self.is_in_check(self._turn):
+            moves.append(PASS_MOVE)
+        return moves
+
+    def legal_moves(self, include_pass=True):
+        """
+        Generator yielding the (from, to) pair of squares in algebraic notation of every legal move for the player whose
+        turn it is, as accepted by make_move. A pass is yielded as a pair of equal squares, unless include_pass is
+        False.
+        """
+        for move in self.legal_move_codes(include_pass):
+            yield SQUARE_NAMES[move // 90], SQUARE_NAMES[move % 90]
+
+    def perft(self, depth: int, divide=False, include_pass=True):
+        """
+        Performance test of move generation: counts the positions ("leaf nodes") reached by playing every sequence of
+        legal moves exactly depth moves deep from the current position, with push and pop. Passes are counted as moves,
+        unless include_pass is False. Returns the number of leaf nodes.
+
+        With divide=True, returns a dictionary mapping the (from, to) pair of each legal move in the current position
+        to the number of leaf nodes below it, which helps to narrow down a move generation bug.
+        """
+        if divide:
+            counts = dict()
+            for move in self.legal_move_codes(include_pass):
+                self.push(move)
+                counts[decode_move(move)] = self._perft(depth - 1, include_pass)
+                self.pop()
+            return counts
+
+        if self._game_state != 'UNFINISHED':
+            return 0
+        return self._perft(depth, include_pass)
+
+    def _perft(self, depth, include_pass) -> int:
+        """
+        Recursive helper for perft, counting the leaf nodes depth moves deep from the current position.
+        """
+        if depth == 0:
+            return 1
+
+        moves = self._move.generate_legal_moves(self._turn)
+        if include_pass and not self._move.get_in_check(self._turn):
+            moves.append(PASS_MOVE)
+        if depth == 1:
+            return len(moves)
+
+        nodes = 0
+        for move in moves:
+            self.push(move)
+            nodes += self._perft(depth - 1, include_pass)
+            self.pop()
+        return nodes
+
+    def position_hash(self) -> int:
+        """
+        Returns a 64-bit Zobrist hash identifying the current position: the pieces on the board and the player whose
+        turn it is. The piece part is maintained incrementally by the Board on every move and undo, and the player to
+        move is folded in here, so passes change the hash as well.
         """
-        general_square = self._move.get_general_location_for(player)
+        if self._turn == 'red':
+            return self._board.get_zobrist() ^ ZOBRIST_RED_TO_MOVE
+        return self._board.get_zobrist()
 
-        if general_square.get_string_of_square() in self._move.get_attacked_by(player):
-            return True
+    def get_move_history(self) -> list:
+        """
+        Returns a list of the move codes played so far, in order, including passes.
+        """
+        return [record[0] for record in self._undo_stack]
+
+    def _sync_attacks(self) -> None:
+        """
+        Rebuilds the attacks data structures for both players if moves were pushed or popped since their last update.
+        """
+        if self._attacks_depth != len(self._undo_stack):
+            self._move.update_attacks('blue')
+            self._move.update_attacks('red')
+            self._attacks_depth = len(self._undo_stack)
+
+    def is_in_check(self, player: str) -> bool:
+        """
+        Takes a string representing the player. Returns True if the player's General's square is attacked by any of
+        the other player's pieces in the current position. Otherwise, returns False.
+        """
+        if player == 'blue':
+            other_player = 'red'
         else:
-            return False
+            other_player = 'blue'
+
+        return self._move.is_cell_attacked(self._move.get_general_index(player), other_player)
 
     def _end_turn(self) -> None:
         """
@@ -164,6 +645,57 @@ class JanggiGame:
             self._turn = 'blue'
 
 
+class GamePool:
+    """
+    A class representing a pool of JanggiGame instances to hand out and recycle, for services that start and throw
+    away games constantly. acquire hands out a game in the starting position, reused from the pool when one is free,
+    and release gives a game back to the pool, which resets it in place (see JanggiGame.reset) rather than letting a
+    new game be built. Up to max_size free games are kept; games released beyond that are left to be garbage collected.
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        Initializes an empty GamePool keeping up to max_size free games.
+        """
+        self._free = []
+        self._max_size = max_size
+        self._template = JanggiGame()
+        self._created = 0
+        self._reused = 0
+
+    def acquire(self) -> JanggiGame:
+        """
+        Returns a game in the starting position: a free game of the pool if there is one, otherwise a new one (a clone
+        of a game in the starting position, see JanggiGame.clone).
+        """
+        if self._free:
+            self._reused += 1
+            return self._free.pop()
+        self._created += 1
+        return self._template.clone()
+
+    def release(self, game: JanggiGame) -> None:
+        """
+        Receives a game handed out by acquire (or any JanggiGame) that is no longer used, and keeps it, reset, for a
+        later acquire, unless the pool already holds max_size free games. The game must not be used after release.
+        """
+        if len(self._free) < self._max_size:
+            game.reset()
+            self._free.append(game)
+
+    def get_free_count(self) -> int:
+        """
+        Returns the number of free games in the pool.
+        """
+        return len(self._free)
+
+    def get_stats(self) -> dict:
+        """
+        Returns a dictionary of the number of games acquire created and reused, and the number of free games.
+        """
+        return {'created': self._created, 'reused': self._reused, 'free': len(self._free)}
+
+
 class Board:
     """
     Class representing board comprised of 9x10 squares, where each square is specified using "algebraic notation".
@@ -171,43 +703,60 @@ class Board:
     starts on row 10.
     """
 
-    def __init__(self):
-        """Initializes a Board object. A board is made of of 90 Square objects."""
+    # Geometry and starting positions of the board, which never change, are class data members shared by every board
+    _files = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7, 'i': 8}
+    _rows = {'1': 0, '2': 1, '3': 2, '4': 3, '5': 4, '6': 5, '7': 6, '8': 7, '9': 8, '10': 9}
+    _palace_move_augmenting_squares = {
+        player: {SQUARE_NAMES[index] for index in indexes}
+        for player, indexes in PALACE_MOVE_AUGMENTING_INDEXES.items()
+    }
+
+    # Starting positions of pieces on a board
+    _starting_positions = {
+        'blue': {
+            'general': ['e9'],
+            'guard': ['d10', 'f10'],
+            'horse': ['c10', 'h10'],
+            'elephant': ['b10', 'g10'],
+            'chariot': ['a10', 'i10'],
+            'cannon': ['b8', 'h8'],
+            'soldier': ['a7', 'c7', 'e7', 'g7', 'i7']
+        },
+        'red': {
+            'general': ['e2'],
+            'guard': ['d1', 'f1'],
+            'horse': ['c1', 'h1'],
+            'elephant': ['b1', 'g1'],
+            'chariot': ['a1', 'i1'],
+            'cannon': ['b3', 'h3'],
+            'soldier': ['a4', 'c4', 'e4', 'g4', 'i4']
+        }
+    }
+
+    def __init__(self, positions=None):
+        """
+        Initializes a Board object. A board is made of of 90 Square objects. Pieces are placed on their starting
+        positions, or on the received positions (a dictionary in the same format as _starting_positions).
+        """
         # Data members for board creation
         self._squares = []
-        self._files = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7, 'i': 8}
-        self._rows = {'1': 0, '2': 1, '3': 2, '4': 3, '5': 4, '6': 5, '7': 6, '8': 7, '9': 8, '10': 9}
+
+        # Compact position core: one piece code per cell (see PIECE_CODES), and the occupied cell indexes per player.
+        # Square objects mirror this state as the object view of the board.
+        self._cells = [EMPTY] * 90
+        self._side_squares = {
+            'blue': set(),
+            'red': set()
+        }
+        self._line_occupancy = [0] * 19
+        self._zobrist = 0
 
         # Data members for reference to palace squares
         self._blue_palace = set()
         self._red_palace = set()
         self._palaces = set()
-        self._palace_move_augmenting_squares = {
-            'blue': {'d8', 'f8', 'e9', 'd10', 'f10'},
-            'red': {'d1', 'f1', 'e2', 'd3', 'f3'}
-        }
 
-        # Starting positions of pieces on a board
-        self._starting_positions = {
-            'blue': {
-                'general': ['e9'],
-                'guard': ['d10', 'f10'],
-                'horse': ['c10', 'h10'],
-                'elephant': ['b10', 'g10'],
-                'chariot': ['a10', 'i10'],
-                'cannon': ['b8', 'h8'],
-                'soldier': ['a7', 'c7', 'e7', 'g7', 'i7']
-            },
-            'red': {
-                'general': ['e2'],
-                'guard': ['d1', 'f1'],
-                'horse': ['c1', 'h1'],
-                'elephant': ['b1', 'g1'],
-                'chariot': ['a1', 'i1'],
-                'cannon': ['b3', 'h3'],
-                'soldier': ['a4', 'c4', 'e4', 'g4', 'i4']
-            }
-        }
+        self._positions = self._starting_positions if positions is None else positions
 
         # Helper methods to setup board, palace, and Movement class composition
         self._setup_squares()
@@ -221,45 +770,10 @@ class Board:
 
     def _setup_squares(self) -> None:
         """
-        Instantiates 90 square objects with row and file, and sets pointers to surrounding squares for each square.
+        Instantiates 90 square objects, in cell index order. Their file, row and surrounding squares follow from their
+        index (see Square).
         """
-        # Setup self._squares
-        for row in self._rows.keys():
-            for file in self._files.keys():
-                self._squares.extend([Square(file, row)])
-
-        for index, square in enumerate(self._squares):
-            # Set left pointer, except for 'a' file squares
-            if square.get_file() != 'a':
-                square.set_left(self._squares[index - 1])
-
-            # Set RIGHT pointer, except for 'i' file squares
-            if square.get_file() != 'i':
-                square.set_right(self._squares[index + 1])
-
-            # Set UP pointer, except for '1' row squares
-            if square.get_row() != '1':
-                square.set_up(self._squares[index - 9])
-
-            # Set DOWN pointer, except for '10' row squares
-            if square.get_row() != '10':
-                square.set_down(self._squares[index + 9])
-
-            # Set UP_LEFT pointer, except for 'a' file squares and '1' row squares
-            if square.get_file() != 'a' and square.get_row() != '1':
-                square.set_up_left(self._squares[index - 10])
-
-            # Set UP_RIGHT pointer, except for 'i' file squares and '1' row squares
-            if square.get_file() != 'i' and square.get_row() != '1':
-                square.set_up_right(self._squares[index - 8])
-
-            # Set DOWN_LEFT pointer, except for 'a' file squares and '10' row squares
-            if square.get_file() != 'a' and square.get_row() != '10':
-                square.set_down_left(self._squares[index + 8])
-
-            # Set DOWN_RIGHT pointer, except for 'i' file squares and '10' row squares
-            if square.get_file() != 'i' and square.get_row() != '10':
-                square.set_down_right(self._squares[index + 10])
+        self._squares.extend(Square(index, self._squares) for index in range(90))
 
     def _setup_palaces(self) -> None:
         """
@@ -279,56 +793,152 @@ class Board:
         self._palaces = self._blue_palace.union(self._red_palace)
 
     def _setup_pieces(self) -> None:
-        """Places pieces on board based on their starting board positions."""
-        starting_positions = self._starting_positions
-        for player in starting_positions:
-            for piece, square_list in starting_positions[player].items():
+        """Places pieces on board based on their starting board positions (or the positions received by __init__)."""
+        positions = self._positions
+        for player in positions:
+            for piece, square_list in positions[player].items():
+                piece_obj = PIECES[PLAYER_SIGNS[player] * PIECE_CODES[piece]]
                 for square_string in square_list:
+                    self.place_piece(self.get_square_from_string(square_string), piece_obj)
                     if piece == 'general':
-                        piece_obj = General(player)
-                    elif piece == 'guard':
-                        piece_obj = Guard(player)
-                    elif piece == 'horse':
-                        piece_obj = Horse(player)
-                    elif piece == 'elephant':
-                        piece_obj = Elephant(player)
-                    elif piece == 'chariot':
-                        piece_obj = Chariot(player)
-                    elif piece == 'cannon':
-                        piece_obj = Cannon(player)
-                    else:  # piece_obj == 'soldier'
-                        piece_obj = Soldier(player)
-
-                    square_obj = self.get_square_from_string(square_string)
-                    square_obj.place_piece(piece_obj)
-                    self._move.update_piece_location(player, piece_obj, square_obj)
+                        self._move.set_general_index(player, SQUARE_INDEXES[square_string])
+
+    def place_piece(self, square_obj, piece_obj) -> None:
+        """
+        Receives a Square object and a Piece object, and places that piece on the square, both on the Square object and
+        in the compact position core.
+        """
+        square_obj.place_piece(piece_obj)
+        code = PLAYER_SIGNS[piece_obj.get_player()] * PIECE_CODES[piece_obj.get_type()]
+        self._place_code(square_obj.get_index(), code)
+
+    def _place_code(self, index, code) -> None:
+        """
+        Receives a cell index and a non-empty piece code, and places that code in the compact position core.
+        """
+        self._cells[index] = code
+        self._side_squares['blue' if code > 0 else 'red'].add(index)
+        self._zobrist ^= ZOBRIST_PIECES[code][index]
+
+        row_line, file_line, row_bit, file_bit = CELL_LINES[index]
+        self._line_occupancy[row_line] |= row_bit
+        self._line_occupancy[file_line] |= file_bit
+
+    def _move_code(self, from_index, to_index) -> int:
+        """
+        Moves the piece code on the 'from' cell to the 'to' cell of the compact position core. Returns the code of the
+        captured piece, or EMPTY if the 'to' cell was empty.
+        """
+        cells = self._cells
+        code = cells[from_index]
+        captured = cells[to_index]
+        cells[to_index] = code
+        cells[from_index] = EMPTY
+
+        if code > 0:
+            player, other_player = 'blue', 'red'
+        else:
+            player, other_player = 'red', 'blue'
+        self._side_squares[player].discard(from_index)
+        self._side_squares[player].add(to_index)
+        keys = ZOBRIST_PIECES[code]
+        self._zobrist ^= keys[from_index] ^ keys[to_index]
+        if captured:
+            self._side_squares[other_player].discard(to_index)
+            self._zobrist ^= ZOBRIST_PIECES[captured][to_index]
+
+        line_occupancy = self._line_occupancy
+        row_line, file_line, row_bit, file_bit = CELL_LINES[from_index]
+        line_occupancy[row_line] &= ~row_bit
+        line_occupancy[file_line] &= ~file_bit
+        row_line, file_line, row_bit, file_bit = CELL_LINES[to_index]
+        line_occupancy[row_line] |= row_bit
+        line_occupancy[file_line] |= file_bit
+        return captured
+
+    def probe_move(self, from_index, to_index) -> int:
+        """
+        Moves a piece code between two cells, updating only the cells and the line occupancy of the compact position
+        core. This looks ahead at a move (for instance, whether it leaves a General in check) without touching the
+        Square objects, the pieces per player or the hash. Returns the captured piece code, for unprobe_move.
+        """
+        cells = self._cells
+        line_occupancy = self._line_occupancy
+        captured = cells[to_index]
+        cells[to_index] = cells[from_index]
+        cells[from_index] = EMPTY
+
+        row_line, file_line, row_bit, file_bit = CELL_LINES[from_index]
+        line_occupancy[row_line] &= ~row_bit
+        line_occupancy[file_line] &= ~file_bit
+        row_line, file_line, row_bit, file_bit = CELL_LINES[to_index]
+        line_occupancy[row_line] |= row_bit
+        line_occupancy[file_line] |= file_bit
+        return captured
+
+    def unprobe_move(self, from_index, to_index, captured) -> None:
+        """
+        Takes back a move made with probe_move, receiving the same cell indexes and the captured piece code it returned.
+        """
+        cells = self._cells
+        line_occupancy = self._line_occupancy
+        cells[from_index] = cells[to_index]
+        cells[to_index] = captured
+
+        row_line, file_line, row_bit, file_bit = CELL_LINES[from_index]
+        line_occupancy[row_line] |= row_bit
+        line_occupancy[file_line] |= file_bit
+        if not captured:
+            row_line, file_line, row_bit, file_bit = CELL_LINES[to_index]
+            line_occupancy[row_line] &= ~row_bit
+            line_occupancy[file_line] &= ~file_bit
 
     def record_move(self, from_str, to_str) -> None:
         """
         Finalizes movement of a piece from one square to another on the game board.
         """
-        from_square = self.get_square_from_string(from_str)
-        to_square = self.get_square_from_string(to_str)
-        to_square.place_piece(from_square.get_piece())
-        from_square.remove_piece()
+        self.apply_move(self._get_index_from_string(from_str), self._get_index_from_string(to_str))
+
+    def apply_move(self, from_index, to_index) -> int:
+        """
+        Receives the cell indexes of the 'from' and 'to' squares, and moves the piece between them in the compact
+        position core, the general locations and, once it is built, the object view (Square objects). Returns the code
+        of the captured piece, or EMPTY if nothing was captured.
+        """
+        captured = self._move_code(from_index, to_index)
+        code = self._cells[to_index]
+        if code == GENERAL or code == -GENERAL:
+            self._move.set_general_index('blue' if code > 0 else 'red', to_index)
+
+        if self._squares is not None:
+            from_square = self._squares[from_index]
+            self._squares[to_index].place_piece(from_square.get_piece())
+            from_square.remove_piece()
+
+        return captured
+
+    def revert_move(self, from_index, to_index, captured) -> None:
+        """
+        Receives the cell indexes of a move previously applied with apply_move, and the code of the piece it captured
+        (or EMPTY). Moves the piece back to the 'from' square, and places the captured piece back on the 'to' square.
+        """
+        self.apply_move(to_index, from_index)
+        if captured:
+            self._place_code(to_index, captured)
+            if self._squares is not None:
+                self._squares[to_index].place_piece(PIECES[captured])
 
     def _get_index_from_string(self, square_string: str) -> int:
         """
         Takes a string algebraic notation representation of a square, and returns the corresponding index of that square
         object in self._squares.
         """
-        # Not a proper file
-        if square_string[0] not in self._files.keys():
-            raise InvalidSquareError
+        index = SQUARE_INDEXES.get(square_string)
 
-        # Not a proper row
-        if square_string[1:] not in self._rows.keys():
+        # Not a proper file and row
+        if index is None:
             raise InvalidSquareError
 
-        file = square_string[0]
-        row = square_string[1:]
-
-        index = 9 * self._rows[row] + self._files[file]
         return index
 
     def get_square_from_string(self, square_string: str):
@@ -337,9 +947,9 @@ class Board:
         """
         try:
             index = self._get_index_from_string(square_string)
-            return self._squares[index]
+            return self.get_squares()[index]
         except InvalidSquareError:
-            print('Invalid square entered')
+            _log(f'Invalid square entered: {square_string!r}')
 
     def get_palace(self, player: str) -> set:
         """
@@ -368,6 +978,121 @@ class Board:
         """
         return self._move
 
+    def get_squares(self) -> list:
+        """
+        Returns the list of the 90 Square objects of the board, in cell index order. The object view of a cloned board
+        is built here on first use.
+        """
+        if self._squares is None:
+            self._build_object_view()
+        return self._squares
+
+    def has_object_view(self) -> bool:
+        """
+        Returns True if the Square objects of the board have been built, otherwise returns False (see clone).
+        """
+        return self._squares is not None
+
+    def _build_object_view(self) -> None:
+        """
+        Builds the object view of a cloned board from its compact position core: the 90 Square objects, with the shared
+        piece object of each piece code on its square (see PIECES).
+        """
+        self._squares = []
+        self._setup_squares()
+        for player in ('blue', 'red'):
+            for index in self._side_squares[player]:
+                self._squares[index].place_piece(PIECES[self._cells[index]])
+
+    def clone(self):
+        """
+        Returns a copy of the board, for a clone of the game. The compact position core is copied, and the geometry and
+        palace data, which never change, are shared. The Square objects (the object view) are not copied, but built
+        from the compact core the first time the clone needs them.
+        """
+        board = Board.__new__(Board)
+        board._squares = None
+        board._cells = self._cells.copy()
+        board._side_squares = {player: indexes.copy() for player, indexes in self._side_squares.items()}
+        board._line_occupancy = self._line_occupancy.copy()
+        board._zobrist = self._zobrist
+        board._blue_palace = self._blue_palace
+        board._red_palace = self._red_palace
+        board._palaces = self._palaces
+        board._positions = self._positions
+        board._move = self._move.clone(board)
+        return board
+
+    def reset(self) -> None:
+        """
+        Places the pieces back on their starting positions in place: in the compact position core, on the Square
+        objects if the object view has been built, and in the Movement class (see Movement.reset).
+        """
+        cells = self._cells
+        squares = self._squares
+        for player in ('blue', 'red'):
+            for index in self._side_squares[player]:
+                cells[index] = EMPTY
+                if squares is not None:
+                    squares[index].remove_piece()
+            self._side_squares[player].clear()
+        self._line_occupancy[:] = [0] * 19
+        self._zobrist = 0
+        self._positions = self._starting_positions
+        self._move.reset()
+
+        for code, index in STARTING_CODES:
+            self._place_code(index, code)
+            if squares is not None:
+                squares[index].place_piece(PIECES[code])
+
+    def set_cell(self, index, code) -> None:
+        """
+        Receives a cell index and a piece code (or EMPTY), and sets that cell of the compact position core, removing
+        the piece on it, if any. Placing a General also records its location in the Movement class.
+
+        This sets up arbitrary positions for analysis (see JanggiTablebase.py) on a board without an object view, such
+        as the board of a clone: the Square objects of a board that has one are not updated.
+        """
+        previous = self._cells[index]
+        if previous:
+            self._cells[index] = EMPTY
+            self._side_squares['blue' if previous > 0 else 'red'].discard(index)
+            self._zobrist ^= ZOBRIST_PIECES[previous][index]
+
+            row_line, file_line, row_bit, file_bit = CELL_LINES[index]
+            self._line_occupancy[row_line] &= ~row_bit
+            self._line_occupancy[file_line] &= ~file_bit
+
+        if code:
+            self._place_code(index, code)
+            if code == GENERAL or code == -GENERAL:
+                self._move.set_general_index('blue' if code > 0 else 'red', index)
+
+    def get_cells(self) -> list:
+        """
+        Returns the compact position core: a list of 90 piece codes, indexed in the same order as the Square objects.
+        """
+        return self._cells
+
+    def get_side_squares(self, player) -> set:
+        """
+        Receives a player, returns the set of cell indexes currently occupied by that player's pieces.
+        """
+        return self._side_squares[player]
+
+    def get_zobrist(self) -> int:
+        """
+        Returns the Zobrist hash of the pieces on the board, maintained incrementally as pieces are placed and moved.
+        """
+        return self._zobrist
+
+    def get_line_occupancy(self) -> list:
+        """
+        Returns the occupancy bitmasks of the board lines (see CELL_LINES), used to look up sliding piece movement.
+        """
+        return self._line_occupancy
+
 
 class Square:
     """
@@ -380,26 +1105,24 @@ class Square:
         ↖ ↑ ↗
         ← □ →
         ↙ ↓ ↘
+
+    The file, row and neighbors of a square are the same on every board, so a Square does not store them: they are
+    looked up from its cell index in the shared tables (SQUARE_NAMES and NEIGHBOURS), and the neighbors are then found
+    in the list of squares of its board. A Square only stores its index, its board's squares and its piece.
     """
 
-    def __init__(self, file, row):
+    # Every board has 90 Square objects, so their data members are slots rather than a per-instance dictionary
+    __slots__ = ('_index', '_squares', '_piece')
+
+    def __init__(self, index, squares):
         """
-        Initializes a Square with file/column and row. The surrounding neighbor pointers are initialized in the Board
-        class.
+        Initializes a Square with its cell index, and the list of Square objects of its board (in cell index order),
+        in which its neighbors are found.
         """
-        self._file = file
-        self._row = row
+        self._index = index
+        self._squares = squares
         self._piece = None
 
-        self._up = None
-        self._up_left = None
-        self._left = None
-        self._down_left = None
-        self._down = None
-        self._down_right = None
-        self._right = None
-        self._up_right = None
-
     def __str__(self):
         """
         String representation of a Square defaults to abbreviated moniker the piece being held, or blank spaces
@@ -414,7 +1137,7 @@ class Square:
         """
         Internal representation of a Square shows its file and row.
         """
-        return f'<{self._file}{self._row}>'
+        return f'<{SQUARE_NAMES[self._index]}>'
 
     def get_piece(self):
         """
@@ -438,115 +1161,91 @@ class Square:
         """
         Returns a string representation of the coordinates of the square.
         """
-        return f'{self._file}{self._row}'
+        return SQUARE_NAMES[self._index]
+
+    def get_index(self):
+        """
+        Returns the index of the square in the compact position core (and in the Board's list of squares).
+        """
+        return self._index
 
     def get_file(self):
         """
         Returns the file of the current square.
         """
-        return self._file
+        return SQUARE_NAMES[self._index][0]
 
     def get_row(self):
         """
         Returns the row of the current square.
         """
-        return self._row
+        return SQUARE_NAMES[self._index][1:]
 
-    def set_up(self, square):
+    def _get_neighbour(self, direction):
         """
-        Takes Square object and sets pointer to square immediately above the current square.
+        Receives a direction (see DIRECTIONS), returns the neighboring Square object in that direction, or None at the
+        edge of the board.
         """
-        self._up = square
+        index = NEIGHBOURS[direction][self._index]
+        if index is None:
+            return
+        return self._squares[index]
 
     def get_up(self):
         """
-        Returns Square object for square immediately above the current square.
-        """
-        return self._up
-
-    def set_up_left(self, square):
-        """
-        Takes Square object and sets pointer to square immediately diagonal above-left the current square.
+        Returns Square object for square immediately above the current square, or None at the edge of the
+        board.
         """
-        self._up_left = square
+        return self._get_neighbour('up')
 
     def get_up_left(self):
         """
-        Returns Square object for square immediately diagonal above-left current square.
-        """
-        return self._up_left
-
-    def set_left(self, square):
-        """
-        Takes Square object and sets pointer to square immediately to the left of current square.
+        Returns Square object for square immediately diagonal above-left the current square, or None at the edge of the
+        board.
         """
-        self._left = square
+        return self._get_neighbour('up_left')
 
     def get_left(self):
         """
-        Returns Square object for square immediately to the left of current square.
+        Returns Square object for square immediately to the left of the current square, or None at the edge of the
+        board.
         """
-        return self._left
-
-    def set_down_left(self, square):
-        """
-        Takes Square object and sets pointer to square immediately diagonal below-left to current square.
-        """
-        self._down_left = square
+        return self._get_neighbour('left')
 
     def get_down_left(self):
         """
-        Returns Square object for square immediately diagonal below-left to current square.
-        """
-        return self._down_left
-
-    def set_down(self, square):
-        """
-        Takes Square object and sets pointer to square immediately below current square.
+        Returns Square object for square immediately diagonal below-left the current square, or None at the edge of the
+        board.
         """
-        self._down = square
+        return self._get_neighbour('down_left')
 
     def get_down(self):
         """
-        Returns Square object for square immediately below current square.
-        """
-        return self._down
-
-    def set_down_right(self, square):
-        """
-        Takes Square object and sets pointer to square immediately diagonal below-right current square.
+        Returns Square object for square immediately below the current square, or None at the edge of the
+        board.
         """
-        self._down_right = square
+        return self._get_neighbour('down')
 
     def get_down_right(self):
         """
-        Returns Square object for square immediately diagonal below-right current square.
-        """
-        return self._down_right
-
-    def set_right(self, square):
-        """
-        Takes Square object and sets pointer to square immediately to the right of current square.
+        Returns Square object for square immediately diagonal below-right the current square, or None at the edge of the
+        board.
         """
-        self._right = square
+        return self._get_neighbour('down_right')
 
     def get_right(self):
         """
-        Returns Square object for square immediately to the right of current square.
+        Returns Square object for square immediately to the right of the current square, or None at the edge of the
+        board.
         """
-        return self._right
-
-    def set_up_right(self, square):
-        """
-        Takes Square object and sets pointer to square immediately diagonal above-right of current square.
-        """
-        self._up_right = square
+        return self._get_neighbour('right')
 
     def get_up_right(self):
         """
-        Returns Square object for square immediately diagonal above-right of current square.
+        Returns Square object for square immediately diagonal above-right the current square, or None at the edge of the
+        board.
         """
-        return self._up_right
+        return self._get_neighbour('up_right')
 
 
 class Movement:
@@ -571,18 +1270,15 @@ class Movement:
             'blue': dict(),
             'red': dict()
         }
-        self._pieces_locations = {
-            'blue': dict(),
-            'red': dict()
-        }
-        self._generals = {
-            'blue': self._board.get_square_from_string('e9'),
-            'red': self._board.get_square_from_string('e2')
+        self._general_indexes = {
+            'blue': SQUARE_INDEXES['e9'],
+            'red': SQUARE_INDEXES['e2']
         }
         self._in_check = {
             'blue': False,
             'red': False
         }
+        self._debug_attacks = False
 
     def is_valid_move(self, from_str: str, to_str: str, player: str) -> bool:
         """
@@ -590,40 +1286,32 @@ class Movement:
         e.g. 'a1', 'b2'. Also ensures the piece being moved belongs to the player who should be taking their turn, and
         that the square indeed has a piece to begin with to move.
         """
-        # Validate the squares are only a1 through i10
-        try:
-            from_square = self._board.get_square_from_string(from_str)
-            self._board.get_square_from_string(to_str)
+        return self.check_move(from_str, to_str, player) == MOVE_OK
 
-        except InvalidSquareError:
-            print('Invalid Square - enter squares from "a1" to "i10"')
-            return False
+    def check_move(self, from_str: str, to_str: str, player: str) -> int:
+        """
+        Receives string representation of the 'from' and 'to' square, e.g. 'a1', 'b2', and the player whose turn it
+        is. Returns MOVE_OK if the move is valid, otherwise the result code telling why not: INVALID_SQUARE, NO_PIECE,
+        NOT_YOUR_PIECE or ILLEGAL_DESTINATION. Whether the move leaves the player's General in check is not checked.
+        """
+        # Validate the squares are only a1 through i10
+        if from_str not in SQUARE_INDEXES or to_str not in SQUARE_INDEXES:
+            return INVALID_SQUARE
 
+        from_square = self._board.get_square_from_string(from_str)
         piece = from_square.get_piece()
 
         # There is no piece on the 'from' square
         if not piece:
-            return False
+            return NO_PIECE
 
         # Piece does not belong to player with active turn
         if player != piece.get_player():
-            return False
-
-        if player == 'blue':
-            other_player = 'red'
-        else:
-            other_player = 'blue'
-
-        from_square = self._board.get_square_from_string(from_str)
-        return to_str in self._attacks[player][from_square]
+            return NOT_YOUR_PIECE
 
-    def update_piece_location(self, player, piece_obj, new_square_obj):
-        """
-        Updates the received player's piece's location to the received square object.
-        """
-        if piece_obj.get_type() == 'general':
-            self._generals[player] = new_square_obj
-        self._pieces_locations[player][piece_obj] = new_square_obj
+        if to_str not in self._attacks[player][from_square]:
+            return ILLEGAL_DESTINATION
+        return MOVE_OK
 
     def update_attacks(self, player):
         """
@@ -638,603 +1326,502 @@ class Movement:
         self._attacks[player].clear()
         self._attacked_by[other_player].clear()
 
-        # update attacks/movable squares for current player's pieces
-        for piece_obj, square_obj in self._pieces_locations[player].items():
-            self._attacks[player][square_obj] = self._find_piece_movement_destinations(square_obj)
+        # update attacks/movable squares for current player's pieces, as found on the board
+        squares = self._board.get_squares()
+        for index in self._board.get_side_squares(player):
+            self._add_attacks(player, other_player, squares[index])
 
-            if self._attacks[player][square_obj] is None:
-                continue
+    def update_attacks_after_move(self, from_square_obj, to_square_obj) -> None:
+        """
+        Receives the Square objects a piece was just moved from and to (the move has already been recorded on the
+        board, and may have captured a piece). Incrementally updates the attacks of both players.
+
+        Only the pieces whose movement passes through either square can have different attacks after the move, so just
+        those pieces are recalculated: the moved piece, and every piece that has one of the two squares within its
+        reach (see REACH). The attacks of a captured piece are dropped. In debug mode, the result is checked against a
+        full recalculation of the attacks of both players.
+        """
+        cells = self._board.get_cells()
+        squares = self._board.get_squares()
+        from_index = from_square_obj.get_index()
+        to_index = to_square_obj.get_index()
 
-            # update map of other player's squares being attacked
-            for possible_destination in self._attacks[player][square_obj]:
+        if cells[to_index] > 0:
+            player, other_player = 'blue', 'red'
+        else:
+            player, other_player = 'red', 'blue'
 
-                if possible_destination not in self._attacked_by[other_player]:
-                    self._attacked_by[other_player][possible_destination] = {square_obj}
-                else:
-                    self._attacked_by[other_player][possible_destination].add(square_obj)
+        # The moved piece, and a captured piece, no longer attack from their previous squares
+        self._remove_attacks(player, other_player, from_square_obj)
+        self._remove_attacks(other_player, player, to_square_obj)
 
-    def get_general_location_for(self, player):
+        # Recalculate the pieces whose movement is affected by either square
+        for side, other_side in ((player, other_player), (other_player, player)):
+            for index in self._board.get_side_squares(side):
+                reach = REACH[cells[index]][index]
+                if index == to_index or from_index in reach or to_index in reach:
+                    self._remove_attacks(side, other_side, squares[index])
+                    self._add_attacks(side, other_side, squares[index])
+
+        if self._debug_attacks:
+            self._verify_attacks()
+
+    def _add_attacks(self, player, other_player, square_obj) -> None:
         """
-        Receives a player, returns the Square object where that player's general is currently residing.
+        Receives a player, the other player, and the Square object of one of the player's pieces. Calculates the
+        movable squares of that piece, and records them in the attacks and attacked-by data structures.
         """
-        return self._generals[player]
+        destinations = self._find_piece_movement_destinations(square_obj)
+        self._attacks[player][square_obj] = destinations
 
-    def get_attacks(self, player) -> dict:
-        """
-        Receives a player, returns a dictionary mapping that player's pieces to their movable squares.
-        """
-        return self._attacks[player]
+        # update map of other player's squares being attacked
+        attacked_by = self._attacked_by[other_player]
+        for possible_destination in destinations:
+            if possible_destination not in attacked_by:
+                attacked_by[possible_destination] = {square_obj}
+            else:
+                attacked_by[possible_destination].add(square_obj)
 
-    def get_attacked_by(self, player):
+    def _remove_attacks(self, player, other_player, square_obj) -> None:
         """
-        Receives a player, returns a dictionary mapping the algebraic notation square strings to the enemy Square
-        objects that can attack those squares.
+        Receives a player, the other player, and a Square object. Removes any attacks recorded for the player's piece
+        on that square from the attacks and attacked-by data structures.
         """
-        return self._attacked_by[player]
+        destinations = self._attacks[player].pop(square_obj, None)
+        if not destinations:
+            return
 
-    def set_in_check(self, player, boolean):
-        """
-        Receives a player, and either the value True or False, to indicate whether that player is or is not in check.
-        """
-        self._in_check[player] = boolean
+        attacked_by = self._attacked_by[other_player]
+        for possible_destination in destinations:
+            attackers = attacked_by[possible_destination]
+            attackers.discard(square_obj)
+            if not attackers:
+                del attacked_by[possible_destination]
 
-    def _find_piece_movement_destinations(self, square_obj) -> set or None:
+    def _verify_attacks(self) -> None:
         """
-        Receives a Square object holding a game piece owned by the player whose turn it is. Returns a set of possible
-        destination squares that result from "one movement". Takes into consideration enemy captures and collisions/
-        obstructions with allied units.
-
-        Since this method receives a Square object, it is assumed the square has been previously validated. Utilizes
-        a set of helper methods specific to each piece to calculate possible moves.
-
-        It is also assumed the player who owns the piece has been previously validated as the active player.
+        Debug helper, checks the incrementally maintained attacks against a full recalculation for both players, and
+        raises an AttackMapError if they differ.
         """
-        piece_obj = square_obj.get_piece()
-
-        if not piece_obj:
-            return
-
-        player = piece_obj.get_player()
-        valid_destinations = set()
-
-        # Gather moves for a general or a guard
-        if piece_obj.get_type() == 'guard' or piece_obj.get_type() == 'general':
-            valid_destinations = self._generate_general_guard_destinations(piece_obj, square_obj, player)
-
-        # Assemble moves for a soldier
-        elif piece_obj.get_type() == 'soldier':
-            valid_destinations = self._generate_soldier_destinations(piece_obj, square_obj, player)
+        attacks = {player: dict(squares) for player, squares in self._attacks.items()}
+        attacked_by = {player: dict(squares) for player, squares in self._attacked_by.items()}
 
-        # Assemble moves for a chariot
-        elif piece_obj.get_type() == 'chariot':
-            valid_destinations = self._generate_chariot_destinations(piece_obj, square_obj, player)
-
-        # Assemble moves for a chariot
-        elif piece_obj.get_type() == 'cannon':
-            valid_destinations = self._generate_cannon_destinations(piece_obj, square_obj, player)
+        self.update_attacks('blue')
+        self.update_attacks('red')
 
-        else:  # Assemble moves for a horse or an elephant
-            for move_list in piece_obj.get_move_map():
-                destination_square = self._valid_move_hor_ele(square_obj, 0, move_list, player, piece_obj)
-                if destination_square:
-                    valid_destinations.add(destination_square)
-
-        return valid_destinations
+        if attacks != self._attacks or attacked_by != self._attacked_by:
+            raise AttackMapError
 
-    def _generate_general_guard_destinations(self, piece_obj, square_obj, player) -> set:
+    def set_debug_attacks(self, boolean) -> None:
         """
-        Receives a General or Guard object, a Square object, and a player. Generates moves for this from a given square.
-
-        Takes into consideration whether the piece is a) in the palace and b) in position where movement is augmented
-        such that a piece may move diagonally where they normally could not (e.g. soldier, chariot, cannon). Moves are
-        generated based on the piece's current position on the board, and call a recursive helper function to generate
-        the moves. The moves are defined by a "moves_list" data member unique to each piece.
+        Receives True or False, to turn on or off checking every incremental update of the attacks against a full
+        recalculation.
         """
-        valid_destinations = set()
-        diagonal_destinations = set()
-
-        # Generate orthogonal movements
-        for move_list in piece_obj.get_move_map():
-            destination_square = self._valid_move_gua_gen(square_obj, 0, move_list, player, piece_obj)
-            if destination_square:
-                valid_destinations.add(destination_square)
-
-        # Generate diagonal movements
-        if square_obj.get_string_of_square() in self._board.get_palace_move_augmenting_squares(player):
+        self._debug_attacks = boolean
 
-            move_map = piece_obj.get_palace_move_map()
-            palace_destinations = set()
-
-            for move_list in move_map:
-                destination_square = self._valid_move_gua_gen(square_obj, 0, move_list, player, piece_obj)
-                if destination_square:
-                    palace_destinations.add(destination_square)
-
-            diagonal_destinations = palace_destinations.intersection(self._board.get_palace(player))
-
-        # Combine orthogonal and diagonal movements
-        valid_destinations = valid_destinations.union(diagonal_destinations)
-
-        # Restrict movement to within the palace
-        valid_destinations = valid_destinations.intersection(self._board.get_palace(player))
-
-        return valid_destinations
-
-    def _generate_soldier_destinations(self, piece_obj, square_obj, player):
+    def get_general_location_for(self, player):
         """
-        Receives a Soldier object, a Square object, and a player. Generates moves for this from a given square.
-
-        Takes into consideration whether the piece is a) in the palace and b) in position where movement is augmented
-        such that a piece may move diagonally where they normally could not (e.g. soldier, chariot, cannon). Moves are
-        generated based on the piece's current position on the board, and call a recursive helper function to generate
-        the moves. The moves are defined by a "moves_list" data member unique to each piece.
+        Receives a player, returns the Square object where that player's general is currently residing.
         """
-        valid_destinations = set()
-        palace_destinations = set()
-
-        move_map = piece_obj.get_move_map()
-
-        # Generate orthogonal movements
-        for move_list in move_map:
-            destination_square = self._valid_move_sol(square_obj, 0, move_list, player, piece_obj)
-            if destination_square:
-                valid_destinations.add(destination_square)
-
-        # Generate diagonal movements (in palace)
-        if square_obj.get_string_of_square() in self._board.get_palace_move_augmenting_squares(player):
-
-            move_map = piece_obj.get_palace_move_map()
-            palace_destinations = set()
-
-            for move_list in move_map:
-                destination_square = self._valid_move_sol(square_obj, 0, move_list, player, piece_obj)
-                if destination_square:
-                    palace_destinations.add(destination_square)
-
-            # Combine orthogonal and diagonal movements, if in palace
-            palace_destinations = palace_destinations.intersection(self._board.get_palaces())
+        return self._board.get_squares()[self._general_indexes[player]]
 
-        return valid_destinations.union(palace_destinations)
-
-    def _generate_chariot_destinations(self, piece_obj, square_obj, player):
+    def get_general_index(self, player) -> int:
         """
-        Receives a Chariot object, a Square object, and a player. Generates moves for this from a given square.
-
-        Takes into consideration whether the piece is a) in the palace and b) in position where movement is augmented
-        such that a piece may move diagonally where they normally could not (e.g. soldier, chariot, cannon). Moves are
-        generated based on the piece's current position on the board, and call a recursive helper function to generate
-        the moves. The moves are defined by a "moves_list" data member unique to each piece.
+        Receives a player, returns the cell index where that player's general is currently residing.
         """
-        valid_destinations = set()
-        palace_destinations = set()
-
-        move_map = piece_obj.get_move_map()
-
-        # Generate orthogonal movements
-        for direction in move_map:
-            destination_squares = self._valid_move_cha(square_obj, direction, player, piece_obj)
-            if destination_squares:
-                valid_destinations = valid_destinations.union(destination_squares)
-
-        # Generate diagonal movements (in palace)
-        if square_obj.get_string_of_square() in self._board.get_palace_move_augmenting_squares(player):
-
-            move_map = piece_obj.get_palace_move_map()
-            palace_destinations = set()
-
-            for direction in move_map:
-                destination_squares = self._valid_move_cha(square_obj, direction, player, piece_obj)
-                if destination_squares:
-                    palace_destinations = palace_destinations.union(destination_squares)
+        return self._general_indexes[player]
 
-            # Combine orthogonal and diagonal movements, if in palace
-            palace_destinations = palace_destinations.intersection(self._board.get_palaces())
-
-        return valid_destinations.union(palace_destinations)
-
-    def _generate_cannon_destinations(self, piece_obj, square_obj, player):
+    def set_general_index(self, player, index) -> None:
         """
-        Receives a Cannon object, a Square object, and a player. Generates moves for this from a given square.
-
-        Takes into consideration whether the piece is a) in the palace and b) in position where movement is augmented
-        such that a piece may move diagonally where they normally could not (e.g. soldier, chariot, cannon). Moves are
-        generated based on the piece's current position on the board, and call a recursive helper function to generate
-        the moves. The moves are defined by a "moves_list" data member unique to each piece.
+        Receives a player and a cell index, and records that player's general as residing on that cell.
         """
-        valid_destinations = set()
-        palace_destinations = set()
+        self._general_indexes[player] = index
 
-        move_map = piece_obj.get_move_map()
-
-        # Generate orthogonal movements
-        for direction in move_map:
-            destination_squares = self._valid_move_can(square_obj, direction, player, piece_obj)
-            if destination_squares:
-                valid_destinations = valid_destinations.union(destination_squares)
-
-        # Generate diagonal movements (in palace)
-        if square_obj.get_string_of_square() in self._board.get_palace_move_augmenting_squares(player):
+    def reset(self) -> None:
+        """
+        Restores the Movement class for the starting position: the generals on their starting squares, no player in
+        check, and the attacks data structures emptied, to be rebuilt by the next make_move.
+        """
+        for player in ('blue', 'red'):
+            self._attacks[player].clear()
+            self._attacked_by[player].clear()
+            self._in_check[player] = False
+        self._general_indexes['blue'] = SQUARE_INDEXES['e9']
+        self._general_indexes['red'] = SQUARE_INDEXES['e2']
 
-            move_map = piece_obj.get_palace_move_map()
-            palace_destinations = set()
+    def clone(self, board_obj):
+        """
+        Receives the Board object of a clone of the game, returns a copy of this Movement for it: the check flags and
+        general locations are copied, while the attacks data structures start empty, to be rebuilt with the object view
+        of the board when needed.
+        """
+        movement = Movement.__new__(Movement)
+        movement._board = board_obj
+        movement._attacks = {'blue': dict(), 'red': dict()}
+        movement._attacked_by = {'blue': dict(), 'red': dict()}
+        movement._general_indexes = self._general_indexes.copy()
+        movement._in_check = self._in_check.copy()
+        movement._debug_attacks = self._debug_attacks
+        return movement
 
-            for direction in move_map:
-                destination_squares = self._valid_move_can(square_obj, direction, player, piece_obj)
-                if destination_squares:
-                    palace_destinations = palace_destinations.union(destination_squares)
+    def get_attacks(self, player) -> dict:
+        """
+        Receives a player, returns a dictionary mapping that player's pieces to their movable squares.
+        """
+        return self._attacks[player]
 
-            # Combine orthogonal and diagonal movements, if in palace
-            palace_destinations = palace_destinations.intersection(self._board.get_palaces())
+    def get_attacked_by(self, player):
+        """
+        Receives a player, returns a dictionary mapping the algebraic notation square strings to the enemy Square
+        objects that can attack those squares.
+        """
+        return self._attacked_by[player]
 
-        return valid_destinations.union(palace_destinations)
+    def set_in_check(self, player, boolean):
+        """
+        Receives a player, and either the value True or False, to indicate whether that player is or is not in check.
+        """
+        self._in_check[player] = boolean
 
-    def _generate_horse_elephant_destinations(self, piece_obj, square_obj, player):
+    def get_in_check(self, player) -> bool:
         """
-        Receives a Horse or Elephant object, a Square object, and a player. Generates moves for this from a given
-        square.
+        Receives a player, returns the check flag of that player.
+        """
+        return self._in_check[player]
 
-        Takes into consideration whether the piece is a) in the palace and b) in position where movement is augmented
-        such that a piece may move diagonally where they normally could not (e.g. soldier, chariot, cannon). Moves are
-        generated based on the piece's current position on the board, and call a recursive helper function to generate
-        the moves. The moves are defined by a "moves_list" data member unique to each piece.
+    def is_cell_attacked(self, index, player) -> bool:
         """
-        valid_destinations = set()
+        Receives a cell index and a player. Returns True if any of the player's pieces can move to (or capture on) that
+        cell in the current position, otherwise returns False.
 
-        # Generate horse, elephant movements
-        for move_list in piece_obj.get_move_map():
+        Instead of generating the moves of every piece, the attackers are looked up backwards from the cell: the fixed
+        path pieces through STEP_ATTACKERS, the chariots and cannons on the same row or file through LINE_RAYS, and
+        the palace diagonals through PALACE_ATTACK_RAYS.
+        """
+        cells = self._board.get_cells()
+        sign = PLAYER_SIGNS[player]
+        target = cells[index]
 
-            # Trace one movement, determine if valid
-            destination_square = self._valid_move_sol(square_obj, 0, move_list, player, piece_obj)
+        # The player's own pieces are never attacked by that player
+        if target * sign > 0:
+            return False
 
-            # Movement obstructed, out of bounds, or otherwise
-            if destination_square:
-                valid_destinations.add(destination_square)
+        # Generals, guards, soldiers, horses and elephants
+        for code in STEP_ATTACKER_CODES[player]:
+            for source, legs in STEP_ATTACKERS[code][index]:
+                if cells[source] == code:
+                    for leg in legs:
+                        if cells[leg]:
+                            break
+                    else:
+                        return True
+
+        # Chariots and cannons on the same row or file. A cannon cannot jump over or capture another cannon.
+        chariot = sign * CHARIOT
+        cannon = sign * CANNON
+        target_is_cannon = target == CANNON or target == -CANNON
+        line_occupancy = self._board.get_line_occupancy()
+        for line, shift, mask, table in LINE_RAYS[index]:
+            _, first, _, second = table[(line_occupancy[line] >> shift) & mask]
+            if first is None:
+                continue
+            if cells[first] == chariot:
+                return True
+            if (second is not None and cells[second] == cannon and not target_is_cannon and
+                    cells[first] != CANNON and cells[first] != -CANNON):
+                return True
+
+        # Chariots and cannons on the palace diagonals
+        for source, between in PALACE_ATTACK_RAYS[player].get(index, ()):
+            code = cells[source]
+            if code == chariot:
+                for cell in between:
+                    if cells[cell]:
+                        break
+                else:
+                    return True
+            elif code == cannon and not target_is_cannon:
+                screens = [cells[cell] for cell in between if cells[cell]]
+                if len(screens) == 1 and screens[0] != CANNON and screens[0] != -CANNON:
+                    return True
 
-        return valid_destinations
+        return False
 
-    def _valid_move_gua_gen(self, current_square, index, move_list, player, piece):
+    def generate_legal_moves(self, player) -> list:
         """
-        Recursive helper function "walks" through a guard or general move (that is, one square in any direction) to
-        determine if the destination square is valid.  Receives the current square, an index for the "step" in the
-        "move list" unique to guards and generals, the player, and the piece object. Returns a single destination square
-        in algebraic notation if the movement leading up to that destination square is valid (unobstructed, in bounds,
-        etc.) Otherwise, returns None.
+        Receives a player, returns a list of the move codes of every legal move of that player's pieces, not including a
+        pass. A move is legal if it does not leave the player's General attacked.
 
-        A "move list" is extremely similar to a linked list. The only twist is that the move_list can go to the "next"
-        node in 8 different directions.
+        Each candidate move is looked ahead at with Board.probe_move, so the game itself is never changed. Unless the
+        player is already in check, only the moves of the General, and the moves from or to a cell on one of the lines
+        attacks on the General pass through (see CHECK_LINES), need this look-ahead at all.
         """
-        # Base case: out of palace
-        if current_square is None:
-            return
-
-        # Base case: friendly piece found
-        next_move = move_list[index]
-
-        # If it is not the last square in a movement, can be blocked by ally or enemy, but can't be blocked by self
-        if current_square.get_piece() and next_move is not None:
-            if (player == current_square.get_piece().get_player() and
-                    current_square.get_piece() is not piece):
-                return
-            elif player != current_square.get_piece().get_player():
-                return
-
-        # Base case: end of movement, destination is valid
-        if next_move is None:
-            if current_square.get_piece():
-                if player == current_square.get_piece().get_player():
-                    return
-                elif player != current_square.get_piece().get_player():
-                    return current_square.get_string_of_square()
-            else:
-                return current_square.get_string_of_square()
-
-        # Recursive case
-        if next_move == 'left':
-            return self._valid_move_sol(current_square.get_left(), index + 1, move_list, player, piece)
-
-        elif next_move == 'down_left':
-            return self._valid_move_sol(current_square.get_down_left(), index + 1, move_list, player, piece)
+        if player == 'blue':
+            other_player = 'red'
+        else:
+            other_player = 'blue'
 
-        elif next_move == 'down':
-            return self._valid_move_sol(current_square.get_down(), index + 1, move_list, player, piece)
+        general_index = self._general_indexes[player]
+        in_check = self.is_cell_attacked(general_index, other_player)
+        check_lines = CHECK_LINES[general_index]
+        legal_moves = []
 
-        elif next_move == 'down_right':
-            return self._valid_move_sol(current_square.get_down_right(), index + 1, move_list, player, piece)
+        for index in self._board.get_side_squares(player):
+            destinations = self._piece_destinations(index)
+            origin = index * 90
 
-        elif next_move == 'right':
-            return self._valid_move_sol(current_square.get_right(), index + 1, move_list, player, piece)
+            if index == general_index:
+                for destination in destinations:
+                    if not self._is_attacked_after(index, destination, destination, other_player):
+                        legal_moves.append(origin + destination)
 
-        elif next_move == 'up_right':
-            return self._valid_move_sol(current_square.get_up_right(), index + 1, move_list, player, piece)
+            elif in_check or index in check_lines:
+                for destination in destinations:
+                    if not self._is_attacked_after(index, destination, general_index, other_player):
+                        legal_moves.append(origin + destination)
 
-        elif next_move == 'up':
-            return self._valid_move_sol(current_square.get_up(), index + 1, move_list, player, piece)
+            else:
+                for destination in destinations:
+                    if (destination in check_lines and
+                            self._is_attacked_after(index, destination, general_index, other_player)):
+                        continue
+                    legal_moves.append(origin + destination)
 
-        elif next_move == 'up_left':
-            return self._valid_move_sol(current_square.get_up_left(), index + 1, move_list, player, piece)
+        return legal_moves
 
-    def _valid_move_hor_ele(self, current_square, index, move_list, player, piece):
+    def is_checkmated(self, player) -> bool:
         """
-        Recursive helper function "walks" through an elephant or horse move (that is, one square in any direction) to
-        determine if the destination square is valid.  Receives the current square, an index for the "step" in the
-        "move list" unique to guards and generals, the player, and the piece object. Returns a single destination square
-        in algebraic notation if the movement leading up to that destination square is valid (unobstructed, in bounds,
-        etc.) Otherwise, returns an empty string.
+        Receives a player whose General is in check, and the attacks data structures up to date. Returns True if the
+        player has no legal move to get out of check, otherwise returns False.
 
-        A "move list" is extremely similar to a linked list. The only twist is that the move_list can go to the "next"
-        node in 8 different directions. For example, one 'Horse' move list is ['up', 'up_left', None] where None marks
-        the end of the movement.
+        The search stops at the first legal evasion found, and tries the likeliest evasions first: capturing a checking
+        piece (found through the attacked-by data structure), then moving a piece onto or off a checking line (blocking
+        it, or taking away a cannon's screen), then moving the General, and finally every other move.
         """
-        # Base case: out of bounds for board
-        if current_square is None:
-            return
+        if player == 'blue':
+            other_player = 'red'
+        else:
+            other_player = 'blue'
 
-        next_move = move_list[index]
-
-        # Base case: movement is blocked
-        if current_square.get_piece() and next_move is not None:
-            if (player == current_square.get_piece().get_player() and
-                    current_square.get_piece() is not piece):
-                return
-            elif player != current_square.get_piece().get_player():
-                return
-
-        # Base case: final square in movement is reached
-        if next_move is None:
-            if current_square.get_piece():
-                if player == current_square.get_piece().get_player():
-                    return
-                elif player != current_square.get_piece().get_player():
-                    return current_square.get_string_of_square()
-            else:
-                return current_square.get_string_of_square()
+        general_index = self._general_indexes[player]
+        attackers = self._attacked_by[player].get(SQUARE_NAMES[general_index], ())
+        checkers = {square_obj.get_index() for square_obj in attackers}
+        checking_lines = set()
+        for checker in checkers:
+            checking_lines.update(self._checking_line(checker, general_index))
 
-        # Recursive case
-        if next_move == 'left':
-            return self._valid_move_hor_ele(current_square.get_left(), index + 1, move_list, player, piece)
+        candidates = [(index, self._piece_destinations(index)) for index in self._board.get_side_squares(player)]
 
-        elif next_move == 'down_left':
-            return self._valid_move_hor_ele(current_square.get_down_left(), index + 1, move_list, player, piece)
+        def is_evasion(from_index, to_index):
+            target = to_index if from_index == general_index else general_index
+            return not self._is_attacked_after(from_index, to_index, target, other_player)
 
-        elif next_move == 'down':
-            return self._valid_move_hor_ele(current_square.get_down(), index + 1, move_list, player, piece)
+        # Capture a checking piece
+        for index, destinations in candidates:
+            for destination in destinations:
+                if destination in checkers and is_evasion(index, destination):
+                    return False
 
-        elif next_move == 'down_right':
-            return self._valid_move_hor_ele(current_square.get_down_right(), index + 1, move_list, player, piece)
+        # Block a checking line, or move a cannon's screen off it
+        for index, destinations in candidates:
+            if index == general_index:
+                continue
+            for destination in destinations:
+                if ((destination in checking_lines or index in checking_lines) and destination not in checkers and
+                        is_evasion(index, destination)):
+                    return False
+
+        # Move the General out of check
+        for index, destinations in candidates:
+            if index == general_index:
+                for destination in destinations:
+                    if destination not in checkers and is_evasion(index, destination):
+                        return False
+
+        # Any other move
+        for index, destinations in candidates:
+            if index == general_index or index in checking_lines:
+                continue
+            for destination in destinations:
+                if destination not in checkers and destination not in checking_lines and is_evasion(index, destination):
+                    return False
 
-        elif next_move == 'right':
-            return self._valid_move_hor_ele(current_square.get_right(), index + 1, move_list, player, piece)
+        return True
 
-        elif next_move == 'up_right':
-            return self._valid_move_hor_ele(current_square.get_up_right(), index + 1, move_list, player, piece)
+    def _checking_line(self, checker_index, general_index) -> tuple:
+        """
+        Receives the cell index of a piece checking a General, and the General's cell index. Returns the cells between
+        them which the check passes through: the cells in between along a row, file or palace diagonal, or the legs of a
+        horse or an elephant.
+        """
+        code = self._board.get_cells()[checker_index]
+        if code in (HORSE, -HORSE, ELEPHANT, -ELEPHANT):
+            for source, legs in STEP_ATTACKERS[code][general_index]:
+                if source == checker_index:
+                    return legs
+            return ()
 
-        elif next_move == 'up':
-            return self._valid_move_hor_ele(current_square.get_up(), index + 1, move_list, player, piece)
+        checker_row, checker_file = divmod(checker_index, 9)
+        general_row, general_file = divmod(general_index, 9)
+        row_step = (general_row > checker_row) - (general_row < checker_row)
+        file_step = (general_file > checker_file) - (general_file < checker_file)
+        step = 9 * row_step + file_step
 
-        elif next_move == 'up_left':
-            return self._valid_move_hor_ele(current_square.get_up_left(), index + 1, move_list, player, piece)
+        line = []
+        index = checker_index + step
+        while index != general_index:
+            line.append(index)
+            index += step
+        return tuple(line)
 
-    def _valid_move_cha(self, current_square, direction, player, piece, destinations=False):
+    def _is_attacked_after(self, from_index, to_index, index, player) -> bool:
         """
-        Recursive helper function "walks" through a chariot move (that is, one square in any direction) to
-        determine if the destination square is valid.  Receives the current square, an index for the "step" in the
-        "move list" unique to guards and generals, the player, and the piece object. Returns a single destination square
-        in algebraic notation if the movement leading up to that destination square is valid (unobstructed, in bounds,
-        etc.) Otherwise, returns an empty string.
+        Receives the cell indexes of a move, a cell index, and a player. Returns True if the cell would be attacked by
+        the player's pieces after the move, looking ahead with Board.probe_move.
+        """
+        captured = self._board.probe_move(from_index, to_index)
+        attacked = self.is_cell_attacked(index, player)
+        self._board.unprobe_move(from_index, to_index, captured)
+        return attacked
 
-        The chariot move list differs from the others in that it has no 'None' node to signify the end of a movement.
-        Rather a chariot simply has four different directions orthogonally (up, down, left, right) and it traverses
-        outwards from current node, adding valid, unobstructed squares, and 1 captured node along the way to a
-        "destinations" set that is passed with each recursive call.
+    def _find_piece_movement_destinations(self, square_obj) -> set or None:
         """
-        # Instantiate the destinations set on first recursive call
-        if destinations is False:
-            destinations = set()
+        Receives a Square object holding a game piece owned by the player whose turn it is. Returns a set of possible
+        destination squares that result from "one movement". Takes into consideration enemy captures and collisions/
+        obstructions with allied units.
 
-        # Base case: out of bounds for board
-        if current_square is None:
-            return destinations
+        Since this method receives a Square object, it is assumed the square has been previously validated. The moves
+        are calculated on the compact position core, and converted to algebraic notation here.
 
-        # Base case: palace movement out of palace
-        if (direction in piece.get_palace_move_map() and
-                current_square.get_string_of_square() not in self._board.get_palaces()):
+        It is also assumed the player who owns the piece has been previously validated as the active player.
+        """
+        if not square_obj.get_piece():
             return
 
-        if current_square.get_piece() and current_square.get_piece() is not piece:
-
-            # Base case: end of movement -- blocked by ally
-            if player == current_square.get_piece().get_player():
-                return destinations
-
-            # Base case: end of movement -- enemy piece can be captured
-            elif player != current_square.get_piece().get_player():
-                destinations.add(current_square.get_string_of_square())
-                return destinations
+        return {SQUARE_NAMES[destination] for destination in self._piece_destinations(square_obj.get_index())}
 
-        # Empty space is a valid chariot move
-        if not current_square.get_piece():
-            destinations.add(current_square.get_string_of_square())
-
-        # Recursive case
-        if direction == 'left':
-            return self._valid_move_cha(current_square.get_left(), direction, player, piece, destinations)
-
-        elif direction == 'down_left':
-            return self._valid_move_cha(current_square.get_down_left(), direction, player, piece, destinations)
-
-        elif direction == 'down':
-            return self._valid_move_cha(current_square.get_down(), direction, player, piece, destinations)
-
-        elif direction == 'down_right':
-            return self._valid_move_cha(current_square.get_down_right(), direction, player, piece, destinations)
-
-        elif direction == 'right':
-            return self._valid_move_cha(current_square.get_right(), direction, player, piece, destinations)
-
-        elif direction == 'up_right':
-            return self._valid_move_cha(current_square.get_up_right(), direction, player, piece, destinations)
-
-        elif direction == 'up':
-            return self._valid_move_cha(current_square.get_up(), direction, player, piece, destinations)
-
-        elif direction == 'up_left':
-            return self._valid_move_cha(current_square.get_up_left(), direction, player, piece, destinations)
-
-    def _valid_move_can(self, current_square, direction, player, piece, destinations=False, pieces_in_path=0):
+    def get_piece_destinations(self, index) -> list:
         """
-        Recursive helper function "walks" through a cannon move (that is, one square in any direction) to
-        determine if the destination square is valid.  Receives the current square, an index for the "step" in the
-        "move list" unique to guards and generals, the player, and the piece object. Returns a single destination square
-        in algebraic notation if the movement leading up to that destination square is valid (unobstructed, in bounds,
-        etc.) Otherwise, returns an empty string.
-
-        The cannon move list differs from the others in that it has no 'None' node to signify the end of a movement.
-        Rather a cannon simply has four different directions orthogonally (up, down, left, right) and it traverses
-        outwards from current node, adding valid, unobstructed squares, and 1 captured node along the way to a
-        "destinations" set that is passed with each recursive call. The cannon employs a "jump" mechanic which is
-        signified by a "pieces_in_path" variable. As a piece is found going outwards from the current node, a cannon
-        must encounter one piece prior to, effectively, acting as a chariot (and also cannot capture or jump over other
-        cannons.
+        Receives the index of an occupied cell in the compact position core. Returns a list of destination cell indexes
+        of the piece on that cell, without checking whether the moves would leave its General in check.
         """
-        if destinations is False:
-            destinations = set()
-
-        # Base case: out of bounds for board
-        if current_square is None:
-            return destinations
-
-        # Base case: augmented palace movement is out of palace zone
-        if (direction in piece.get_palace_move_map() and
-                current_square.get_string_of_square() not in self._board.get_palaces()):
-            return destinations
-
-        # Before jump, found piece in path
-        if pieces_in_path == 0 and current_square.get_piece():
-
-            # Base case: cannot jump over cannon
-            if current_square.get_piece().get_type() == 'cannon' and current_square.get_piece() is not piece:
-                return destinations
-
-            # Jump activated: first blocking piece found
-            if current_square.get_piece() is not piece:
-                pieces_in_path = 1
-
-        # After jump
-        elif pieces_in_path == 1:
-
-            # Empty squares after jump are valid cannon destinations
-            if not current_square.get_piece():
-                destinations.add(current_square.get_string_of_square())
-
-            # Occupied squares after jump
-            elif current_square.get_piece():
+        return self._piece_destinations(index)
 
-                # Occupied square is another cannon
-                if current_square.get_piece().get_type() == 'cannon':
-                    return destinations
-
-                # Ally piece
-                elif current_square.get_piece().get_player() == player:
-                    return destinations
-
-                # Enemy piece, valid destination and end of movement
-                elif current_square.get_piece().get_player() != player:
-                    destinations.add(current_square.get_string_of_square())
-                    return destinations
-
-        # Recursive case
-        if direction == 'left':
-            return self._valid_move_can(current_square.get_left(), direction, player, piece, destinations,
-                                        pieces_in_path)
+    def _piece_destinations(self, index) -> list:
+        """
+        Receives the index of an occupied cell in the compact position core. Returns a list of destination cell indexes
+        that result from "one movement" of the piece on that cell, utilizing a helper method specific to the piece.
+        """
+        code = self._board.get_cells()[index]
 
-        elif direction == 'down_left':
-            return self._valid_move_can(current_square.get_down_left(), direction, player, piece, destinations,
-                                        pieces_in_path)
+        # Assemble moves for a chariot
+        if code == CHARIOT or code == -CHARIOT:
+            return self._generate_chariot_destinations(index, code)
 
-        elif direction == 'down':
-            return self._valid_move_can(current_square.get_down(), direction, player, piece, destinations,
-                                        pieces_in_path)
+        # Assemble moves for a cannon
+        if code == CANNON or code == -CANNON:
+            return self._generate_cannon_destinations(index, code)
 
-        elif direction == 'down_right':
-            return self._valid_move_can(current_square.get_down_right(), direction, player, piece, destinations,
-                                        pieces_in_path)
+        # Look up moves for a general, guard, soldier, horse or elephant
+        return self._generate_step_destinations(index)
 
-        elif direction == 'right':
-            return self._valid_move_can(current_square.get_right(), direction, player, piece, destinations,
-                                        pieces_in_path)
+    def _generate_step_destinations(self, index) -> list:
+        """
+        Receives the cell index of a general, guard, soldier, horse or elephant. Returns a list of destination cell
+        indexes for that piece.
 
-        elif direction == 'up_right':
-            return self._valid_move_can(current_square.get_up_right(), direction, player, piece, destinations,
-                                        pieces_in_path)
+        The geometry of these pieces never changes, so their moves (including the palace restrictions and diagonals)
+        are looked up in STEP_MOVES. A move is valid when its legs are empty and its destination does not hold an
+        allied piece.
+        """
+        cells = self._board.get_cells()
+        code = cells[index]
+        valid_destinations = []
 
-        elif direction == 'up':
-            return self._valid_move_can(current_square.get_up(), direction, player, piece, destinations,
-                                        pieces_in_path)
+        for destination, legs in STEP_MOVES[code][index]:
+            if cells[destination] * code > 0:
+                continue
+            for leg in legs:
+                if cells[leg]:
+                    break
+            else:
+                valid_destinations.append(destination)
 
-        elif direction == 'up_left':
-            return self._valid_move_can(current_square.get_up_left(), direction, player, piece, destinations,
-                                        pieces_in_path)
+        return valid_destinations
 
-    def _valid_move_sol(self, current_square, index, move_list, player, piece):
-        """
-        Recursive helper function "walks" through soldier move (that is, one square in any direction) to
-        determine if the destination square is valid.  Receives the current square, an index for the "step" in the
-        "move list" unique to guards and generals, the player, and the piece object. Returns a single destination square
-        in algebraic notation if the movement leading up to that destination square is valid (unobstructed, in bounds,
-        etc.) Otherwise, returns an empty string.
-
-        A "move list" is extremely similar to a linked list. The only twist is that the move_list can go to the "next"
-        node in several directions. Of note with soldiers is that the side they play on affects their movement, as they
-        cannot move "backwards".
+    def _generate_chariot_destinations(self, index, code) -> list:
         """
-        # Base case: out of bounds for board
-        if current_square is None:
-            return
+        Receives the cell index and piece code of a chariot. Returns a list of destination cell indexes for it: every
+        empty cell up to the first piece in each direction, and that piece's cell if it is an enemy piece.
 
-        # Base case: friendly piece found
-        next_move = move_list[index]
-
-        if current_square.get_piece() and next_move is not None:
-            if (player == current_square.get_piece().get_player() and
-                    current_square.get_piece() is not piece):
-                return
-            elif player != current_square.get_piece().get_player():
-                return
-
-        # Base case: end of movement, destination is valid
-        if next_move is None:
-            if current_square.get_piece():
-                if player == current_square.get_piece().get_player():
-                    return
-                elif player != current_square.get_piece().get_player():
-                    return current_square.get_string_of_square()
-            else:
-                return current_square.get_string_of_square()
+        The orthogonal rays are looked up in LINE_RAYS by the occupancy of the chariot's row and file. Diagonal palace
+        movement follows the short rays in PALACE_RAYS, which never leave the palace.
+        """
+        cells = self._board.get_cells()
+        line_occupancy = self._board.get_line_occupancy()
+        valid_destinations = []
 
-        # Recursive case
-        if next_move == 'left':
-            return self._valid_move_sol(current_square.get_left(), index + 1, move_list, player, piece)
+        # Generate orthogonal movements
+        for line, shift, mask, table in LINE_RAYS[index]:
+            quiet, first, _, _ = table[(line_occupancy[line] >> shift) & mask]
+            valid_destinations.extend(quiet)
+            if first is not None and cells[first] * code < 0:
+                valid_destinations.append(first)
 
-        elif next_move == 'down_left':
-            return self._valid_move_sol(current_square.get_down_left(), index + 1, move_list, player, piece)
+        # Generate diagonal movements (in palace)
+        for ray in PALACE_RAYS['blue' if code > 0 else 'red'].get(index, ()):
+            for destination in ray:
+                target = cells[destination]
+                if target:
+                    if target * code < 0:
+                        valid_destinations.append(destination)
+                    break
+                valid_destinations.append(destination)
 
-        elif next_move == 'down':
-            return self._valid_move_sol(current_square.get_down(), index + 1, move_list, player, piece)
+        return valid_destinations
 
-        elif next_move == 'down_right':
-            return self._valid_move_sol(current_square.get_down_right(), index + 1, move_list, player, piece)
+    def _generate_cannon_destinations(self, index, code) -> list:
+        """
+        Receives the cell index and piece code of a cannon. Returns a list of destination cell indexes for it.
 
-        elif next_move == 'right':
-            return self._valid_move_sol(current_square.get_right(), index + 1, move_list, player, piece)
+        The cannon employs a "jump" mechanic: it must find exactly one piece in its path to jump over (the "screen"),
+        which cannot be another cannon. After the jump it moves like a chariot, except that it cannot capture another
+        cannon. The screen and the cells beyond it are looked up in LINE_RAYS by row and file occupancy.
+        """
+        cells = self._board.get_cells()
+        line_occupancy = self._board.get_line_occupancy()
+        valid_destinations = []
 
-        elif next_move == 'up_right':
-            return self._valid_move_sol(current_square.get_up_right(), index + 1, move_list, player, piece)
+        # Generate orthogonal movements
+        for line, shift, mask, table in LINE_RAYS[index]:
+            _, screen, quiet, target = table[(line_occupancy[line] >> shift) & mask]
+            if screen is None or cells[screen] == CANNON or cells[screen] == -CANNON:
+                continue
+            valid_destinations.extend(quiet)
+            if target is not None and cells[target] * code < 0 and cells[target] != CANNON and cells[target] != -CANNON:
+                valid_destinations.append(target)
 
-        elif next_move == 'up':
-            return self._valid_move_sol(current_square.get_up(), index + 1, move_list, player, piece)
+        # Generate diagonal movements (in palace)
+        for ray in PALACE_RAYS['blue' if code > 0 else 'red'].get(index, ()):
+            jumped = False
+            for destination in ray:
+                target = cells[destination]
+
+                # Before jump, found piece in path which is not a cannon
+                if not jumped:
+                    if target == CANNON or target == -CANNON:
+                        break
+                    jumped = target != EMPTY
+
+                # After jump, an empty cell is valid, and an occupied cell ends the movement
+                elif not target:
+                    valid_destinations.append(destination)
+                else:
+                    if target * code < 0 and target != CANNON and target != -CANNON:
+                        valid_destinations.append(destination)
+                    break
 
-        elif next_move == 'up_left':
-            return self._valid_move_sol(current_square.get_up_left(), index + 1, move_list, player, piece)
+        return valid_destinations
 
 
 class Piece:
@@ -1242,15 +1829,19 @@ class Piece:
     An abstract base class for all game pieces to be derived from. This class is not actually used directly.
     """
 
+    # The type and movement of a piece are the same for every piece of a class, so they are class data members shared
+    # by all instances (see PIECES), and a Piece instance only stores its owning player.
+    __slots__ = ('_player',)
+    _type = None
+    _move_map = None
+    _palace_move_map = None
+
     def __init__(self, player):
         """
         Initializes the Piece base class. Stores the owning player as 'blue' or 'red'. Get/set methods are packaged
-        into the base class. The remaining data members are initialized in the derived/child classes.
+        into the base class. The type and movement mechanism are class data members of the derived/child classes.
         """
         self._player = player
-        self._type = None
-        self._move_map = None
-        self._palace_move_map = None
 
     def __repr__(self):
         """
@@ -1290,24 +1881,20 @@ class General(Piece):
     A class representing the General.
     """
 
-    def __init__(self, player):
-        """
-        Initializes a General and its movement mechanism.
-        """
-        super().__init__(player)
-        self._type = 'general'
-        self._move_map = [
-            ['up', None],
-            ['left', None],
-            ['down', None],
-            ['right', None],
-        ]
-        self._palace_move_map = [
-            ['up_left', None],
-            ['down_left', None],
-            ['down_right', None],
-            ['up_right', None]
-        ]
+    __slots__ = ()
+    _type = 'general'
+    _move_map = (
+        ('up', None),
+        ('left', None),
+        ('down', None),
+        ('right', None),
+    )
+    _palace_move_map = (
+        ('up_left', None),
+        ('down_left', None),
+        ('down_right', None),
+        ('up_right', None)
+    )
 
     def __str__(self):
         """
@@ -1324,28 +1911,24 @@ class Guard(Piece):
     A class representing a Guard.
     """
 
-    def __init__(self, player):
-        """
-        Initializes a Guard and its movement mechanism.
-        """
-        super().__init__(player)
-        self._type = 'guard'
-        self._move_map = [
-            ['up', None],
-            ['up_left', None],
-            ['left', None],
-            ['down_left', None],
-            ['down', None],
-            ['down_right', None],
-            ['right', None],
-            ['up_right', None]
-        ]
-        self._palace_move_map = [
-            ['up_left', None],
-            ['down_left', None],
-            ['down_right', None],
-            ['up_right', None]
-        ]
+    __slots__ = ()
+    _type = 'guard'
+    _move_map = (
+        ('up', None),
+        ('up_left', None),
+        ('left', None),
+        ('down_left', None),
+        ('down', None),
+        ('down_right', None),
+        ('right', None),
+        ('up_right', None)
+    )
+    _palace_move_map = (
+        ('up_left', None),
+        ('down_left', None),
+        ('down_right', None),
+        ('up_right', None)
+    )
 
     def __str__(self):
         """
@@ -1362,22 +1945,18 @@ class Horse(Piece):
     A class representing a Horse.
     """
 
-    def __init__(self, player):
-        """
-        Initializes a Horse and its movement mechanism.
-        """
-        super().__init__(player)
-        self._type = 'horse'
-        self._move_map = [
-            ['up', 'up_left', None],
-            ['up', 'up_right', None],
-            ['left', 'up_left', None],
-            ['left', 'down_left', None],
-            ['right', 'up_right', None],
-            ['right', 'down_right', None],
-            ['down', 'down_left', None],
-            ['down', 'down_right', None]
-        ]
+    __slots__ = ()
+    _type = 'horse'
+    _move_map = (
+        ('up', 'up_left', None),
+        ('up', 'up_right', None),
+        ('left', 'up_left', None),
+        ('left', 'down_left', None),
+        ('right', 'up_right', None),
+        ('right', 'down_right', None),
+        ('down', 'down_left', None),
+        ('down', 'down_right', None)
+    )
 
     def __str__(self):
         """
@@ -1394,22 +1973,18 @@ class Elephant(Piece):
     A class representing an elephant.
     """
 
-    def __init__(self, player):
-        """
-        Initializes an Elephant and its movement mechanism.
-        """
-        super().__init__(player)
-        self._type = 'elephant'
-        self._move_map = [
-            ['up', 'up_left', 'up_left', None],
-            ['up', 'up_right', 'up_right', None],
-            ['left', 'up_left', 'up_left', None],
-            ['left', 'down_left', 'down_left', None],
-            ['right', 'up_right', 'up_right', None],
-            ['right', 'down_right', 'down_right', None],
-            ['down', 'down_left', 'down_left', None],
-            ['down', 'down_right', 'down_right', None]
-        ]
+    __slots__ = ()
+    _type = 'elephant'
+    _move_map = (
+        ('up', 'up_left', 'up_left', None),
+        ('up', 'up_right', 'up_right', None),
+        ('left', 'up_left', 'up_left', None),
+        ('left', 'down_left', 'down_left', None),
+        ('right', 'up_right', 'up_right', None),
+        ('right', 'down_right', 'down_right', None),
+        ('down', 'down_left', 'down_left', None),
+        ('down', 'down_right', 'down_right', None)
+    )
 
     def __str__(self):
         """
@@ -1426,24 +2001,20 @@ class Chariot(Piece):
     A class representing a Chariot.
     """
 
-    def __init__(self, player):
-        """
-        Initializes a Chariot and its movement mechanism.
-        """
-        super().__init__(player)
-        self._type = 'chariot'
-        self._move_map = [
-            'up',
-            'down',
-            'left',
-            'right'
-        ]
-        self._palace_move_map = [
-            'up_left',
-            'up_right',
-            'down_left',
-            'down_right'
-        ]
+    __slots__ = ()
+    _type = 'chariot'
+    _move_map = (
+        'up',
+        'down',
+        'left',
+        'right'
+    )
+    _palace_move_map = (
+        'up_left',
+        'up_right',
+        'down_left',
+        'down_right'
+    )
 
     def __str__(self):
         """
@@ -1460,24 +2031,20 @@ class Cannon(Piece):
     A class representing a Cannon.
     """
 
-    def __init__(self, player):
-        """
-        Initializes a Cannon and its movement mechanism.
-        """
-        super().__init__(player)
-        self._type = 'cannon'
-        self._move_map = [
-            'up',
-            'down',
-            'left',
-            'right'
-        ]
-        self._palace_move_map = [
-            'up_left',
-            'up_right',
-            'down_left',
-            'down_right'
-        ]
+    __slots__ = ()
+    _type = 'cannon'
+    _move_map = (
+        'up',
+        'down',
+        'left',
+        'right'
+    )
+    _palace_move_map = (
+        'up_left',
+        'up_right',
+        'down_left',
+        'down_right'
+    )
 
     def __str__(self):
         """
@@ -1494,34 +2061,30 @@ class Soldier(Piece):
     A class representing a Soldier.
     """
 
-    def __init__(self, player):
-        """
-        Initializes a Soldier and its movement mechanism.
-        """
-        super().__init__(player)
-        self._type = 'soldier'
-        self._move_map = {
-            'blue': [
-                ['up', None],
-                ['left', None],
-                ['right', None]
-            ],
-            'red': [
-                ['down', None],
-                ['left', None],
-                ['right', None]
-            ]
-        }
-        self._palace_move_map = {
-            'blue': [
-                ['up_right', None],
-                ['up_left', None]
-            ],
-            'red': [
-                ['down_right', None],
-                ['down_left', None]
-            ]
-        }
+    __slots__ = ()
+    _type = 'soldier'
+    _move_map = {
+        'blue': (
+            ('up', None),
+            ('left', None),
+            ('right', None)
+        ),
+        'red': (
+            ('down', None),
+            ('left', None),
+            ('right', None)
+        )
+    }
+    _palace_move_map = {
+        'blue': (
+            ('up_right', None),
+            ('up_left', None)
+        ),
+        'red': (
+            ('down_right', None),
+            ('down_left', None)
+        )
+    }
 
     def __str__(self):
         """
@@ -1547,6 +2110,49 @@ class Soldier(Piece):
         return self._palace_move_map[self._player]
 
 
+class MoveResult:
+    """
+    A class representing the result of make_move: a result code (MOVE_OK, or one of the reasons a move is rejected,
+    see MOVE_RESULT_REASONS) and the reason it gives. A MoveResult is true if the move was played and false otherwise,
+    so it can be tested like a bool. There is one shared MoveResult per code (see MOVE_RESULTS), so returning one
+    costs nothing.
+    """
+
+    def __init__(self, code):
+        """
+        Initializes the MoveResult of a result code.
+        """
+        self._code = code
+        self._reason = MOVE_RESULT_REASONS[code]
+
+    def __bool__(self):
+        """
+        A MoveResult is true if the move was played.
+        """
+        return self._code == MOVE_OK
+
+    def __repr__(self):
+        """
+        Internal representation of a MoveResult shows its reason.
+        """
+        return f'<MoveResult {self._reason}>'
+
+    def get_code(self) -> int:
+        """
+        Returns the result code.
+        """
+        return self._code
+
+    def get_reason(self) -> str:
+        """
+        Returns the reason the result code gives, e.g. 'The game is over'.
+        """
+        return self._reason
+
+
+MOVE_RESULTS = {code: MoveResult(code) for code in MOVE_RESULT_REASONS}
+
+
 class InvalidSquareError(Exception):
     """
     Exception that gets thrown when an invalid square string representation is passed. For example, the square 'x5' or
@@ -1555,5 +2161,290 @@ class InvalidSquareError(Exception):
     pass
 
 
+class InvalidPositionError(Exception):
+    """
+    Exception that gets thrown when a position in FEN notation cannot be loaded: malformed notation, a player without
+    exactly one General inside their palace, a guard outside its palace, a soldier behind its starting row, or the
+    player who just moved left in check.
+    """
+    pass
+
+
+class AttackMapError(Exception):
+    """
+    Exception that gets thrown in debug mode when the incrementally updated attacks of the pieces differ from a full
+    recalculation of the attacks.
+    """
+    pass
+
+
+PIECE_CLASSES = {
+    'general': General,
+    'guard': Guard,
+    'horse': Horse,
+    'elephant': Elephant,
+    'chariot': Chariot,
+    'cannon': Cannon,
+    'soldier': Soldier
+}
+
+# (piece code, cell index) of every piece of the starting position, as placed by Board.reset
+STARTING_CODES = tuple(
+    (PLAYER_SIGNS[player] * PIECE_CODES[piece_type], SQUARE_INDEXES[square_string])
+    for player, pieces in Board._starting_positions.items()
+    for piece_type, square_strings in pieces.items() for square_string in square_strings
+)
+
+# A Piece only holds its player and type, so one shared (flyweight) Piece object per piece code stands for every piece
+# of that code on every board
+PIECES = {
+    sign * code: PIECE_CLASSES[piece_type](player)
+    for piece_type, code in PIECE_CODES.items() for player, sign in PLAYER_SIGNS.items()
+}
+
+
+def _trace_move_list(index, move_list) -> list or None:
+    """
+    Receives a starting cell index and a "move list" of a Piece. Follows the move list one step at a time and returns
+    the list of cell indexes visited after the starting cell, where the last one is the destination and the others are
+    the legs of the movement. Returns None if the movement leaves the board.
+    """
+    path = []
+    for direction in move_list[:-1]:
+        index = NEIGHBOURS[direction][index]
+        if index is None:
+            return
+        path.append(index)
+    return path
+
+
+def _build_step_moves() -> dict:
+    """
+    Builds the move table of the pieces that move a fixed path: generals, guards, soldiers, horses and elephants.
+    Returns a dictionary mapping each signed piece code to a tuple with an entry per cell index. Each entry is a tuple
+    of (destination, legs) pairs, where legs is a tuple of the cell indexes that must be empty for the move to be
+    unobstructed.
+
+    The palace rules of each piece are resolved here, once: generals and guards are restricted to their own palace, and
+    diagonal palace moves are only possible from the palace squares augmenting movement.
+    """
+    step_moves = dict()
+
+    for piece_class in (General, Guard, Soldier, Horse, Elephant):
+        for player, sign in PLAYER_SIGNS.items():
+            piece_obj = piece_class(player)
+            piece_type = piece_obj.get_type()
+            table = []
+
+            for index in range(90):
+                move_lists = [(move_list, False) for move_list in piece_obj.get_move_map()]
+                if piece_obj.get_palace_move_map() and index in PALACE_MOVE_AUGMENTING_INDEXES[player]:
+                    move_lists += [(move_list, True) for move_list in piece_obj.get_palace_move_map()]
+
+                moves = dict()
+                for move_list, palace_move in move_lists:
+                    path = _trace_move_list(index, move_list)
+                    if path is None:
+                        continue
+                    destination = path[-1]
+
+                    # Generals and guards never leave their palace, soldiers only move diagonally inside a palace
+                    if piece_type in ('general', 'guard') and destination not in PALACE_INDEXES[player]:
+                        continue
+                    if palace_move and destination not in ALL_PALACE_INDEXES:
+                        continue
+                    moves.setdefault(destination, tuple(path[:-1]))
+
+                table.append(tuple(moves.items()))
+
+            step_moves[sign * PIECE_CODES[piece_type]] = tuple(table)
+
+    return step_moves
+
+
+STEP_MOVES = _build_step_moves()
+
+
+def _build_line_rays() -> tuple:
+    """
+    Builds the occupancy-indexed ray tables of the sliding pieces (chariots and cannons) along rows and files. Returns a
+    tuple with an entry per cell index. Each entry holds one (line, shift, mask, table) ray per orthogonal direction,
+    where `(Board line occupancy[line] >> shift) & mask` is the index into the table for the current occupancy.
+
+    Each table entry is (quiet, first, beyond, second): the empty cells before the first piece in the ray, the index of
+    that first piece, the empty cells between the first and the second piece, and the index of the second piece. Pieces
+    that are not found are None. Chariots use the first half of an entry, and cannons the second half, with the first
+    piece as the screen.
+    """
+    entries = dict()
+    line_rays = []
+
+    for index in range(90):
+        row, file = divmod(index, 9)
+
+        # (ray cells from nearest to farthest, line, shift, bit of each ray cell in the shifted occupancy)
+        rays = (
+            ([9 * ray_row + file for ray_row in range(row - 1, -1, -1)], 10 + file, 0, list(range(row - 1, -1, -1))),
+            ([9 * ray_row + file for ray_row in range(row + 1, 10)], 10 + file, row + 1, list(range(9 - row))),
+            ([9 * row + ray_file for ray_file in range(file - 1, -1, -1)], row, 0, list(range(file - 1, -1, -1))),
+            ([9 * row + ray_file for ray_file in range(file + 1, 9)], row, file + 1, list(range(8 - file)))
+        )
+
+        cell_rays = []
+        for cells, line, shift, bits in rays:
+            table = []
+            for occupancy in range(1 << len(cells)):
+                occupied = [position for position, bit in enumerate(bits) if occupancy >> bit & 1]
+                first = occupied[0] if occupied else len(cells)
+                second = occupied[1] if len(occupied) > 1 else len(cells)
+                entry = (
+                    tuple(cells[:first]),
+                    cells[first] if first < len(cells) else None,
+                    tuple(cells[first + 1:second]),
+                    cells[second] if second < len(cells) else None
+                )
+                table.append(entries.setdefault(entry, entry))
+            cell_rays.append((line, shift, (1 << len(cells)) - 1, tuple(table)))
+
+        line_rays.append(tuple(cell_rays))
+
+    return tuple(line_rays)
+
+
+def _build_palace_rays() -> dict:
+    """
+    Builds the diagonal palace rays of the sliding pieces. Returns a dictionary mapping each player to a dictionary of
+    the palace squares augmenting that player's movement, mapped to a tuple of rays. Each ray is a tuple of the cell
+    indexes along a palace diagonal, from nearest to farthest, ending at the edge of the palace.
+    """
+    palace_rays = dict()
+
+    for player, augmenting_indexes in PALACE_MOVE_AUGMENTING_INDEXES.items():
+        palace_rays[player] = dict()
+        for index in augmenting_indexes:
+            rays = []
+            for direction in ('up_left', 'up_right', 'down_left', 'down_right'):
+                ray = []
+                current = NEIGHBOURS[direction][index]
+                while current is not None and current in ALL_PALACE_INDEXES:
+                    ray.append(current)
+                    current = NEIGHBOURS[direction][current]
+                if ray:
+                    rays.append(tuple(ray))
+            palace_rays[player][index] = tuple(rays)
+
+    return palace_rays
+
+
+LINE_RAYS = _build_line_rays()
+PALACE_RAYS = _build_palace_rays()
+
+
+def _build_reach() -> dict:
+    """
+    Builds the reach of every piece on every cell: the cells whose occupancy can change the movement of that piece.
+    For the fixed path pieces these are the legs and destinations of their moves, and for chariots and cannons their
+    whole row and file along with their palace diagonals. Returns a dictionary mapping each signed piece code to a
+    tuple of 90 frozensets of cell indexes.
+    """
+    reach = dict()
+
+    for code in STEP_MOVES:
+        reach[code] = tuple(
+            frozenset(cell for destination, legs in moves for cell in (destination,) + legs)
+            for moves in STEP_MOVES[code]
+        )
+
+    for player, sign in PLAYER_SIGNS.items():
+        slider_reach = []
+        for index in range(90):
+            cells = set()
+            for line, shift, mask, table in LINE_RAYS[index]:
+                quiet, _, _, _ = table[0]
+                cells.update(quiet)
+            for ray in PALACE_RAYS[player].get(index, ()):
+                cells.update(ray)
+            slider_reach.append(frozenset(cells))
+        reach[sign * CHARIOT] = reach[sign * CANNON] = tuple(slider_reach)
+
+    return reach
+
+
+REACH = _build_reach()
+
+
+def _build_step_attackers() -> dict:
+    """
+    Builds the reverse of STEP_MOVES, to find the fixed path pieces attacking a cell. Returns a dictionary mapping each
+    signed piece code to a tuple of 90 entries, one per target cell. Each entry is a tuple of (source, legs) pairs: a
+    piece with that code on the source cell moves to the target cell when the legs are empty.
+    """
+    step_attackers = dict()
+
+    for code, table in STEP_MOVES.items():
+        targets = [[] for _ in range(90)]
+        for source, moves in enumerate(table):
+            for destination, legs in moves:
+                targets[destination].append((source, legs))
+        step_attackers[code] = tuple(tuple(sources) for sources in targets)
+
+    return step_attackers
+
+
+def _build_palace_attack_rays() -> dict:
+    """
+    Builds the reverse of PALACE_RAYS, to find the chariots and cannons attacking a cell along the palace diagonals.
+    Returns a dictionary mapping each player to a dictionary of target cells, mapped to a tuple of (source, between)
+    pairs, where between is the tuple of cells on the diagonal between the source and the target.
+    """
+    palace_attack_rays = dict()
+
+    for player, rays_by_source in PALACE_RAYS.items():
+        targets = dict()
+        for source, rays in rays_by_source.items():
+            for ray in rays:
+                for position, target in enumerate(ray):
+                    targets.setdefault(target, []).append((source, ray[:position]))
+        palace_attack_rays[player] = {target: tuple(sources) for target, sources in targets.items()}
+
+    return palace_attack_rays
+
+
+STEP_ATTACKERS = _build_step_attackers()
+STEP_ATTACKER_CODES = {
+    player: tuple(sign * code for code in (SOLDIER, HORSE, ELEPHANT, GUARD, GENERAL))
+    for player, sign in PLAYER_SIGNS.items()
+}
+PALACE_ATTACK_RAYS = _build_palace_attack_rays()
+
+
+def _build_check_lines() -> tuple:
+    """
+    Builds, for every cell, the set of cells whose occupancy can change whether that cell is attacked: its row and file,
+    the palace diagonals leading to it, and the legs of horses and elephants attacking it. A move that neither starts
+    nor ends on one of these cells cannot uncover or block an attack on the cell. Returns a tuple of 90 frozensets.
+    """
+    check_lines = []
+
+    for index in range(90):
+        cells = set()
+        for line, shift, mask, table in LINE_RAYS[index]:
+            quiet, _, _, _ = table[0]
+            cells.update(quiet)
+        for player in PLAYER_SIGNS:
+            for source, between in PALACE_ATTACK_RAYS[player].get(index, ()):
+                cells.add(source)
+                cells.update(between)
+        for code in (HORSE, -HORSE, ELEPHANT, -ELEPHANT):
+            for source, legs in STEP_ATTACKERS[code][index]:
+                cells.update(legs)
+        check_lines.append(frozenset(cells))
+
+    return tuple(check_lines)
+
+
+CHECK_LINES = _build_check_lines()
+
+
 if __name__ == '__main__':
     game = JanggiGame()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+# Optional instrumentation of JanggiGame move processing: per-phase timers and counters, exported as JSON.
+#
+# While an Instrumentation is enabled, the methods doing each phase of the work (see PHASES) are replaced on their
+# classes by wrappers timing every call; disabling it puts the original methods back. Nothing in JanggiGame.py checks
+# whether it is instrumented, so instrumentation costs nothing while disabled, and a long-running process (e.g.
+# JanggiServer.py) can be profiled for a while without the overhead of cProfile, which times every function call.
+#
+# Timers are inclusive: the make_move phase includes the validate, push, in_check, update_attacks_after_move and
+# checkmate phases it calls, and push includes in_check. Besides the calls and time of each phase, counters (see
+# COUNTERS) record the moves generated, the full attack rebuilds, the pieces whose attacks were recalculated, and the
+# destinations generated per piece, and the results of make_move are counted by code.
+#
+# Usage: python JanggiProfile.py [--games GAMES] [--moves MOVES] [--seed SEED] [--output FILE]
+#
+# Plays GAMES random games of up to MOVES moves each with make_move (including some rejected moves), instrumented, and
+# prints the JSON snapshot of the instrumentation, or writes it to FILE.
+
+import argparse
+import functools
+import json
+import random
+import sys
+import time
+
+from JanggiGame import (
+    JanggiGame, Board, Movement, GAME_OVER, ILLEGAL_DESTINATION, INVALID_SQUARE, LEAVES_GENERAL_IN_CHECK, MOVE_OK,
+    NO_PIECE, NOT_YOUR_PIECE, SQUARE_NAMES, decode_move
+)
+
+# Phases timed: the name of each phase, and the class and name of the method doing it
+PHASES = (
+    ('make_move', JanggiGame, 'make_move'),
+    ('validate', Movement, 'check_move'),
+    ('push', JanggiGame, 'push'),
+    ('pop', JanggiGame, 'pop'),
+    ('apply_move', Board, 'apply_move'),
+    ('in_check', JanggiGame, 'is_in_check'),
+    ('update_attacks', Movement, 'update_attacks'),
+    ('update_attacks_after_move', Movement, 'update_attacks_after_move'),
+    ('checkmate', Movement, 'is_checkmated'),
+    ('generate', Movement, 'generate_legal_moves')
+)
+
+# Counters: the name of each counter, and the class and name of the method whose calls it counts, with the function of
+# the method's result added to the counter on each call (None to count the calls)
+COUNTERS = (
+    ('moves_generated', Movement, 'generate_legal_moves', len),
+    ('attack_rebuilds', Movement, 'update_attacks', None),
+    ('pieces_recalculated', Movement, '_add_attacks', None),
+    ('piece_generations', Movement, '_piece_destinations', None),
+    ('destinations_generated', Movement, '_piece_destinations', len)
+)
+
+RESULT_NAMES = {
+    MOVE_OK: 'MOVE_OK', INVALID_SQUARE: 'INVALID_SQUARE', NO_PIECE: 'NO_PIECE', NOT_YOUR_PIECE: 'NOT_YOUR_PIECE',
+    ILLEGAL_DESTINATION: 'ILLEGAL_DESTINATION', LEAVES_GENERAL_IN_CHECK: 'LEAVES_GENERAL_IN_CHECK',
+    GAME_OVER: 'GAME_OVER'
+}
+
+# The Instrumentation enabled, if any, as only one can replace the methods at a time
+_enabled = None
+
+
+class Instrumentation:
+    """
+    A class representing a set of per-phase timers and counters of move processing (see PHASES and COUNTERS), shared
+    by every JanggiGame of the process while enabled. Can be used in a with block, which enables it for the block.
+    """
+
+    def __init__(self):
+        """
+        Initializes a disabled Instrumentation with its timers and counters at zero.
+        """
+        self._originals = None
+        self._timers = dict()
+        self._counters = dict()
+        self._results = dict()
+        self._elapsed = 0.0
+        self._start = None
+        self.reset()
+
+    def enable(self) -> None:
+        """
+        Replaces the methods of every phase and counter with instrumented wrappers, so every JanggiGame of the process
+        is measured from now on. Raises InstrumentationError if an Instrumentation is already enabled.
+        """
+        global _enabled
+        if _enabled is not None:
+            raise InstrumentationError
+        _enabled = self
+
+        self._originals = []
+        wrappers = dict()
+        for name, cls, method_name in PHASES:
+            wrappers[(cls, method_name)] = self._timed(self._timers[name], cls.__dict__[method_name])
+        for name, cls, method_name, measure in COUNTERS:
+            function = wrappers.get((cls, method_name), cls.__dict__[method_name])
+            wrappers[(cls, method_name)] = self._counted(name, function, measure)
+        make_move = (JanggiGame, 'make_move')
+        wrappers[make_move] = self._results_counted(wrappers[make_move])
+
+        for (cls, method_name), wrapper in wrappers.items():
+            self._originals.append((cls, method_name, cls.__dict__[method_name]))
+            setattr(cls, method_name, wrapper)
+        self._start = time.perf_counter()
+
+    def disable(self) -> None:
+        """
+        Puts the original methods back, so instrumentation costs nothing anymore. The timers and counters are kept.
+        """
+        global _enabled
+        if _enabled is not self:
+            return
+        for cls, method_name, original in self._originals:
+            setattr(cls, method_name, original)
+        self._originals = None
+        self._elapsed += time.perf_counter() - self._start
+        self._start = None
+        _enabled = None
+
+    def is_enabled(self) -> bool:
+        """
+        Returns True if the Instrumentation is enabled, False otherwise.
+        """
+        return _enabled is self
+
+    def reset(self) -> None:
+        """
+        Sets the timers and counters back to zero. The timers are cleared in place, as the wrappers of an enabled
+        Instrumentation hold them.
+        """
+        for name, _, _ in PHASES:
+            self._timers.setdefault(name, [0, 0, 0])[:] = [0, 0, 0]
+        for name, _, _, _ in COUNTERS:
+            self._counters[name] = 0
+        self._results.clear()
+        self._elapsed = 0.0
+        if self._start is not None:
+            self._start = time.perf_counter()
+
+    def snapshot(self) -> dict:
+        """
+        Returns a dictionary of the timers and counters, as exported by to_json: the seconds spent enabled, the calls,
+        total milliseconds, mean and longest microseconds of each phase, the counters, and the number of make_move
+        results of each code.
+        """
+        elapsed = self._elapsed
+        if self._start is not None:
+            elapsed += time.perf_counter() - self._start
+
+        phases = dict()
+        for name, (calls, total_ns, max_ns) in self._timers.items():
+            phases[name] = {
+                'calls': calls,
+                'total_ms': round(total_ns / 1e6, 3),
+                'mean_us': round(total_ns / calls / 1e3, 3) if calls else 0.0,
+                'max_us': round(max_ns / 1e3, 3)
+            }
+
+        return {
+            'enabled': self.is_enabled(),
+            'elapsed_s': round(elapsed, 3),
+            'phases': phases,
+            'counters': dict(self._counters),
+            'results': {RESULT_NAMES[code]: count for code, count in sorted(self._results.items())}
+        }
+
+    def to_json(self, indent=None) -> str:
+        """
+        Returns the snapshot of the timers and counters as a JSON string.
+        """
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def _timed(self, timer, function):
+        """
+        Receives a timer (a list of the calls, total and longest nanoseconds) and a function, returns a wrapper of the
+        function adding every call to the timer.
+        """
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                timer[0] += 1
+                timer[1] += elapsed
+                if elapsed > timer[2]:
+                    timer[2] = elapsed
+
+        return wrapper
+
+    def _counted(self, name, function, measure):
+        """
+        Receives the name of a counter, a function, and the function of its result added to the counter on each call
+        (None to count the calls). Returns a wrapper of the function updating the counter.
+        """
+        counters = self._counters
+
+        if measure is None:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                counters[name] += 1
+                return function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                result = function(*args, **kwargs)
+                counters[name] += measure(result)
+                return result
+
+        return wrapper
+
+    def _results_counted(self, make_move):
+        """
+        Receives make_move, returns a wrapper of it counting its results by code.
+        """
+        results = self._results
+
+        @functools.wraps(make_move)
+        def wrapper(*args, **kwargs):
+            result = make_move(*args, **kwargs)
+            code = result.get_code()
+            results[code] = results.get(code, 0) + 1
+            return result
+
+        return wrapper
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.disable()
+
+
+def get_enabled_instrumentation():
+    """
+    Returns the Instrumentation enabled in this process, or None.
+    """
+    return _enabled
+
+
+class InstrumentationError(Exception):
+    """
+    Exception for enabling an Instrumentation while another one is enabled.
+    """
+    pass
+
+
+def play_random_games(games: int, moves: int, seed=0) -> None:
+    """
+    Plays the received number of random games of up to the received number of moves each with make_move. About one in
+    ten attempts is a random pair of squares instead of a legal move, so rejected moves are measured as well.
+    """
+    rng = random.Random(seed)
+    for _ in range(games):
+        game = JanggiGame()
+        for _ in range(moves):
+            if game.get_game_state() != 'UNFINISHED':
+                break
+            if rng.random() < 0.1:
+                game.make_move(rng.choice(SQUARE_NAMES), rng.choice(SQUARE_NAMES))
+            game.make_move(*decode_move(rng.choice(game.legal_move_codes())))
+
+
+def main() -> int:
+    """
+    Plays instrumented random games from the command line arguments, and exports the snapshot. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame move processing instrumentation')
+    parser.add_argument('--games', type=int, default=20, help='random games played')
+    parser.add_argument('--moves', type=int, default=100, help='moves played per game at most')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--output', help='file to write the JSON snapshot to (default: standard output)')
+    args = parser.parse_args()
+
+    with Instrumentation() as instrumentation:
+        play_random_games(args.games, args.moves, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(instrumentation.to_json(indent=2) + '\n')
+    else:
+        print(instrumentation.to_json(indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+# Compact binary records of JanggiGame games.
+#
+# A record file starts with an 8-byte file header: the magic bytes b'JNGR', the format version (16-bit) and two
+# reserved bytes. Games are appended one after the other, each made of:
+#   - a 5-byte game header: the number of moves (16-bit), the result (8-bit, see RESULT_CODES) and the length of the
+#     metadata (16-bit)
+#   - the metadata, a UTF-8 JSON object (e.g. players, date, event), empty when there is none. A game that did not start
+#     from the starting position has its start position in FEN notation under the 'fen' key (see START_FEN_KEY)
+#   - the moves, 2 bytes each: the move code (see encode_move), from cell index * 90 + to cell index, where a pass is
+#     PASS_MOVE (0)
+# All numbers are little-endian. Files are only ever appended to, so a game written is never moved or rewritten. A game
+# holds at most 65535 moves and 65535 bytes of metadata.
+#
+# Usage: python JanggiRecords.py FILE
+#
+# Replays every game of a record file through JanggiGame, and prints a summary of each.
+
+import json
+import struct
+import sys
+
+from JanggiGame import JanggiGame, InvalidPositionError, PASS_MOVE, SQUARE_NAMES, STARTING_FEN, decode_move
+
+FILE_MAGIC = b'JNGR'
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct('<4sHxx')
+GAME_HEADER = struct.Struct('<HBH')
+MOVE_SIZE = 2
+
+# Largest number of moves and of metadata bytes of a game, and the number of move codes
+MAX_COUNT = 0xFFFF
+MOVE_CODES = len(SQUARE_NAMES) ** 2
+
+# Metadata key of the start position of a game not starting from the starting position
+START_FEN_KEY = 'fen'
+
+RESULT_CODES = {'UNFINISHED': 0, 'BLUE_WON': 1, 'RED_WON': 2}
+RESULTS = {code: result for result, code in RESULT_CODES.items()}
+
+
+class GameRecord:
+    """
+    A class representing a game read from (or to be written to) a record file: the list of its move codes, its result
+    ('UNFINISHED', 'BLUE_WON' or 'RED_WON'), the dictionary of its metadata, and the offset of the game in its file
+    (None until written or read).
+    """
+
+    def __init__(self, moves, result='UNFINISHED', metadata=None, offset=None):
+        """
+        Initializes a GameRecord.
+        """
+        self.moves = list(moves)
+        self.result = result
+        self.metadata = dict() if metadata is None else metadata
+        self.offset = offset
+
+    def __repr__(self):
+        """
+        Internal representation of a GameRecord shows its number of moves and result.
+        """
+        return f'<GameRecord {len(self.moves)} moves {self.result}>'
+
+    def get_squares(self) -> list:
+        """
+        Returns the list of (from, to) pairs of squares of the moves, as accepted by make_move. A pass is returned as
+        the same square twice.
+        """
+        return [decode_move(move) for move in self.moves]
+
+    def get_start_fen(self) -> str:
+        """
+        Returns the position the game started from in FEN notation: the START_FEN_KEY metadata if there is one,
+        STARTING_FEN otherwise.
+        """
+        return self.metadata.get(START_FEN_KEY, STARTING_FEN)
+
+    def start_game(self) -> JanggiGame:
+        """
+        Returns a new JanggiGame in the position the game started from, without its moves played. Raises
+        InvalidRecordError if the start position in the metadata is not a valid position.
+        """
+        start_fen = self.get_start_fen()
+        if start_fen == STARTING_FEN:
+            return JanggiGame()
+        if not isinstance(start_fen, str):
+            raise InvalidRecordError(f'Invalid start position of game at {self.offset}: {start_fen!r}')
+        try:
+            return JanggiGame.from_fen(start_fen)
+        except InvalidPositionError as error:
+            raise InvalidRecordError(f'Invalid start position of game at {self.offset}: {error}') from error
+
+    def push_move(self, game: JanggiGame, ply: int) -> None:
+        """
+        Receives the JanggiGame replaying the record, in the position before the received ply, and plays the move of
+        that ply with push. Raises InvalidRecordError if the move is not legal in the position, as push does not check.
+        """
+        move = self.moves[ply]
+        if move not in game.legal_move_codes():
+            from_square, to_square = decode_move(move)
+            raise InvalidRecordError(f'Illegal move {from_square}{to_square} at ply {ply} of game at {self.offset}')
+        game.push(move)
+
+    def replay(self) -> JanggiGame:
+        """
+        Returns a new JanggiGame in the position the game started from, with every move of the record played with
+        make_move. Raises InvalidRecordError if the start position is not valid or a move is not legal.
+        """
+        game = self.start_game()
+        for ply, (from_square, to_square) in enumerate(self.get_squares()):
+            result = game.make_move(from_square, to_square)
+            if not result:
+                raise InvalidRecordError(f'Illegal move {from_square}{to_square} at ply {ply} of game at '
+                                         f'{self.offset}: {result.get_reason()}')
+        return game
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the binary encoding of the game: its game header, metadata and moves. Raises ValueError if the result
+        is unknown, a move code is out of range, or the moves or metadata do not fit in a game header.
+        """
+        if self.result not in RESULT_CODES:
+            raise ValueError(f'Unknown game result {self.result!r}')
+        if len(self.moves) > MAX_COUNT:
+            raise ValueError(f'A game holds at most {MAX_COUNT} moves, not {len(self.moves)}')
+        for move in self.moves:
+            if not 0 <= move < MOVE_CODES:
+                raise ValueError(f'Move code {move} is not between 0 and {MOVE_CODES - 1}')
+        metadata = json.dumps(self.metadata, separators=(',', ':')).encode() if self.metadata else b''
+        if len(metadata) > MAX_COUNT:
+            raise ValueError(f'A game holds at most {MAX_COUNT} bytes of metadata, not {len(metadata)}')
+        header = GAME_HEADER.pack(len(self.moves), RESULT_CODES[self.result], len(metadata))
+        return header + metadata + struct.pack(f'<{len(self.moves)}H', *self.moves)
+
+    @classmethod
+    def from_game(cls, game: JanggiGame, metadata=None):
+        """
+        Receives a JanggiGame (and optionally a dictionary of metadata), returns the GameRecord of its moves so far and
+        its game state. If the game did not start from the starting position (e.g. loaded with from_fen), its start
+        position is added to a copy of the metadata under START_FEN_KEY.
+        """
+        start_fen = game.get_start_fen()
+        if start_fen != STARTING_FEN:
+            metadata = dict() if metadata is None else dict(metadata)
+            metadata[START_FEN_KEY] = start_fen
+        return cls(game.get_move_history(), game.get_game_state(), metadata)
+
+    @classmethod
+    def from_buffer(cls, buffer, offset: int):
+        """
+        Receives a buffer holding a record file (bytes, or a memory map) and the offset of a game in it. Returns the
+        GameRecord of that game and the offset of the next game. Raises InvalidRecordError if the game is cut short, or
+        if its result, metadata or a move code is not valid.
+        """
+        end = offset + GAME_HEADER.size
+        if end > len(buffer):
+            raise InvalidRecordError(f'Truncated game header at {offset}')
+        move_count, result, metadata_length = GAME_HEADER.unpack_from(buffer, offset)
+
+        moves_offset = end + metadata_length
+        end = moves_offset + MOVE_SIZE * move_count
+        if end > len(buffer):
+            raise InvalidRecordError(f'Truncated game at {offset}')
+
+        if result not in RESULTS:
+            raise InvalidRecordError(f'Unknown result code {result} of game at {offset}')
+        metadata = None
+        if metadata_length:
+            try:
+                metadata = json.loads(bytes(buffer[offset + GAME_HEADER.size:moves_offset]))
+            except ValueError as error:
+                raise InvalidRecordError(f'Invalid metadata of game at {offset}: {error}') from error
+            if not isinstance(metadata, dict):
+                raise InvalidRecordError(f'Metadata of game at {offset} is not a JSON object')
+        moves = struct.unpack_from(f'<{move_count}H', buffer, moves_offset)
+        for ply, move in enumerate(moves):
+            if move >= MOVE_CODES:
+                raise InvalidRecordError(f'Invalid move code {move} at ply {ply} of game at {offset}')
+        return cls(moves, RESULTS[result], metadata, offset), end
+
+
+class RecordWriter:
+    """
+    A class representing a record file opened for appending games. Creates the file (with its file header) if it does
+    not exist. Can be used in a with block, which closes the file at its end.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes a RecordWriter appending to the record file at path. Raises InvalidRecordError if the file exists
+        but is not a record file.
+        """
+        self._file = open(path, 'a+b')
+        self._file.seek(0)
+        header = self._file.read(FILE_HEADER.size)
+
+        if not header:
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        else:
+            try:
+                _check_file_header(header, path)
+            except InvalidRecordError:
+                self._file.close()
+                raise
+            self._file.seek(0, 2)
+
+    def write(self, record: GameRecord) -> int:
+        """
+        Appends a GameRecord to the file, returns the offset of the game in the file. Raises ValueError if the record
+        cannot be encoded (see GameRecord.to_bytes), in which case nothing is written.
+        """
+        data = record.to_bytes()
+        record.offset = self._file.tell()
+        self._file.write(data)
+        return record.offset
+
+    def write_game(self, game: JanggiGame, metadata=None) -> int:
+        """
+        Appends the moves and game state of a JanggiGame (and optionally a dictionary of metadata) to the file, returns
+        the offset of the game in the file.
+        """
+        return self.write(GameRecord.from_game(game, metadata))
+
+    def flush(self) -> None:
+        """
+        Writes the games appended so far to disk.
+        """
+        self._file.flush()
+
+    def close(self) -> None:
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_records(path: str):
+    """
+    Receives the path of a record file, yields the GameRecord of each game in the file in order, reading the file one
+    game at a time. Raises InvalidRecordError if the file is not a record file or ends in the middle of a game.
+    """
+    with open(path, 'rb') as file:
+        _check_file_header(file.read(FILE_HEADER.size), path)
+
+        while True:
+            offset = file.tell()
+            header = file.read(GAME_HEADER.size)
+            if not header:
+                return
+            if len(header) < GAME_HEADER.size:
+                raise InvalidRecordError(f'Truncated game header at {offset}')
+
+            move_count, _, metadata_length = GAME_HEADER.unpack(header)
+            body = file.read(metadata_length + MOVE_SIZE * move_count)
+            record, _ = GameRecord.from_buffer(header + body, 0)
+            record.offset = offset
+            yield record
+
+
+def replay_records(path: str):
+    """
+    Receives the path of a record file, yields a JanggiGame for each game in the file, with its moves replayed.
+    """
+    for record in read_records(path):
+        yield record.replay()
+
+
+def _check_file_header(header: bytes, path: str) -> None:
+    """
+    Raises InvalidRecordError if the received file header is not the header of a record file of a known version.
+    """
+    if len(header) < FILE_HEADER.size:
+        raise InvalidRecordError(f'{path} is not a game record file')
+    magic, version = FILE_HEADER.unpack(header)
+    if magic != FILE_MAGIC:
+        raise InvalidRecordError(f'{path} is not a game record file')
+    if version != FILE_VERSION:
+        raise InvalidRecordError(f'{path} has unsupported record version {version}')
+
+
+class InvalidRecordError(Exception):
+    """
+    Exception that gets thrown when a record file is not valid: wrong file header, a game cut short, an unknown
+    result, invalid metadata or start position, a move code out of range, or an illegal move.
+    """
+    pass
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Usage: python JanggiRecords.py FILE', file=sys.stderr)
+        sys.exit(2)
+
+    for number, record in enumerate(read_records(sys.argv[1])):
+        game = record.replay()
+        passes = record.moves.count(PASS_MOVE)
+        print(f'game {number} at {record.offset}: {len(record.moves)} moves ({passes} passes), '
+              f'{game.get_game_state()}, {record.metadata}')
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Batch self-play generating games of JanggiGame.py, e.g. to train evaluation models.
+#
+# Usage: python JanggiSelfPlay.py [--games GAMES] [--processes PROCESSES] [--mode {random,engine}] [--nodes NODES]
+#                                 [--random-plies PLIES] [--max-moves MOVES] [--seed SEED] [--output FILE]
+#                                 [--format {json,binary}]
+#
+# Plays the games on a pool of worker processes, and streams each finished game out as soon as it is done: as one line
+# of JSON, or appended to a binary record file (see JanggiRecords.py). Reports the throughput in games per second,
+# overall and per process, on stderr.
+
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+from JanggiEngine import Engine, TranspositionTable
+from JanggiGame import JanggiGame, decode_move
+from JanggiRecords import GameRecord, RecordWriter
+
+# Size of the transposition table of the engine of each worker process, in MB
+SELF_PLAY_TABLE_MB = 4
+
+# Game and engine of a worker process, reused for every game the worker plays
+_worker_game = None
+_worker_engine = None
+
+
+def play_game(game: JanggiGame, rng: random.Random, engine=None, nodes=2000, random_plies=0, max_moves=200) -> dict:
+    """
+    Receives a JanggiGame in its starting position, and plays a game on it with push, choosing moves at random with
+    rng, or with the received Engine (searching up to nodes nodes per move) once random_plies random moves have been
+    played. The game ends with a checkmate or after max_moves moves. The game is then reset to its starting position
+    in place (see JanggiGame.reset), ready for the next game.
+
+    Returns a dictionary of the move codes played and the result: 'BLUE_WON', 'RED_WON', or 'UNFINISHED' when
+    max_moves is reached.
+    """
+    moves = []
+    result = 'UNFINISHED'
+
+    while len(moves) < max_moves:
+        legal_moves = game.legal_move_codes()
+
+        # No legal moves (not even a pass) means the player to move is checkmated
+        if not legal_moves:
+            result = 'RED_WON' if game.get_turn() == 'blue' else 'BLUE_WON'
+            break
+
+        if engine is None or len(moves) < random_plies:
+            move = rng.choice(legal_moves)
+        else:
+            move = engine.search(max_nodes=nodes).move
+
+        game.push(move)
+        moves.append(move)
+
+    # Reset the board for the next game
+    game.reset()
+
+    return {
+        'moves': moves,
+        'result': result
+    }
+
+
+def _init_worker(mode: str) -> None:
+    """
+    Initializes a worker process: creates the game (and the engine, in 'engine' mode) reused for every game.
+    """
+    global _worker_game, _worker_engine
+    _worker_game = JanggiGame()
+    if mode == 'engine':
+        _worker_engine = Engine(_worker_game, TranspositionTable(SELF_PLAY_TABLE_MB))
+
+
+def _play_worker(task) -> dict:
+    """
+    Plays, in a worker process, the game of the received (index, seed, nodes, random_plies, max_moves) task: game
+    number index with the received random seed. Returns its record.
+    """
+    index, seed, nodes, random_plies, max_moves = task
+    record = play_game(_worker_game, random.Random(seed), _worker_engine, nodes, random_plies, max_moves)
+    record['game'] = index
+    record['seed'] = seed
+    return record
+
+
+def self_play(games: int, processes=None, mode='random', nodes=2000, random_plies=4, max_moves=200, seed=0):
+    """
+    Plays the received number of games on a pool of worker processes (the number of CPU cores when None), choosing
+    moves at random or with an engine (mode 'random' or 'engine', see play_game). Game number i uses the random seed
+    seed + i, so a batch can be played again identically. Yields the record of each game as soon as it is finished,
+    not necessarily in order.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    tasks = [(index, seed + index, nodes, random_plies, max_moves) for index in range(games)]
+    chunk_size = max(1, min(16, games // (4 * processes)))
+
+    with multiprocessing.Pool(processes, _init_worker, (mode,)) as pool:
+        yield from pool.imap_unordered(_play_worker, tasks, chunk_size)
+
+
+def main() -> int:
+    """
+    Runs batch self-play from the command line arguments. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame batch self-play')
+    parser.add_argument('--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='number of worker processes')
+    parser.add_argument('--mode', choices=('random', 'engine'), default='random', help='how moves are chosen')
+    parser.add_argument('--nodes', type=int, default=2000, help='engine nodes searched per move')
+    parser.add_argument('--random-plies', type=int, default=4, help='random moves opening each engine game')
+    parser.add_argument('--max-moves', type=int, default=200, help='number of moves after which a game is stopped')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the first game')
+    parser.add_argument('--output', help='file the games are written to (default: stdout, for JSON only)')
+    parser.add_argument('--format', choices=('json', 'binary'), default='json',
+                        help='one JSON line per game, with moves in algebraic notation (e.g. "a7a6", a pass repeating '
+                             'its square), or games appended to a binary record file')
+    args = parser.parse_args()
+
+    if args.format == 'binary':
+        if args.output is None:
+            parser.error('--format binary requires --output')
+        writer = RecordWriter(args.output)
+    else:
+        writer = sys.stdout if args.output is None else open(args.output, 'w')
+    start = time.perf_counter()
+    moves = 0
+
+    try:
+        for record in self_play(args.games, args.processes, args.mode, args.nodes, args.random_plies, args.max_moves,
+                                args.seed):
+            moves += len(record['moves'])
+            if args.format == 'binary':
+                metadata = {'game': record['game'], 'seed': record['seed']}
+                writer.write(GameRecord(record['moves'], record['result'], metadata))
+            else:
+                record['moves'] = [''.join(decode_move(move)) for move in record['moves']]
+                writer.write(json.dumps(record) + '\n')
+    finally:
+        if writer is not sys.stdout:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    games_per_second = args.games / elapsed
+    print(f'{args.games} games, {moves} moves in {elapsed:.2f}s: {games_per_second:.2f} games/s, '
+          f'{games_per_second / args.processes:.2f} games/s per process', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+
+# Asyncio game server hosting many JanggiGame sessions over TCP, and a load generator measuring its latency.
+#
+# The protocol is one JSON object per line, both ways. Each request has an "op", and may have an "id" which is echoed
+# in its response, so a client can have many requests in flight at once. A response has "ok": true and the fields
+# listed below, or "ok": false, an "error" code (see ERRORS) and a "message".
+#   {"op": "new", "fen": FEN, "engine": "red", "time_ms": 100}  -> "session", "reply", "fen", "turn", "state"
+#       Starts a session from the FEN position (default: the starting position). With "engine", the engine plays that
+#       player, searching time_ms milliseconds per move; "reply" is its first move if it is to move.
+#   {"op": "move", "session": S, "move": "a7a6"}                 -> "move", "reply", "fen", "turn", "state"
+#       Plays a move (a pass repeats its square, e.g. "e9e9"); "reply" is the move the engine answered with, if any.
+#   {"op": "legal", "session": S}                                -> "moves"
+#   {"op": "state", "session": S}                                -> "fen", "turn", "state", "moves"
+#   {"op": "close", "session": S}                                -> nothing more
+#   {"op": "stats"}                                              -> "stats"
+#       Returns the JSON snapshot of the move processing timers and counters of the server (see JanggiProfile.py),
+#       if it was started with --instrument. Engine searches on worker processes are not measured.
+# A session belongs to the connection that started it, and is closed with it. The requests of a session are queued,
+# and handled one at a time in order; requests of different sessions are handled concurrently.
+#
+# Usage: python JanggiServer.py serve [--host HOST] [--port PORT] [--processes PROCESSES] [--instrument]
+#        python JanggiServer.py load [--host HOST] [--port PORT] [--sessions SESSIONS] [--connections CONNECTIONS]
+#                                    [--moves MOVES] [--think-ms MILLISECONDS] [--seed SEED]
+#
+# serve runs the server until interrupted. load starts SESSIONS sessions at once over CONNECTIONS connections, plays
+# MOVES random moves in every session concurrently (waiting about --think-ms before each move), and reports the
+# throughput and the latency percentiles of the requests.
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from JanggiEngine import Engine, TranspositionTable
+from JanggiGame import JanggiGame, GamePool, InvalidPositionError, PASS_MOVE, SQUARE_INDEXES, decode_move
+from JanggiProfile import Instrumentation, get_enabled_instrumentation
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Error codes of failed requests
+ERRORS = {
+    'BAD_REQUEST': 'The request is not a JSON object with a known "op", or one of its fields is invalid',
+    'UNKNOWN_SESSION': 'No session with this number was started on this connection',
+    'INVALID_POSITION': 'The FEN position cannot be loaded',
+    'INVALID_MOVE': 'The move is not two squares in algebraic notation, e.g. "a7a6"',
+    'ILLEGAL_MOVE': 'The move is not legal in the current position',
+    'GAME_OVER': 'The game is over',
+    'BUSY': 'Too many requests of the session are waiting to be handled',
+    'SERVER_FULL': 'The server hosts as many sessions as it allows',
+    'SESSION_CLOSED': 'The session was closed before the request was handled',
+    'INTERNAL_ERROR': 'The server failed to handle the request'
+}
+
+# Ops of the requests of an existing session, which need its "session" number
+SESSION_OPS = ('move', 'legal', 'state', 'close')
+
+# Requests of one session waiting to be handled, beyond which requests are refused with 'BUSY' to bound latency
+MAX_QUEUED_REQUESTS = 16
+
+# Sessions hosted at once by a server by default, and longest engine search time allowed per move
+MAX_SESSIONS = 100000
+MAX_ENGINE_TIME_MS = 10000
+
+# Size of the transposition table of the engine of each worker process, in MB
+SERVER_TABLE_MB = 4
+
+# Longest request line accepted, in bytes
+MAX_LINE = 1 << 16
+
+# Transposition table of a worker process, reused for every engine move the worker searches
+_worker_table = None
+
+
+class GameSession:
+    """
+    A class representing a live game of the server: a JanggiGame, the player the engine plays (if any), and the queue
+    of the requests of the session, handled in order by a task of its own.
+
+    Moves are validated against the legal moves of the current position, computed once per position, and played with
+    push, so nothing is printed and the game's attacks data structures are never rebuilt.
+    """
+
+    def __init__(self, server, game: JanggiGame, engine_player=None, time_ms=100):
+        """
+        Initializes a GameSession of the received GameServer, playing the received JanggiGame, with the engine playing
+        engine_player ('blue', 'red' or None) with a search of time_ms milliseconds per move.
+        """
+        self._server = server
+        self._game = game
+        self._engine_player = engine_player
+        self._time_ms = time_ms
+        self._start_fen = game.to_fen()
+        self._legal_codes = []
+        self._legal_moves = set()
+        self._legal_names = None
+        self._update_legal_moves()
+        self._queue = asyncio.Queue(MAX_QUEUED_REQUESTS)
+        self._current = None
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, request: dict) -> asyncio.Future:
+        """
+        Queues a request of the session, returns a future of its result. Raises SessionError 'BUSY' if too many
+        requests are already queued.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((request, future))
+        except asyncio.QueueFull:
+            raise SessionError('BUSY')
+        return future
+
+    def close(self) -> None:
+        """
+        Stops the task of the session, and fails the request being handled and the queued requests with
+        'SESSION_CLOSED'. The game of the session is given back to the server for reuse.
+        """
+        self._task.cancel()
+        futures = [] if self._current is None else [self._current]
+        while not self._queue.empty():
+            futures.append(self._queue.get_nowait()[1])
+        for future in futures:
+            if not future.done():
+                future.set_exception(SessionError('SESSION_CLOSED'))
+        self._server.release_game(self._game)
+
+    async def _run(self) -> None:
+        """
+        Handles the queued requests of the session one at a time, in order. A request failing with an unexpected
+        exception gets an 'INTERNAL_ERROR' response, with the traceback printed to standard error, and the session
+        goes on with its next request.
+        """
+        while True:
+            request, future = await self._queue.get()
+            self._current = future
+            try:
+                result = await self._handle(request)
+            except SessionError as error:
+                if not future.done():
+                    future.set_exception(error)
+            except Exception:
+                traceback.print_exc()
+                if not future.done():
+                    future.set_exception(SessionError('INTERNAL_ERROR'))
+            else:
+                if not future.done():
+                    future.set_result(result)
+            self._current = None
+
+    async def _handle(self, request: dict) -> dict:
+        """
+        Receives a request of the session, returns the fields of its response. Raises SessionError if it fails.
+        """
+        op = request['op']
+        if op == 'start':
+            return await self._reply({})
+        if op == 'move':
+            return await self._reply({'move': self._play(request.get('move'))})
+        if op == 'legal':
+            if self._legal_names is None:
+                self._legal_names = [''.join(decode_move(move)) for move in self._legal_codes]
+            return {'moves': self._legal_names}
+        if op == 'state':
+            return self._state({'moves': [''.join(decode_move(move)) for move in self._game.get_move_history()]})
+        raise SessionError('BAD_REQUEST', f'Unknown op {op!r}')
+
+    def _play(self, move) -> str:
+        """
+        Receives a move in algebraic notation, validates it and plays it. Returns the move. Raises SessionError if the
+        move is invalid, illegal, or the game is over.
+        """
+        if not isinstance(move, str):
+            raise SessionError('INVALID_MOVE')
+        for length in (2, 3):
+            from_square, to_square = move[:length], move[length:]
+            if from_square in SQUARE_INDEXES and to_square in SQUARE_INDEXES:
+                break
+        else:
+            raise SessionError('INVALID_MOVE', f'Invalid move {move!r}')
+
+        if self._game.get_game_state() != 'UNFINISHED':
+            raise SessionError('GAME_OVER')
+        if from_square == to_square:
+            code = PASS_MOVE
+        else:
+            code = SQUARE_INDEXES[from_square] * 90 + SQUARE_INDEXES[to_square]
+        if code not in self._legal_moves or self._game.get_turn() == self._engine_player:
+            raise SessionError('ILLEGAL_MOVE', f'Illegal move {move!r}')
+
+        self._push(code)
+        return move
+
+    async def _reply(self, fields: dict) -> dict:
+        """
+        Lets the engine move if it is its turn, offloading the search to the server's worker processes. Returns the
+        received response fields, with the engine's move and the state of the game.
+        """
+        fields['reply'] = None
+        if self._game.get_turn() == self._engine_player and self._legal_moves:
+            move = await self._server.search(self._start_fen, self._game.get_move_history(), self._time_ms)
+            self._push(move)
+            fields['reply'] = ''.join(decode_move(move))
+        return self._state(fields)
+
+    def _push(self, move: int) -> None:
+        """
+        Plays a legal move code, and computes the legal moves of the new position. Ends the game if there are none.
+        """
+        self._game.push(move)
+        self._update_legal_moves()
+
+    def _update_legal_moves(self) -> None:
+        """
+        Computes the legal move codes of the current position, kept as a set to validate moves. Ends the game if there
+        are none. The names of the legal moves are only computed if a 'legal' request asks for them.
+        """
+        game = self._game
+        self._legal_codes = game.legal_move_codes()
+        self._legal_moves = set(self._legal_codes)
+        self._legal_names = None
+        if not self._legal_moves and game.get_game_state() == 'UNFINISHED':
+            game.set_game_state('RED_WON' if game.get_turn() == 'blue' else 'BLUE_WON')
+
+    def _state(self, fields: dict) -> dict:
+        """
+        Returns the received response fields, with the position, the player to move and the game state.
+        """
+        fields['fen'] = self._game.to_fen()
+        fields['turn'] = self._game.get_turn()
+        fields['state'] = self._game.get_game_state()
+        return fields
+
+
+class GameServer:
+    """
+    A class representing an asyncio server hosting GameSessions for clients connected over TCP (see the protocol
+    above). Engine searches run on a pool of worker processes, so they never block the event loop.
+    """
+
+    def __init__(self, processes=None, max_sessions=MAX_SESSIONS, instrumentation=None):
+        """
+        Initializes a GameServer with the received number of engine worker processes (the number of CPU cores when
+        None), hosting up to max_sessions sessions at once. The snapshot of the received Instrumentation, if any, is
+        returned by 'stats' requests.
+        """
+        self._executor = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(SERVER_TABLE_MB,))
+        self._instrumentation = instrumentation
+        self._pool = GamePool()
+        self._max_sessions = max_sessions
+        self._session_count = 0
+        self._next_session = 1
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT) -> None:
+        """
+        Accepts connections on the received host and port until cancelled.
+        """
+        server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_LINE)
+        async with server:
+            await server.serve_forever()
+
+    def get_session_count(self) -> int:
+        """
+        Returns the number of sessions currently hosted.
+        """
+        return self._session_count
+
+    def release_game(self, game: JanggiGame) -> None:
+        """
+        Receives the game of a closed session, and keeps it for a later session (see GamePool).
+        """
+        self._pool.release(game)
+
+    async def search(self, fen: str, moves: list, time_ms: int) -> int:
+        """
+        Searches, on a worker process, the position reached by playing the received move codes from the FEN position,
+        for time_ms milliseconds. Returns the move code found.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _search_worker, fen, moves, time_ms)
+
+    def close(self) -> None:
+        """
+        Stops the engine worker processes.
+        """
+        self._executor.shutdown(cancel_futures=True)
+
+    async def _handle_connection(self, reader, writer) -> None:
+        """
+        Reads the requests of a connection, one per line, and answers each as soon as it is handled. Closes the
+        sessions of the connection when it ends.
+        """
+        sessions = dict()
+        pending = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                task = asyncio.get_running_loop().create_task(self._respond(line, sessions, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            for task in pending:
+                task.cancel()
+            for session in sessions.values():
+                session.close()
+            self._session_count -= len(sessions)
+            writer.close()
+
+    async def _respond(self, line: bytes, sessions: dict, writer) -> None:
+        """
+        Handles one request line of a connection with the received sessions, and writes its response. A request failing
+        with an unexpected exception gets an 'INTERNAL_ERROR' response, with the traceback printed to standard error.
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get('op'), str):
+                raise SessionError('BAD_REQUEST')
+            request_id = request.get('id')
+            response = {'ok': True}
+            response.update(await self._dispatch(request, sessions))
+        except SessionError as error:
+            response = {'ok': False, 'error': error.code, 'message': str(error)}
+        except ValueError:
+            response = {'ok': False, 'error': 'BAD_REQUEST', 'message': ERRORS['BAD_REQUEST']}
+        except Exception:
+            traceback.print_exc()
+            response = {'ok': False, 'error': 'INTERNAL_ERROR', 'message': ERRORS['INTERNAL_ERROR']}
+
+        if request_id is not None:
+            response['id'] = request_id
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode() + b'\n')
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, request: dict, sessions: dict) -> dict:
+        """
+        Receives a request and the sessions of its connection, returns the fields of its response. Raises SessionError
+        if it fails.
+        """
+        op = request['op']
+        if op == 'new':
+            return await self._new_session(request, sessions)
+        if op == 'stats':
+            if self._instrumentation is None:
+                raise SessionError('BAD_REQUEST', 'The server was not started with --instrument')
+            return {'stats': self._instrumentation.snapshot()}
+        if op not in SESSION_OPS:
+            raise SessionError('BAD_REQUEST', f'Unknown op {op!r}')
+
+        session_id = request.get('session')
+        if not isinstance(session_id, int) or isinstance(session_id, bool) or session_id not in sessions:
+            raise SessionError('UNKNOWN_SESSION')
+        if op == 'close':
+            sessions.pop(session_id).close()
+            self._session_count -= 1
+            return {}
+        return await sessions[session_id].submit(request)
+
+    async def _new_session(self, request: dict, sessions: dict) -> dict:
+        """
+        Starts a session for a 'new' request on a connection with the received sessions. Returns the fields of the
+        response.
+        """
+        engine_player = request.get('engine')
+        time_ms = request.get('time_ms', 100)
+        if engine_player not in (None, 'blue', 'red'):
+            raise SessionError('BAD_REQUEST', f'Invalid engine player {engine_player!r}')
+        if not isinstance(time_ms, int) or isinstance(time_ms, bool) or not 0 < time_ms <= MAX_ENGINE_TIME_MS:
+            raise SessionError('BAD_REQUEST', f'time_ms must be between 1 and {MAX_ENGINE_TIME_MS}')
+        if self._session_count >= self._max_sessions:
+            raise SessionError('SERVER_FULL')
+
+        if request.get('fen') is None:
+            game = self._pool.acquire()
+        else:
+            try:
+                game = JanggiGame.from_fen(str(request['fen']))
+            except InvalidPositionError as error:
+                raise SessionError('INVALID_POSITION', str(error))
+
+        session_id = self._next_session
+        self._next_session += 1
+        sessions[session_id] = GameSession(self, game, engine_player, time_ms)
+        self._session_count += 1
+
+        fields = await sessions[session_id].submit({'op': 'start'})
+        fields['session'] = session_id
+        return fields
+
+
+def _init_worker(table_mb: int) -> None:
+    """
+    Initializes an engine worker process: creates the transposition table reused for every search. Searches are not
+    instrumented, so an Instrumentation inherited from the server process is disabled.
+    """
+    global _worker_table
+    instrumentation = get_enabled_instrumentation()
+    if instrumentation is not None:
+        instrumentation.disable()
+    _worker_table = TranspositionTable(table_mb)
+
+
+def _search_worker(fen: str, moves: list, time_ms: int) -> int:
+    """
+    Searches, in a worker process, the position reached by playing the received move codes from the FEN position, for
+    time_ms milliseconds. Returns the move code found.
+    """
+    game = JanggiGame.from_fen(fen)
+    for move in moves:
+        game.push(move)
+    return Engine(game, _worker_table).search(time_ms).move
+
+
+class SessionError(Exception):
+    """
+    Exception that gets thrown when a request of a session fails. Has the error code of the failure (see ERRORS).
+    """
+
+    def __init__(self, code, message=None):
+        """
+        Initializes a SessionError with an error code, and a message (the description of the code by default).
+        """
+        super().__init__(ERRORS[code] if message is None else message)
+        self.code = code
+
+
+class LoadClient:
+    """
+    A class representing a connection of the load generator to a GameServer, with many requests in flight. Records the
+    latency of every request.
+    """
+
+    def __init__(self, reader, writer, latencies: list):
+        """
+        Initializes a LoadClient over an open connection, appending request latencies (in seconds) to latencies.
+        """
+        self._reader = reader
+        self._writer = writer
+        self._latencies = latencies
+        self._pending = dict()
+        self._next_id = 0
+        self._task = asyncio.get_running_loop().create_task(self._read_responses())
+
+    async def request(self, request: dict) -> dict:
+        """
+        Sends a request, and returns its response once it arrives. Raises SessionError if the request fails.
+        """
+        self._next_id += 1
+        request['id'] = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+
+        start = time.perf_counter()
+        self._writer.write(json.dumps(request).encode() + b'\n')
+        await self._writer.drain()
+        response = await future
+        self._latencies.append(time.perf_counter() - start)
+
+        if not response['ok']:
+            raise SessionError(response['error'], response['message'])
+        return response
+
+    async def _read_responses(self) -> None:
+        """
+        Reads the responses of the connection, and resolves the future of each request.
+        """
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                for future in self._pending.values():
+                    future.set_exception(ConnectionError('Connection closed by the server'))
+                return
+            response = json.loads(line)
+            self._pending.pop(response['id']).set_result(response)
+
+    async def close(self) -> None:
+        """
+        Closes the connection.
+        """
+        self._task.cancel()
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def run_load(host: str, port: int, sessions: int, connections: int, moves: int, think_ms=0, seed=0) -> dict:
+    """
+    Load generator: opens connections to a GameServer, starts sessions sessions spread over them, waits until all are
+    started, then plays up to moves random legal moves in every session concurrently, and closes them. Each session
+    waits a random time of up to 2 * think_ms milliseconds before each move, like a player thinking; with think_ms 0,
+    every session sends its next request as soon as the last one is answered, to measure the largest throughput.
+
+    Returns the statistics of the run: the time taken to start every session, and for the requests of the games
+    played: the number of requests, the elapsed time, the requests per second, and the 50th, 90th, 99th percentile and
+    maximum latencies in milliseconds.
+    """
+    latencies = []
+    clients = []
+    for _ in range(connections):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        clients.append(LoadClient(reader, writer, latencies))
+
+    start = time.perf_counter()
+    started = await asyncio.gather(*(clients[number % connections].request({'op': 'new'})
+                                     for number in range(sessions)))
+    start_elapsed = time.perf_counter() - start
+
+    # The latencies measured are those of the games being played, not of the burst of sessions started at once
+    latencies.clear()
+    start = time.perf_counter()
+
+    async def play(client, session_id, rng):
+        for _ in range(moves):
+            if think_ms:
+                await asyncio.sleep(rng.uniform(0, 2 * think_ms / 1000))
+            legal_moves = (await client.request({'op': 'legal', 'session': session_id}))['moves']
+            if not legal_moves:
+                break
+            response = await client.request({'op': 'move', 'session': session_id, 'move': rng.choice(legal_moves)})
+            if response['state'] != 'UNFINISHED':
+                break
+        await client.request({'op': 'close', 'session': session_id})
+
+    await asyncio.gather(*(play(clients[number % connections], response['session'], random.Random(seed + number))
+                           for number, response in enumerate(started)))
+    elapsed = time.perf_counter() - start
+
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    return {
+        'start_elapsed': start_elapsed,
+        'requests': len(latencies),
+        'elapsed': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': 1000 * latencies[len(latencies) // 2],
+        'p90_ms': 1000 * latencies[len(latencies) * 9 // 10],
+        'p99_ms': 1000 * latencies[len(latencies) * 99 // 100],
+        'max_ms': 1000 * latencies[-1]
+    }
+
+
+def main() -> int:
+    """
+    Runs the server or the load generator from the command line arguments. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame game server')
+    parser.add_argument('command', choices=('serve', 'load'))
+    parser.add_argument('--host', default=DEFAULT_HOST, help='address to listen on, or of the server to load')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP port')
+    parser.add_argument('--processes', type=int, help='engine worker processes (default: number of CPU cores)')
+    parser.add_argument('--sessions', type=int, default=10000, help='load: sessions played at once')
+    parser.add_argument('--connections', type=int, default=100, help='load: connections the sessions are spread over')
+    parser.add_argument('--moves', type=int, default=10, help='load: random moves played per session')
+    parser.add_argument('--think-ms', type=int, default=0, help='load: average wait of a session before each move')
+    parser.add_argument('--seed', type=int, default=0, help='load: random seed of the first session')
+    parser.add_argument('--instrument', action='store_true', help='serve: time move processing for "stats" requests')
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        stats = asyncio.run(run_load(args.host, args.port, args.sessions, args.connections, args.moves, args.think_ms,
+                                     args.seed))
+        print(f'{args.sessions} sessions started in {stats["start_elapsed"]:.2f}s')
+        print(f'{stats["requests"]} requests in {stats["elapsed"]:.2f}s: '
+              f'{stats["requests_per_second"]:,.0f} requests/s, latency p50 {stats["p50_ms"]:.1f}ms, '
+              f'p90 {stats["p90_ms"]:.1f}ms, p99 {stats["p99_ms"]:.1f}ms, max {stats["max_ms"]:.1f}ms')
+        return 0
+
+    instrumentation = None
+    if args.instrument:
+        instrumentation = Instrumentation()
+        instrumentation.enable()
+
+    server = GameServer(args.processes, instrumentation=instrumentation)
+    print(f'Serving on {args.host}:{args.port}', file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if instrumentation is not None:
+            instrumentation.disable()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
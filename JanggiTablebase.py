@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+
+# Endgame tablebases of JanggiGame positions with few pieces, solved by retrograde analysis.
+#
+# A tablebase holds the result of every position of one material set, e.g. 'KR-KAA' (the pieces of the blue player,
+# then the pieces of the red player, with the FEN letters of JanggiGame.to_fen), with either player to move. Each
+# player has exactly one General. The pieces of a material set are its "slots": the blue pieces in piece code order
+# (the General first), then the red pieces in the same order. Each slot ranges over the cells the piece can ever stand
+# on: the palace of its player for a General or a guard, the cells its soldiers can reach from their starting row, and
+# the whole board for the other pieces. The index of a position is a mixed-radix number of the positions of its slots
+# in their ranges, times 2, plus 1 when red is to move.
+#
+# A tablebase file starts with a 32-byte header: the magic bytes b'JNGT', the format version (16-bit), two reserved
+# bytes, the material set (16 bytes, ASCII, padded with zero bytes) and the number of entries (64-bit). It is followed
+# by one 16-bit entry per position index: the result for the player to move in the top 2 bits (see RESULTS), and the
+# distance to mate in plies (half-moves) in the low 14 bits. All numbers are little-endian. The file is memory-mapped,
+# so a probe computes the index of the position and reads one entry.
+#
+# Usage: python JanggiTablebase.py generate DIRECTORY MATERIAL [MATERIAL ...]
+#        python JanggiTablebase.py probe DIRECTORY FEN
+#        python JanggiTablebase.py verify DIRECTORY
+#
+# generate writes the tablebases of the received material sets, and of every smaller material set a capture leads to,
+# to DIRECTORY. probe prints the result of a position in FEN notation. verify checks every entry of the tablebases of
+# DIRECTORY against the positions its moves lead to (see verify_tablebase), and exits with status 1 if one is wrong.
+
+import argparse
+import array
+import heapq
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+
+from JanggiGame import (JanggiGame, InvalidPositionError, EMPTY, GENERAL, GUARD, CHARIOT, CANNON, SOLDIER, FEN_LETTERS,
+                        FEN_PIECES, PALACE_INDEXES, PIECE_CODES, PIECE_TYPES, PLAYER_SIGNS, SQUARE_NAMES,
+                        STEP_ATTACKERS, STEP_MOVES)
+
+TABLE_MAGIC = b'JNGT'
+TABLE_VERSION = 1
+TABLE_HEADER = struct.Struct('<4sHxx16sQ')
+TABLE_ENTRY = struct.Struct('<H')
+TABLE_SUFFIX = '.jtb'
+
+# Results of a position for the player to move, in the top 2 bits of a table entry. INVALID positions cannot occur in
+# a game: two pieces on one cell, or the player who just moved left in check.
+DRAW = 0
+WIN = 1
+LOSS = 2
+INVALID = 3
+RESULTS = {DRAW: 'DRAW', WIN: 'WIN', LOSS: 'LOSS', INVALID: 'INVALID'}
+RESULT_SHIFT = 14
+DISTANCE_MASK = (1 << RESULT_SHIFT) - 1
+
+
+def parse_material(material: str) -> tuple:
+    """
+    Receives a material set such as 'KR-KAA', returns the tuple of the piece codes of its slots. Raises
+    InvalidTablebaseError if the material set is malformed.
+    """
+    sides = material.upper().split('-')
+    if len(sides) != 2:
+        raise InvalidTablebaseError(f'Expected the pieces of both players separated by "-": {material!r}')
+
+    codes = []
+    for sign, letters in zip(PLAYER_SIGNS.values(), sides):
+        if letters.count('K') != 1 or any(letter not in FEN_PIECES for letter in letters):
+            raise InvalidTablebaseError(f'Expected one General (K) and FEN piece letters per player: {material!r}')
+        codes.extend(sign * code for code in sorted(PIECE_CODES[FEN_PIECES[letter]] for letter in letters))
+    return tuple(codes)
+
+
+def material_name(codes) -> str:
+    """
+    Receives the piece codes of the slots of a material set, returns its name, e.g. 'KR-KAA'.
+    """
+    blue = ''.join(FEN_LETTERS[PIECE_TYPES[code]] for code in codes if code > 0)
+    red = ''.join(FEN_LETTERS[PIECE_TYPES[-code]] for code in codes if code < 0)
+    return f'{blue}-{red}'
+
+
+def _piece_range(code) -> tuple:
+    """
+    Receives a piece code, returns the tuple of the cell indexes a piece of that code can ever stand on: its palace for
+    a General or a guard, the cells reachable from the starting row of its soldiers, and every cell otherwise.
+    """
+    player = 'blue' if code > 0 else 'red'
+    if abs(code) in (GENERAL, GUARD):
+        return tuple(sorted(PALACE_INDEXES[player]))
+    if abs(code) != SOLDIER:
+        return tuple(range(90))
+
+    starting_row = '7' if player == 'blue' else '4'
+    reached = {index for index in range(90) if SQUARE_NAMES[index][1:] == starting_row}
+    frontier = list(reached)
+    while frontier:
+        index = frontier.pop()
+        for destination, _ in STEP_MOVES[code][index]:
+            if destination not in reached:
+                reached.add(destination)
+                frontier.append(destination)
+    return tuple(sorted(reached))
+
+
+PIECE_RANGES = {sign * code: _piece_range(sign * code) for code in PIECE_TYPES for sign in PLAYER_SIGNS.values()}
+RANGE_POSITIONS = {code: {index: position for position, index in enumerate(cells)}
+                   for code, cells in PIECE_RANGES.items()}
+
+
+class TableLayout:
+    """
+    A class representing the layout of the positions of a material set in its tablebase: the piece code and range of
+    each slot, and the stride of each slot in the position index.
+    """
+
+    def __init__(self, codes):
+        """
+        Initializes the TableLayout of the material set with the received slot piece codes.
+        """
+        self.codes = tuple(codes)
+        self.ranges = [PIECE_RANGES[code] for code in self.codes]
+        self.positions = [RANGE_POSITIONS[code] for code in self.codes]
+        self.strides = []
+        stride = 2
+        for cells in reversed(self.ranges):
+            self.strides.append(stride)
+            stride *= len(cells)
+        self.strides.reverse()
+        self.size = stride
+
+    def covers(self, placement) -> bool:
+        """
+        Receives the cell index of each slot, returns True if every slot is on a cell of its range, False otherwise.
+        Positions loaded otherwise than by playing moves, e.g. with Board.set_cell, may have a guard outside its
+        palace or a soldier behind its starting row, which no tablebase holds.
+        """
+        for positions, cell in zip(self.positions, placement):
+            if cell not in positions:
+                return False
+        return True
+
+    def index(self, placement, red_to_move) -> int:
+        """
+        Receives the cell index of each slot, and whether red is to move. Returns the index of the position. Every slot
+        must be on a cell of its range (see covers).
+        """
+        index = int(red_to_move)
+        for positions, stride, cell in zip(self.positions, self.strides, placement):
+            index += positions[cell] * stride
+        return index
+
+    def placement(self, index) -> tuple:
+        """
+        Receives the index of a position, returns the cell index of each slot and whether red is to move.
+        """
+        placement = []
+        for cells, stride in zip(self.ranges, self.strides):
+            position, index = divmod(index, stride)
+            placement.append(cells[position])
+        return tuple(placement), bool(index)
+
+
+def generate_tablebase(material: str, directory: str) -> list:
+    """
+    Receives a material set (see parse_material) and a directory. Solves the tablebase of the material set, and of
+    every smaller material set a capture leads to, and writes each to the directory (see tablebase_path). Returns the
+    list of the paths written.
+    """
+    tables = dict()
+    _solve_with_captures(parse_material(material), tables)
+
+    paths = []
+    for codes, entries in tables.items():
+        path = tablebase_path(directory, codes)
+        _write_table(path, codes, entries)
+        paths.append(path)
+    return paths
+
+
+def tablebase_path(directory: str, codes) -> str:
+    """
+    Receives a directory and the slot piece codes of a material set, returns the path of its tablebase file.
+    """
+    return os.path.join(directory, material_name(codes) + TABLE_SUFFIX)
+
+
+def _solve_with_captures(codes, tables) -> None:
+    """
+    Solves the tablebase of the material set with the received slot piece codes into tables (a dictionary of the
+    entries of each material set solved so far), after the tablebases of the material sets left by each capture.
+    """
+    if codes in tables:
+        return
+    for slot in range(len(codes)):
+        if abs(codes[slot]) != GENERAL:
+            _solve_with_captures(codes[:slot] + codes[slot + 1:], tables)
+    tables[codes] = _solve(codes, tables)
+
+
+def _solve(codes, tables) -> array.array:
+    """
+    Solves the tablebase of the material set with the received slot piece codes by retrograde analysis, looking up the
+    result of captures in the already solved tables. Returns its array of entries.
+
+    A first pass generates the legal moves of every position, forward: positions without any are checkmated (a player
+    who is not in check can always pass), a capture leading to a lost position wins, and each position counts its moves
+    which are not known to lose. The positions are then solved by increasing distance to mate, backward, by "unmoving"
+    the pieces of the player who just moved: a position with a move into a lost position is won, and a position
+    whose moves all lead to won positions is lost. Positions left unsolved are drawn.
+    """
+    layout = TableLayout(codes)
+    board = _scratch_board()
+    movement = board.get_move_instance()
+
+    entries = array.array('H', [DRAW]) * layout.size
+    unsolved = array.array('H', [0]) * layout.size
+    longest = array.array('H', [0]) * layout.size
+    queue = []
+
+    placed = ()
+    for placement in itertools.product(*layout.ranges):
+        base = layout.index(placement, False)
+        if len(set(placement)) < len(placement):
+            entries[base] = entries[base + 1] = INVALID << RESULT_SHIFT
+            continue
+        placed = _set_placement(board, codes, placed, placement)
+        slots = {cell: slot for slot, cell in enumerate(placement)}
+
+        for player, other_player, red_to_move in (('blue', 'red', 0), ('red', 'blue', 1)):
+            index = base + red_to_move
+            if movement.is_cell_attacked(movement.get_general_index(other_player), player):
+                entries[index] = INVALID << RESULT_SHIFT
+                continue
+
+            moves = movement.generate_legal_moves(player)
+            in_check = movement.is_cell_attacked(movement.get_general_index(player), other_player)
+            if not moves and in_check:
+                heapq.heappush(queue, (0, index, LOSS))
+                continue
+
+            # A pass, and the moves which do not capture, stay in this tablebase
+            count = 0 if in_check else 1
+            for move in moves:
+                from_index, to_index = divmod(move, 90)
+                if to_index not in slots:
+                    count += 1
+                    continue
+
+                child_codes, child_index = _capture_index(codes, placement, slots, from_index, to_index, red_to_move)
+                child = tables[child_codes][child_index]
+                result, distance = child >> RESULT_SHIFT, child & DISTANCE_MASK
+                if result == LOSS:
+                    heapq.heappush(queue, (distance + 1, index, WIN))
+                elif result == WIN:
+                    longest[index] = max(longest[index], distance)
+                else:
+                    count += 1
+
+            unsolved[index] = count
+            if not count:
+                heapq.heappush(queue, (longest[index] + 1, index, LOSS))
+
+    while queue:
+        distance, index, result = heapq.heappop(queue)
+        if entries[index] != DRAW:
+            continue
+        if distance > DISTANCE_MASK:
+            raise InvalidTablebaseError(f'Distance to mate of {material_name(codes)} exceeds {DISTANCE_MASK} plies')
+        entries[index] = result << RESULT_SHIFT | distance
+
+        placement, red_to_move = layout.placement(index)
+        placed = _set_placement(board, codes, placed, placement)
+        for parent in _parents(board, movement, layout, placement, red_to_move):
+            if entries[parent] != DRAW:
+                continue
+            if result == LOSS:
+                heapq.heappush(queue, (distance + 1, parent, WIN))
+            else:
+                longest[parent] = max(longest[parent], distance)
+                unsolved[parent] -= 1
+                if not unsolved[parent]:
+                    heapq.heappush(queue, (longest[parent] + 1, parent, LOSS))
+
+    return entries
+
+
+def _scratch_board():
+    """
+    Returns a Board without an object view and without pieces, for setting up positions with Board.set_cell.
+    """
+    game = JanggiGame({'blue': {'general': ['e9']}, 'red': {'general': ['e2']}}).clone()
+    board = game.get_board()
+    for index in range(90):
+        board.set_cell(index, EMPTY)
+    return board
+
+
+def _set_placement(board, codes, placed, placement) -> tuple:
+    """
+    Receives a scratch board, the slot piece codes of a material set, the cell index of each slot currently on the
+    board (or an empty tuple) and the cell index of each slot to set up. Moves the slots which changed. Returns the
+    placement now on the board.
+    """
+    if not placed:
+        for code, cell in zip(codes, placement):
+            board.set_cell(cell, code)
+        return placement
+
+    changed = [slot for slot, cell in enumerate(placement) if placed[slot] != cell]
+    for slot in changed:
+        board.set_cell(placed[slot], EMPTY)
+    for slot in changed:
+        board.set_cell(placement[slot], codes[slot])
+    return placement
+
+
+def _capture_index(codes, placement, slots, from_index, to_index, red_to_move) -> tuple:
+    """
+    Receives a material set (slot piece codes, and cell index of each slot), the map of the slot on each occupied
+    cell, and a capture with the player to move. Returns the slot piece codes of the material set left by the capture,
+    and the index of the position it leads to in that tablebase.
+    """
+    captured = slots[to_index]
+    moved = slots[from_index]
+    child_codes = codes[:captured] + codes[captured + 1:]
+    child_placement = [to_index if slot == moved else cell for slot, cell in enumerate(placement) if slot != captured]
+    return child_codes, TableLayout(child_codes).index(child_placement, not red_to_move)
+
+
+def _parents(board, movement, layout, placement, red_to_move) -> list:
+    """
+    Receives the scratch board set up with a position of a material set, and returns the indexes of the positions of
+    the same material set leading to it with one move which does not capture (or a pass) of the player who just moved.
+    """
+    cells = board.get_cells()
+    mover_sign = 1 if red_to_move else -1
+    parents = [layout.index(placement, not red_to_move)]
+
+    for slot, cell in enumerate(placement):
+        code = layout.codes[slot]
+        if code * mover_sign < 0:
+            continue
+
+        # Chariot and cannon moves are reversible; the other pieces are looked up backwards in STEP_ATTACKERS
+        if abs(code) in (CHARIOT, CANNON):
+            sources = [source for source in movement.get_piece_destinations(cell) if not cells[source]]
+        else:
+            sources = [source for source, legs in STEP_ATTACKERS[code][cell]
+                       if not cells[source] and not any(cells[leg] for leg in legs)]
+
+        positions = layout.positions[slot]
+        offset = layout.index(placement, not red_to_move) - positions[cell] * layout.strides[slot]
+        for source in sources:
+            if source in positions:
+                parents.append(offset + positions[source] * layout.strides[slot])
+
+    return parents
+
+
+def _write_table(path: str, codes, entries) -> None:
+    """
+    Writes the entries of the tablebase of a material set to the file at path.
+    """
+    if sys.byteorder == 'big':
+        entries = array.array('H', entries)
+        entries.byteswap()
+    with open(path + '.tmp', 'wb') as file:
+        file.write(TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, material_name(codes).encode(), len(entries)))
+        file.write(entries.tobytes())
+    os.replace(path + '.tmp', path)
+
+
+def verify_tablebase(tablebases, table) -> int:
+    """
+    Receives the Tablebases of a directory and one of its tablebases. Checks that the entry of every valid position is
+    consistent with the entries of the positions its legal moves lead to (in the same tablebase, or in the tablebase of
+    the material set left by a capture): a win needs a move to a loss one ply shorter, a loss needs every move to lead
+    to a win (the longest one ply shorter, or none at all when checkmated), and a draw neither. Also checks that a
+    position with a piece outside its range is not found by Tablebases.probe. Returns the number of failed checks.
+    """
+    layout = table.get_layout()
+    codes = layout.codes
+    board = _scratch_board()
+    movement = board.get_move_instance()
+    failures = 0
+    placed = ()
+
+    for index in range(layout.size):
+        result, distance = table.probe_index(index)
+        if result == INVALID:
+            continue
+        placement, red_to_move = layout.placement(index)
+        placed = _set_placement(board, codes, placed, placement)
+        slots = {cell: slot for slot, cell in enumerate(placement)}
+        player, other_player = ('red', 'blue') if red_to_move else ('blue', 'red')
+
+        children = []
+        in_check = movement.is_cell_attacked(movement.get_general_index(player), other_player)
+        if not in_check:
+            children.append(table.probe_index(index ^ 1))
+        for move in movement.generate_legal_moves(player):
+            from_index, to_index = divmod(move, 90)
+            if to_index in slots:
+                child_codes, child_index = _capture_index(codes, placement, slots, from_index, to_index, red_to_move)
+                children.append(tablebases.get_table(child_codes).probe_index(child_index))
+            else:
+                child_placement = list(placement)
+                child_placement[slots[from_index]] = to_index
+                children.append(table.probe_index(layout.index(child_placement, not red_to_move)))
+
+        losses = [child_distance for child_result, child_distance in children if child_result == LOSS]
+        all_wins = all(child_result == WIN for child_result, _ in children)
+        if result == WIN:
+            consistent = bool(losses) and min(losses) == distance - 1
+        elif result == LOSS:
+            if children:
+                consistent = all_wins and max(child_distance for _, child_distance in children) == distance - 1
+            else:
+                consistent = in_check and distance == 0
+        else:
+            consistent = bool(children) and not losses and not all_wins
+        failures += not consistent
+
+    # A guard outside its palace, or a soldier behind its starting row, is not in any tablebase
+    game = JanggiGame({'blue': {'general': ['e9']}, 'red': {'general': ['e2']}}).clone()
+    for slot, code in enumerate(codes):
+        outside = [cell for cell in range(90) if cell not in layout.positions[slot]]
+        if not outside:
+            continue
+        for index in range(0, layout.size, 2):
+            if table.probe_index(index)[0] != INVALID:
+                break
+        placement = layout.placement(index)[0]
+        cell = next(cell for cell in outside if cell not in placement)
+        for board_index in range(90):
+            game.get_board().set_cell(board_index, EMPTY)
+        for other_slot, other_cell in enumerate(placement):
+            game.get_board().set_cell(cell if other_slot == slot else other_cell, codes[other_slot])
+        failures += tablebases.probe(game) is not None
+
+    return failures
+
+
+class Tablebase:
+    """
+    A class representing the tablebase file of one material set, memory-mapped.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes a Tablebase over the file at path. Raises InvalidTablebaseError if the file is not a tablebase
+        file.
+        """
+        self._file = open(path, 'rb')
+        self._table = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._table) < TABLE_HEADER.size:
+            self.close()
+            raise InvalidTablebaseError(f'{path} is not a tablebase file')
+        magic, version, material, count = TABLE_HEADER.unpack_from(self._table, 0)
+        if magic != TABLE_MAGIC or version != TABLE_VERSION:
+            self.close()
+            raise InvalidTablebaseError(f'{path} is not a tablebase file of version {TABLE_VERSION}')
+
+        self._layout = TableLayout(parse_material(material.rstrip(b'\0').decode()))
+        if count != self._layout.size or len(self._table) != TABLE_HEADER.size + count * TABLE_ENTRY.size:
+            self.close()
+            raise InvalidTablebaseError(f'{path} is truncated')
+
+    def get_codes(self) -> tuple:
+        """
+        Returns the piece codes of the slots of the material set of the tablebase.
+        """
+        return self._layout.codes
+
+    def get_layout(self):
+        """
+        Returns the TableLayout of the material set of the tablebase.
+        """
+        return self._layout
+
+    def probe_index(self, index: int) -> tuple:
+        """
+        Receives the index of a position, returns its (result, distance to mate in plies) pair, from the point of view
+        of the player to move.
+        """
+        entry = TABLE_ENTRY.unpack_from(self._table, TABLE_HEADER.size + index * TABLE_ENTRY.size)[0]
+        return entry >> RESULT_SHIFT, entry & DISTANCE_MASK
+
+    def probe(self, placement, red_to_move) -> tuple:
+        """
+        Receives the cell index of each slot of the material set, and whether red is to move. Returns the (result,
+        distance to mate in plies) pair of the position (see probe_index), or None if a slot is outside its range
+        (see TableLayout.covers).
+        """
+        if not self._layout.covers(placement):
+            return
+        return self.probe_index(self._layout.index(placement, red_to_move))
+
+    def close(self) -> None:
+        """
+        Unmaps and closes the tablebase file.
+        """
+        self._table.close()
+        self._file.close()
+
+
+class Tablebases:
+    """
+    A class representing the tablebase files of a directory, probed by the material set of a position. Can be used in
+    a with block, which closes the files at its end.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initializes the Tablebases of every tablebase file in the directory.
+        """
+        self._tables = dict()
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(TABLE_SUFFIX):
+                table = Tablebase(os.path.join(directory, name))
+                self._tables[table.get_codes()] = table
+        self._max_pieces = max((len(codes) for codes in self._tables), default=0)
+
+    def get_max_pieces(self) -> int:
+        """
+        Returns the largest number of pieces (Generals included) of the material sets of the tablebases.
+        """
+        return self._max_pieces
+
+    def probe(self, game: JanggiGame) -> tuple or None:
+        """
+        Receives a JanggiGame, returns the (result, distance to mate in plies) pair of its current position for the
+        player to move (see RESULTS), or None if there is no tablebase for its material set, or if a piece stands where
+        no tablebase places it (see TableLayout.covers). The cost of a probe does
+        not depend on the size of the tablebase: the index of the position is computed from its few pieces, and one
+        entry is read.
+        """
+        board = game.get_board()
+        blue = board.get_side_squares('blue')
+        red = board.get_side_squares('red')
+        if len(blue) + len(red) > self._max_pieces:
+            return
+
+        cells = board.get_cells()
+        pieces = sorted((cells[index], index) for index in blue) + sorted(((cells[index], index) for index in red),
+                                                                          reverse=True)
+        table = self._tables.get(tuple(code for code, _ in pieces))
+        if table is None:
+            return
+        result = table.probe([index for _, index in pieces], game.get_turn() == 'red')
+        if result is None or result[0] == INVALID:
+            return
+        return result
+
+    def get_table(self, codes):
+        """
+        Receives the slot piece codes of a material set, returns its Tablebase, or None if there is none.
+        """
+        return self._tables.get(tuple(codes))
+
+    def get_tables(self) -> list:
+        """
+        Returns the list of the Tablebases.
+        """
+        return list(self._tables.values())
+
+    def close(self) -> None:
+        """
+        Unmaps and closes every tablebase file.
+        """
+        for table in self._tables.values():
+            table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class InvalidTablebaseError(Exception):
+    """
+    Exception that gets thrown when a material set is malformed, or a tablebase file is not valid.
+    """
+    pass
+
+
+def main() -> int:
+    """
+    Generates or probes tablebases from the command line arguments. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description='JanggiGame endgame tablebases')
+    parser.add_argument('command', choices=('generate', 'probe', 'verify'))
+    parser.add_argument('directory', help='directory of the tablebase files')
+    parser.add_argument('arguments', nargs='*', help='generate: material sets, e.g. KR-KAA; probe: a position in FEN')
+    args = parser.parse_args()
+
+    if args.command == 'verify':
+        failures = 0
+        with Tablebases(args.directory) as tablebases:
+            for table in tablebases.get_tables():
+                start = time.perf_counter()
+                found = verify_tablebase(tablebases, table)
+                name = material_name(table.get_codes())
+                print(f'{name}: {found} failed checks in {time.perf_counter() - start:.2f}s')
+                failures += found
+        return 1 if failures else 0
+    if not args.arguments:
+        parser.error(f'{args.command} requires arguments')
+
+    if args.command == 'generate':
+        for material in args.arguments:
+            start = time.perf_counter()
+            paths = generate_tablebase(material, args.directory)
+            print(f'{material}: wrote {len(paths)} tablebases in {time.perf_counter() - start:.2f}s')
+        return 0
+
+    try:
+        game = JanggiGame.from_fen(' '.join(args.arguments))
+    except InvalidPositionError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    with Tablebases(args.directory) as tablebases:
+        result = tablebases.probe(game)
+    if result is None:
+        print('No tablebase for this position')
+        return 1
+    result, distance = result
+    print(RESULTS[result] if result == DRAW else f'{RESULTS[result]} in {distance} plies')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())